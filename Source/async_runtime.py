@@ -0,0 +1,259 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import change_events
+from event_log import EVENT_LOG
+from instrumentation import INSTRUMENTATION
+from quote_engine import QuoteEngine
+from scheduler import SCHEDULER
+import trades
+
+
+class AsyncRuntime:
+    """Runs the simulation on an asyncio event loop, with or without Tk.
+
+    The scheduler's frames (the engine at the fixed step, then the lottery and the
+    other interval tasks) run from one asyncio task, next to the tasks doing I/O:
+    periodic saves and event log flushes, whose disk writes go to an I/O thread,
+    and a server for external clients (the Unity client) on a TCP port.
+
+    Headless, asyncio.run(runtime.run()) drives everything. With Tk, attach_tk(root)
+    keeps Tk's mainloop in charge and runs the ready asyncio callbacks every few
+    milliseconds from it, so both sides share the one thread and its data.
+    """
+
+    def __init__(self, global_data_manager, engine, scheduler=SCHEDULER, quote_engine=None,
+                 save_interval=60, flush_interval=1):
+        self.global_data_manager = global_data_manager
+        self.engine = engine
+        self.scheduler = scheduler
+        self.quote_engine = quote_engine or QuoteEngine(global_data_manager, engine)  # Prices the fixed price trades of clients
+        self.save_interval = save_interval  # Seconds between snapshots, None to only save at exit
+        self.flush_interval = flush_interval  # Seconds between event log flushes
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="runtime-io")  # One writer, in order
+        self.loop = None
+        self.tasks = []
+        self.server = None
+        self.clients = set()
+        self.root = None
+        self.pump_task = None
+
+    def start(self, host="127.0.0.1", port=None):
+        """Create the simulation and I/O tasks on self.loop, and the client server if a port is given."""
+        loop = self.loop
+        self.scheduler.reset_clock()
+        self.tasks.append(loop.create_task(self.run_frames()))
+        if self.save_interval:
+            self.tasks.append(loop.create_task(self.run_every(self.save_interval, self.save)))
+        self.tasks.append(loop.create_task(self.run_every(self.flush_interval, self.flush_event_log)))
+        if port is not None:
+            self.tasks.append(loop.create_task(self.serve(host, port)))
+
+    async def run(self, seconds=None, host="127.0.0.1", port=None):
+        """Run headless on the running loop, for seconds or until cancelled, then save."""
+        self.loop = asyncio.get_running_loop()
+        self.start(host, port)
+        try:
+            if seconds is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.sleep(seconds)
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Cancel the tasks, disconnect the clients and wait for a last save."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        await self.save()
+        await self.flush_event_log()
+
+    def attach_tk(self, root, pump_ms=5):
+        """Run a new event loop from the Tk mainloop of root; call start() after this."""
+        self.root = root
+        self.pump_ms = pump_ms
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pump()
+
+    def detach_tk(self):
+        if self.root and self.pump_task:
+            self.root.after_cancel(self.pump_task)
+        self.pump_task = None
+        self.root = None
+
+    def pump(self):
+        # One pass of the asyncio loop: the callbacks and tasks that are ready, and the sockets that are ready.
+        # A modal dialog opened from an asyncio callback runs Tk's loop inside ours, wait for it to return.
+        if not self.loop.is_running():
+            self.loop.call_soon(self.loop.stop)
+            self.loop.run_forever()
+        if self.root:
+            self.pump_task = self.root.after(self.pump_ms, self.pump)
+
+    async def run_frames(self):
+        """Run a scheduler frame every step seconds, aiming at the ideal frame times so the loop does not drift."""
+        loop = self.loop
+        scheduler = self.scheduler
+        next_frame_at = loop.time()
+        while True:
+            scheduler.run_frame()
+            next_frame_at += scheduler.step
+            now = loop.time()
+            if next_frame_at < now:
+                next_frame_at = now  # Never queue up missed frames, the scheduler catches up on the steps
+            await asyncio.sleep(next_frame_at - now)
+
+    async def run_every(self, interval, coroutine_function):
+        """Await coroutine_function() every interval seconds, a failure only skips that run."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await coroutine_function()
+            except Exception as error:
+                print(f"Background task failed: {error!r}")
+
+    async def save(self):
+        """Save a snapshot of the game, writing the JSON files on the I/O thread while the game goes on."""
+        data = self.global_data_manager
+        if data.replaying_journal:
+            return  # Synthetic and replayed games are not saved
+        if data.storage:
+            data.save_all_data()  # An SQLite connection belongs to the thread that opened it
+            return
+
+        # Copy the state with the number of journal events it holds, the events appended meanwhile are kept
+        journal = data.journal
+        journaled, truncations = journal.event_count, journal.truncations
+        snapshot = data.get_json_snapshot()
+        written = await self.loop.run_in_executor(self.io_executor, data.write_json_snapshot, snapshot, truncations)
+        # A save_all_data meanwhile wrote newer files and emptied the journal, under the same lock.
+        # It runs on this thread, so it cannot come between this check and the trim.
+        if written and journal.truncations == truncations:
+            journal.drop_first(journaled)
+            INSTRUMENTATION.add_rows("runtime.saves", 1)
+
+    async def flush_event_log(self):
+        if EVENT_LOG.file:
+            await self.loop.run_in_executor(self.io_executor, EVENT_LOG.flush)
+
+    async def serve(self, host, port):
+        """Serve external clients on host:port, one JSON request and one JSON reply per line."""
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"Serving clients on {host}:{self.server.sockets[0].getsockname()[1]}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        # Replies and change events share the one queue, so a client reads them in order
+        outbox = asyncio.Queue()
+        sender = self.loop.create_task(self.send_lines(writer, outbox))
+        subscriptions = []
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    reply = self.handle_request(request, outbox, subscriptions)
+                except Exception as error:  # A bad request fails alone, the connection stays open
+                    reply = {"ok": False, "error": str(error)}
+                if isinstance(request, dict) and "id" in request:
+                    reply["id"] = request["id"]  # Lets the client match replies to requests
+                outbox.put_nowait(reply)
+        except ConnectionError:
+            pass
+        finally:
+            for event_type, callback in subscriptions:
+                self.global_data_manager.changes.unsubscribe(event_type, callback)
+            self.clients.discard(writer)
+            outbox.put_nowait(None)
+            await sender
+            writer.close()
+
+    async def send_lines(self, writer, outbox):
+        while True:
+            message = await outbox.get()
+            if message is None:
+                return
+            try:
+                writer.write(json.dumps(message, separators=(',', ':')).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                return
+
+    def handle_request(self, request, outbox, subscriptions):
+        """Answer one client request: "state", "listings", "demands", "inventory", "trades" or "subscribe"."""
+        data = self.global_data_manager
+        op = request.get("op")
+        if op == "state":
+            return {"ok": True, "time": self.engine.current_time, "balance": data.wallet.balance,
+                    "listings": len(data.in_market_items), "demands": len(data.demands_list)}
+        if op == "listings":
+            rows = data.in_market_items.available_rows(self.engine.current_time)
+            search_term = request.get("search", "").lower().strip()
+            return {"ok": True, "listings": [[item_id, *row] for item_id, row in rows.items()
+                                             if search_term in row[0].lower()]}
+        if op == "demands":
+            return {"ok": True, "demands": [dict(demand) for demand in data.demands_list]}
+        if op == "inventory":
+            return {"ok": True, "inventory": [dict(item) for item in data.user_items]}
+        if op == "trades":
+            summary = trades.execute_trades(data, request["trades"], self.engine, self.quote_engine)
+            return dict(summary, errors=[list(error) for error in summary["errors"]])
+        if op == "subscribe":
+            # Push {"event": type, "key": key} for every change, the client asks again for what it shows
+            for event_type in request.get("events") or EVENT_TYPES:
+                def callback(key, record, event_type=event_type):
+                    outbox.put_nowait({"event": event_type, "key": key})
+                data.changes.subscribe(event_type, callback)
+                subscriptions.append((event_type, callback))
+            return {"ok": True}
+        raise ValueError(f"Unknown op {op!r}")
+
+
+EVENT_TYPES = (
+    change_events.LISTING_ADDED, change_events.LISTING_UPDATED, change_events.LISTING_REMOVED,
+    change_events.LISTINGS_RESET, change_events.DEMAND_ADDED, change_events.DEMAND_UPDATED,
+    change_events.DEMAND_REMOVED, change_events.DEMANDS_RESET, change_events.INVENTORY_ADDED,
+    change_events.INVENTORY_UPDATED, change_events.INVENTORY_REMOVED, change_events.INVENTORY_RESET,
+    change_events.WALLET_CHANGED,
+)
+
+
+if __name__ == "__main__":
+    # Headless run: python async_runtime.py [seconds] [--port=N] [--save-interval=seconds]
+    import sys
+    import global_data
+    import simulation_engine
+
+    data = global_data.GlobalDataManager()
+    data.load_all_data()
+    engine = simulation_engine.SimulationEngine(data)
+    SCHEDULER.add_fixed_step("loop.engine_frame", engine.step, priority=0)
+    port = None
+    save_interval = 60
+    for arg in sys.argv[1:]:
+        if arg.startswith("--port="):
+            port = int(arg.split("=", 1)[1])
+        elif arg.startswith("--save-interval="):
+            save_interval = float(arg.split("=", 1)[1])
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 and not sys.argv[1].startswith("--") else None
+    runtime = AsyncRuntime(data, engine, save_interval=save_interval)
+    started_at = engine.current_time
+    try:
+        asyncio.run(runtime.run(seconds, port=port))
+    except KeyboardInterrupt:
+        pass
+    print(f"{SCHEDULER.frame_count} frames, {engine.current_time - started_at:.1f}s simulated, "
+          f"{len(data.in_market_items)} listings, {len(data.demands_list)} demands")
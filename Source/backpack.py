@@ -1,84 +1,90 @@
 import tkinter as tk
-from tkinter import ttk
+
+import change_events
+import trades
+from virtual_table import VirtualTable
 
 class BackpackManager:
     def __init__(self, root, global_data_manager):
         self.root = root
-        self.auto_update_id = None
         self.gold_label = None
         self.silver_label = None
         self.copper_label = None
-        self.user_tree = None
+        self.user_table = None  # VirtualTable showing the inventory
+        self.user_tree = None  # Its TreeView widget
         self.global_data_manager = global_data_manager
         self.backpack_window = None
+
+        # Inventory changes waiting to be drawn, entry key -> entry, or None once it left the inventory
+        self.changed_entries = {}
+        self.reset_pending = False
+        self.apply_task = None
+
+        # The money display and the inventory follow the change events, no polling needed
+        changes = global_data_manager.changes
+        changes.subscribe(change_events.WALLET_CHANGED, self.update_money_display)
+        changes.subscribe(change_events.INVENTORY_ADDED, self.on_inventory_changed)
+        changes.subscribe(change_events.INVENTORY_UPDATED, self.on_inventory_changed)
+        changes.subscribe(change_events.INVENTORY_REMOVED, self.on_inventory_removed)
+        changes.subscribe(change_events.INVENTORY_RESET, self.on_inventory_reset)
         
-    def update_money_display(self):
-        """Update the money display in the backpack window if the labels exist."""
+    def update_money_display(self, key=None, wallet=None):
+        """Update the money display in the backpack window if the labels exist. Called on every wallet change."""
         if self.backpack_window and self.backpack_window.winfo_exists():
+            wallet = self.global_data_manager.wallet
             if self.gold_label and self.gold_label.winfo_exists():
-                self.gold_label.config(text=f"Gold: {self.global_data_manager.gold}")
+                self.gold_label.config(text=f"Gold: {wallet.gold}")
             if self.silver_label and self.silver_label.winfo_exists():
-                self.silver_label.config(text=f"Silver: {self.global_data_manager.silver}")
+                self.silver_label.config(text=f"Silver: {wallet.silver}")
             if self.copper_label and self.copper_label.winfo_exists():
-                self.copper_label.config(text=f"Copper: {self.global_data_manager.copper}")
-        else:
-            self.stop_auto_update()  # Stop updating if the window no longer exists
-
-
-    def auto_convert_money(self):
-        """Automatically convert copper to silver and silver to gold based on the conversion rate."""
-        if not self.backpack_window or not self.backpack_window.winfo_exists():
-            self.stop_auto_update()  # Stop if the window is closed
-            return
-
-        copper = self.global_data_manager.copper
-        silver = self.global_data_manager.silver
-        gold = self.global_data_manager.gold
-        
-        # Convert copper to silver (100 copper = 1 silver)
-        if copper >= 100:
-            converted_silver = copper // 100
-            copper -= converted_silver * 100
-            silver += converted_silver
-
-        # Convert silver to gold (100 silver = 1 gold)
-        if silver >= 100:
-            converted_gold = silver // 100
-            silver -= converted_gold * 100
-            gold += converted_gold
-
-        self.global_data_manager.copper = copper
-        self.global_data_manager.silver = silver
-        self.global_data_manager.gold = gold
-        
-        # Update the currency display
-        self.update_money_display()
+                self.copper_label.config(text=f"Copper: {wallet.copper}")
 
-        # Schedule the next conversion and update, only if the window still exists
-        if self.backpack_window and self.backpack_window.winfo_exists():
-            self.auto_update_id = self.root.after(1000, self.auto_convert_money)
-        else:
-            self.stop_auto_update()
-
-    def stop_auto_update(self):
-        """Stop the auto-conversion updates when the backpack window is closed."""
-        if self.auto_update_id:
-            self.root.after_cancel(self.auto_update_id)
-            self.auto_update_id = None
+    def is_inventory_shown(self):
+        return bool(self.backpack_window and self.backpack_window.winfo_exists()
+                    and self.user_tree and self.user_tree.winfo_exists())
 
     def refresh_backpack_inventory(self):
         """Refresh the inventory table in the backpack window."""
-        if self.backpack_window and self.backpack_window.winfo_exists():
-            if self.user_tree and self.user_tree.winfo_exists():
-                # Clear current inventory
-                for row in self.user_tree.get_children():
-                    self.user_tree.delete(row)
-
-                # Insert updated inventory
-                for item in self.global_data_manager.user_items:
-                    self.user_tree.insert("", tk.END, values=(item["data_id"], item["name"], item["amount"]))
-        else:
-            self.stop_auto_update()
+        if self.is_inventory_shown():
+            self.changed_entries.clear()
+            self.reset_pending = False
+            self.user_table.set_rows(self.get_inventory_rows())
+
+    def get_inventory_rows(self):
+        """Return the inventory as table rows, keyed by entry since an item can fill several entries."""
+        return {id(item): (item["data_id"], item["name"], item["amount"])
+                for item in self.global_data_manager.user_items}
+
+    def on_inventory_changed(self, item_id, item):
+        if self.is_inventory_shown():
+            self.changed_entries[id(item)] = item
+            self.schedule_apply_changes()
+
+    def on_inventory_removed(self, item_id, item):
+        if self.is_inventory_shown():
+            self.changed_entries[id(item)] = None
+            self.schedule_apply_changes()
+
+    def on_inventory_reset(self, key, record):
+        if self.is_inventory_shown():
+            self.reset_pending = True
+            self.schedule_apply_changes()
+
+    def schedule_apply_changes(self):
+        if self.apply_task is None:
+            self.apply_task = self.root.after_idle(self.apply_changes)
+
+    def apply_changes(self):
+        """Apply the inventory changes since the last call to the table, touching only their rows."""
+        self.apply_task = None
+        if not self.is_inventory_shown():
+            return
+        if self.reset_pending:
+            self.refresh_backpack_inventory()
+            return
+        changed, self.changed_entries = self.changed_entries, {}
+        rows = {key: (item["data_id"], item["name"], item["amount"]) for key, item in changed.items() if item is not None}
+        self.user_table.update_rows(rows, [key for key, item in changed.items() if item is None])
 
     def show_backpack(self):
         """Display the backpack window with the user's inventory and currency."""
@@ -89,19 +95,17 @@ class BackpackManager:
         self.backpack_window = tk.Toplevel(self.root)
         self.backpack_window.title("Backpack")
 
-        # Ensure auto-conversion stops when the backpack window is closed
-        self.backpack_window.protocol("WM_DELETE_WINDOW", lambda: (self.stop_auto_update(), self.backpack_window.destroy()))
-
         # Create a frame to hold the currency display
         self.money_frame = tk.Frame(self.backpack_window)
         self.money_frame.pack(fill=tk.X, padx=10, pady=10)
 
         # Display the currency labels
-        self.gold_label = tk.Label(self.money_frame, text=f"Gold: {self.global_data_manager.gold}")
+        wallet = self.global_data_manager.wallet
+        self.gold_label = tk.Label(self.money_frame, text=f"Gold: {wallet.gold}")
         self.gold_label.pack(side=tk.LEFT, padx=5)
-        self.silver_label = tk.Label(self.money_frame, text=f"Silver: {self.global_data_manager.silver}")
+        self.silver_label = tk.Label(self.money_frame, text=f"Silver: {wallet.silver}")
         self.silver_label.pack(side=tk.LEFT, padx=5)
-        self.copper_label = tk.Label(self.money_frame, text=f"Copper: {self.global_data_manager.copper}")
+        self.copper_label = tk.Label(self.money_frame, text=f"Copper: {wallet.copper}")
         self.copper_label.pack(side=tk.LEFT, padx=5)
 
         # Create a frame to display the user's inventory
@@ -109,86 +113,22 @@ class BackpackManager:
         self.user_tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
         self.user_columns = ("Data ID", "Name", "Amount")
-        self.user_tree = ttk.Treeview(self.user_tree_frame, columns=self.user_columns, show="headings")
-        self.user_tree.heading("Data ID", text="Data ID")
-        self.user_tree.heading("Name", text="Name")
-        self.user_tree.heading("Amount", text="Amount")
-
-        # Insert the user's inventory items into the tree view
-        for item in self.global_data_manager.user_items:
-            self.user_tree.insert("", tk.END, values=(item["data_id"], item["name"], item["amount"]))
+        self.user_table = VirtualTable(self.user_tree_frame, self.user_columns, numeric_columns=("Amount",))
+        self.user_tree = self.user_table.tree
 
-        self.user_tree.pack(fill=tk.BOTH, expand=True)
+        # Insert the user's inventory items into the table
+        self.user_table.set_rows(self.get_inventory_rows())
 
-        # Start the auto-conversion process
-        self.auto_convert_money()
+        self.user_table.frame.pack(fill=tk.BOTH, expand=True)
         
     def deduct_currency(self, item_price):
-        """Deduct currency from the user based on the item price."""
-        copper = self.global_data_manager.copper
-        silver = self.global_data_manager.silver
-        gold = self.global_data_manager.gold
-        
-        
-        # Convert all user currency to copper for easy calculations
-        total_user_copper = (gold * 10000) + (silver * 100) + copper
-
-        if total_user_copper >= item_price:
-            # Deduct the item price from the user's total copper
-            total_user_copper -= item_price
-
-            # Convert back to gold, silver, and copper
-            gold = total_user_copper // 10000
-            remaining_copper = total_user_copper % 10000
-            silver = remaining_copper // 100
-            copper = remaining_copper % 100
-
-
-            self.global_data_manager.copper = copper
-            self.global_data_manager.silver = silver
-            self.global_data_manager.gold = gold
-
-
-            # Update the currency display after purchase
-            self.update_money_display()
-            return True
-        else:
-            return False
-
+        """Deduct currency from the user based on the item price. Return False if the user cannot afford it."""
+        return self.global_data_manager.wallet.debit(item_price)
 
     def receive_currency(self, amount_received):
         """Add currency to the user's balance based on the amount received."""
-        
-        copper = self.global_data_manager.copper
-        silver = self.global_data_manager.silver
-        gold = self.global_data_manager.gold
-        
-        # Convert all user currency to copper for easy calculations
-        total_user_copper = (gold * 10000) + (silver * 100) + copper
-
-        # Add the received amount to the user's total copper
-        total_user_copper += amount_received
+        self.global_data_manager.wallet.credit(amount_received)
 
-        # Convert back to gold, silver, and copper
-        gold = total_user_copper // 10000
-        remaining_copper = total_user_copper % 10000
-        silver = remaining_copper // 100
-        copper = remaining_copper % 100
-
-        self.global_data_manager.copper = copper
-        self.global_data_manager.silver = silver
-        self.global_data_manager.gold = gold
-        
-        # Update the currency display after receiving money
-        self.update_money_display()
-        
-    
     def add_to_inventory(self,item, amount):
         """Add purchased item to the user's inventory."""
-        for user_item in  self.global_data_manager.user_items:
-            if user_item["item_id"] == item["item_id"]:
-                user_item["amount"] += amount  # Increase amount if the item exists
-                return
-        # If the item doesn't exist, add it
-        self.global_data_manager.user_items.append({"item_id": item['item_id'], "name": item['name'], "amount":  amount, "data_id" : item['data_id']})
-        
\ No newline at end of file
+        trades.add_to_inventory(self.global_data_manager, item["item_id"], item["name"], item["data_id"], amount)
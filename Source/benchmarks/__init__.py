@@ -0,0 +1,4 @@
+"""Headless benchmarks for the market, demand and pricing hot paths.
+
+Run from the Source folder:  python -m benchmarks --scales 1000,10000 --output bench.json
+"""
@@ -0,0 +1,204 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tkinter
+import tracemalloc
+
+import demands_control
+import fixed_price_market
+import global_data
+import selling_market
+import simulation_engine
+import trades
+from order_book import BUY, SELL, Exchange
+from search_index import IncrementalSearch
+from benchmarks import synthetic
+
+DEFAULT_SCALES = (1000, 10000, 100000, 1000000)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def build_hot_paths(data, engine):
+    """Return (name, operation) pairs for every hot path, each operation being one call of it."""
+    # Managers are used without their windows, which only need a Tcl interpreter, not a display
+    if tkinter._default_root is None:
+        tkinter._default_root = tkinter.Tcl()
+    selling_market_manager = selling_market.SellingMarketManager(None, data)
+    demands_manager = demands_control.DemandsManager(None, data, selling_market_manager, engine)
+    fixed_price_manager = fixed_price_market.FixedPriceMarketManager(None, data, engine)
+    market_search = IncrementalSearch(data.market_search_index)
+
+    def type_market_search():
+        for query in ("i", "it", "ite", "item", "item ", "item 0", "item 00"):
+            market_search.search(query, data.market_revision)
+
+    # Order books over the catalog, started empty with the same order stream on every call so the workload never drifts
+    data_ids = [item["data_id"] for item in data.items_list]
+
+    def order_book_ops():
+        exchange = Exchange()
+        order_rng = random.Random(0)
+        resting = []
+        for _ in range(1000):
+            if resting and order_rng.random() < 0.3:
+                position = order_rng.randrange(len(resting))
+                resting[position], resting[-1] = resting[-1], resting[position]
+                exchange.cancel(resting.pop())
+            else:
+                side = BUY if order_rng.random() < 0.5 else SELL
+                price = order_rng.randint(90, 110) if side == BUY else order_rng.randint(95, 115)
+                order, fills = exchange.place(order_rng.choice(data_ids), side, price, order_rng.randint(1, 20))
+                if order.amount:
+                    resting.append(order.order_id)
+
+    # An empty demand board, pricing from the market's supply, refilled by one batch per call and cleared again
+    board = global_data.GlobalDataManager(storage_backend='memory')
+    board.items_list, board.data_list = data.items_list, data.data_list
+    board.rebuild_catalog_indexes()
+    board.rebuild_market_indexes()
+    board.rebuild_user_item_indexes()
+    board.rebuild_demand_indexes()
+    board.market_price_index = data.market_price_index
+    board.rng.reseed(0)
+    board_engine = simulation_engine.SimulationEngine(board, engine.current_time, engine.instrumentation)
+
+    def refill_demand_board():
+        board_engine.generate_demands_batch(10000, limit=10000)
+        board.clear_demands()
+
+    # A bot's basket: 50 fixed price round trips, buying then selling back each item
+    trade_rng = random.Random(1)
+    names = [item["name"] for item in data.items_list]
+
+    def trade_basket():
+        basket = []
+        for name in trade_rng.sample(names, min(50, len(names))):
+            basket.append({"type": trades.FIXED_BUY, "name": name, "amount": 1})
+            basket.append({"type": trades.FIXED_SELL, "name": name, "amount": 1})
+        data.wallet.set_balance(10 ** 9)
+        trades.execute_trades(data, basket, engine, fixed_price_manager.quote_engine)
+
+    return [
+        # MarketManager.refresh_market: one second of listing expiry and market generation
+        ("market_step_1s", lambda: engine.step(engine.refresh_rate)),
+        # MarketManager.regenerate_items: one generated listing
+        ("regenerate_item", engine.generate_market_item),
+        # DemandsManager.refresh_loop: one demand timer update
+        ("demands_refresh_loop", lambda: engine.update_demand_timers(engine.demand_refresh_rate)),
+        ("all_demands_change", engine.all_demands_change),
+        # DemandsManager.generate_demands_batch: an empty board refilled with 10000 demands, vectorized with NumPy
+        ("demands_batch_10000", refill_demand_board),
+        ("get_filtered_demands", lambda: demands_manager.get_filtered_demands("item 00")),
+        # Typing "item 00" in the market search box, one search per keystroke
+        ("market_search_typing", type_market_search),
+        # FixedPriceMarketManager.refresh_table without the Treeview: quote every catalog item
+        ("fixed_price_refresh_table", fixed_price_manager.quote_engine.refresh),
+        # A search keystroke in the fixed price market, served from the cached quotes
+        ("fixed_price_search", lambda: fixed_price_manager.quote_engine.get_quotes("item 00")),
+        # MarketManager.refresh_table without the Treeview: the rows of every available listing
+        ("market_table_rows", lambda: data.in_market_items.available_rows(engine.current_time)),
+        # Bulk operations over the listing columns, vectorized when NumPy is installed
+        ("listing_expiry_sweep", lambda: data.in_market_items.expired_item_ids(engine.current_time + 600)),
+        ("listing_price_aggregates", data.in_market_items.price_aggregates),
+        ("listing_sort_by_price", lambda: data.in_market_items.sorted_item_ids("price")),
+        # 1000 limit order placements and cancels, with price-time matching
+        ("order_book_1000_ops", order_book_ops),
+        # 100 trades validated and applied as one transaction
+        ("trade_basket_100", trade_basket),
+    ]
+
+
+def measure(operation, min_ops, max_ops, max_seconds):
+    """Time repeated calls of operation and return the statistics as a dict."""
+    # Peak memory allocated by a single call, measured apart since tracing slows every call down
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    operation()
+    peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_ops and (len(latencies) < min_ops or time.perf_counter() - started < max_seconds):
+        call_started = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - call_started)
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / total if total > 0 else None,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_scale(scale, catalog_size, min_ops, max_ops, max_seconds, seed):
+    """Build a market of `scale` listings and demands and time every hot path on it."""
+    start_time = 1_000_000.0
+    tracemalloc.start()
+    build_started = time.perf_counter()
+    data = synthetic.build_global_data(scale, scale, catalog_size, start_time, seed)
+    build_seconds = time.perf_counter() - build_started
+    dataset_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    engine = simulation_engine.SimulationEngine(data, start_time=start_time)
+    engine.MAX_ITEMS = scale * 2
+    engine.max_demands = scale * 2
+
+    results = {
+        "listings": scale,
+        "demands": scale,
+        "catalog_size": catalog_size,
+        "build_seconds": build_seconds,
+        "dataset_memory_bytes": dataset_memory,
+        "hot_paths": {},
+    }
+    for name, operation in build_hot_paths(data, engine):
+        results["hot_paths"][name] = measure(operation, min_ops, max_ops, max_seconds)
+        print(f"  {name}: {results['hot_paths'][name]['p50_ms']:.3f} ms p50", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the market hot paths on synthetic data.")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in DEFAULT_SCALES),
+                        help="Comma separated numbers of listings and demands")
+    parser.add_argument("--catalog-size", type=int, default=None,
+                        help="Number of catalog items, scale / 100 (at least 36) by default")
+    parser.add_argument("--min-ops", type=int, default=5)
+    parser.add_argument("--max-ops", type=int, default=1000)
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="Time budget per hot path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": simulation_engine.numpy is not None,
+        "scales": {},
+    }
+    for scale in (int(value) for value in args.scales.split(",")):
+        catalog_size = args.catalog_size or max(36, scale // 100)
+        print(f"Scale {scale}:", file=sys.stderr)
+        report["scales"][str(scale)] = run_scale(scale, catalog_size, args.min_ops, args.max_ops, args.max_seconds, args.seed)
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
@@ -0,0 +1,78 @@
+import random
+
+import global_data
+
+
+def build_catalog(size, rng):
+    """Return synthetic (items_list, data_list) entries shaped like GlobalDataManager.new_item/new_data."""
+    items_list = []
+    data_list = []
+    for index in range(size):
+        data_id = str(1000 + index)
+        name = f"Item {index:06d}"
+        price = rng.randint(3, 1000)
+        items_list.append({
+            "item_id": str(index + 1),
+            "name": name,
+            "price": price,
+            "amount": rng.randint(1, 200),
+            "not_available_timer": float(rng.choice([30, 60, 360, 480, 720, 1440])),
+            "data_id": data_id,
+            "weight": rng.choice([0.5, 1, 3, 5, 7, 10])
+        })
+        data_list.append({
+            "id": data_id,
+            "name": name,
+            "description": "Synthetic benchmark item.",
+            "default_price": price,
+            "type": "Goods",
+            "stack_number": 100
+        })
+    return items_list, data_list
+
+
+def build_listings(items_list, count, current_time, rng):
+    """Return count market listings, with expiry times spread over the next hour."""
+    listings = []
+    for item_id in range(1, count + 1):
+        base_item = rng.choice(items_list)
+        listings.append({
+            "item_id": item_id,
+            "name": base_item["name"],
+            "price": int(base_item["price"] * rng.uniform(0.85, 1.85)),
+            "amount": max(1, int(base_item["amount"] * rng.uniform(0.15, 2.5))),
+            "available_time_at": current_time,
+            "expires_at": current_time + rng.uniform(1, 3600),
+            "data_id": base_item["data_id"]
+        })
+    return listings
+
+
+def build_demands(items_list, count, rng):
+    """Return count demands, with timers spread over the next hour."""
+    demands = []
+    for demand_id in range(1, count + 1):
+        base_item = rng.choice(items_list)
+        demands.append({
+            "demand_id": demand_id,
+            "item_id": base_item["item_id"],
+            "buy_price": int(base_item["price"] * rng.uniform(0.9, 1.8)),
+            "max_amount": rng.randint(1, 20),
+            "not_available_timer": rng.uniform(1, 3600)
+        })
+    return demands
+
+
+def build_global_data(listing_count, demand_count, catalog_size, current_time, seed=0):
+    """Return a GlobalDataManager filled with synthetic data, without reading or writing the Data folder."""
+    rng = random.Random(seed)
+    data = global_data.GlobalDataManager(storage_backend='memory')
+    data.items_list, data.data_list = build_catalog(catalog_size, rng)
+    data.in_market_items = build_listings(data.items_list, listing_count, current_time, rng)
+    data.demands_list = build_demands(data.items_list, demand_count, rng)
+    data.rng.reseed(seed)  # The engine draws from these streams, so every run generates the same market
+    data.rebuild_catalog_indexes()
+    data.rebuild_market_indexes()
+    data.rebuild_user_item_indexes()
+    data.rebuild_demand_indexes()
+    return data
@@ -0,0 +1,39 @@
+LISTING_ADDED = "listing_added"
+LISTING_UPDATED = "listing_updated"
+LISTING_REMOVED = "listing_removed"
+LISTINGS_RESET = "listings_reset"  # The listings were cleared or replaced as a whole
+DEMAND_ADDED = "demand_added"
+DEMAND_UPDATED = "demand_updated"
+DEMAND_REMOVED = "demand_removed"
+DEMANDS_RESET = "demands_reset"
+INVENTORY_ADDED = "inventory_added"
+INVENTORY_UPDATED = "inventory_updated"
+INVENTORY_REMOVED = "inventory_removed"
+INVENTORY_RESET = "inventory_reset"
+WALLET_CHANGED = "wallet_changed"
+
+
+class ChangeBus:
+    """Typed change events of the GlobalDataManager, published after every mutation.
+
+    Callbacks are called with (key, record): the item_id, demand_id or inventory
+    item_id of the changed record and the record itself (None for removed listings
+    and for the resets, whose key is None). The countdown timers are not changes,
+    they move with the clock of the engine.
+    """
+
+    def __init__(self):
+        self.listeners = {}  # Event type -> list of callbacks
+
+    def subscribe(self, event_type, callback):
+        self.listeners.setdefault(event_type, []).append(callback)
+
+    def unsubscribe(self, event_type, callback):
+        if callback in self.listeners.get(event_type, []):
+            self.listeners[event_type].remove(callback)
+
+    def publish(self, event_type, key=None, record=None):
+        callbacks = self.listeners.get(event_type)
+        if callbacks:
+            for callback in list(callbacks):
+                callback(key, record)
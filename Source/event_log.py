@@ -0,0 +1,258 @@
+import os
+import struct
+import time
+
+MAGIC = b"MKTEVT1\n"
+
+# Event kinds and their fields, in record order. Field types: q = int64, d = float64,
+# s = string, stored once in a string record and referenced by a uint32 code afterwards
+EVENT_TYPES = {
+    "session_start": (),  # A new recording session, the listings and demands that follow are its starting state
+    "listing_add": (("item_id", "q"), ("name", "s"), ("price", "q"), ("amount", "q"),
+                    ("available_time_at", "d"), ("expires_at", "d"), ("data_id", "s")),
+    "listing_expire": (("item_id", "q"),),
+    "market_clear": (),
+    "listing_buy": (("item_id", "q"), ("amount", "q"), ("price", "q")),
+    "demand_add": (("demand_id", "q"), ("item_id", "s"), ("buy_price", "q"), ("max_amount", "q"),
+                   ("not_available_timer", "d")),
+    "demand_price": (("demand_id", "q"), ("buy_price", "q")),
+    "demand_fill": (("demand_id", "q"), ("amount", "q"), ("price", "q")),
+    "demand_expire": (("demand_id", "q"),),
+    "demands_clear": (),
+    "fixed_buy": (("name", "s"), ("amount", "q"), ("price", "q")),
+    "fixed_sell": (("name", "s"), ("amount", "q"), ("price", "q")),
+    "gamble": (("game", "s"), ("stake", "q"), ("reward", "q"), ("detail", "s")),
+    "wallet": (("balance", "q"),),
+}
+KIND_NAMES = list(EVENT_TYPES)  # Kind code -> kind, code 0 is reserved for string records
+KIND_CODES = {kind: code + 1 for code, kind in enumerate(KIND_NAMES)}
+
+STRING_RECORD = struct.Struct("<BIH")  # 0, string code, byte length; the UTF-8 bytes follow
+EVENT_HEADER = struct.Struct("<Bd")  # Kind code, simulated time
+EVENT_PAYLOADS = {kind: struct.Struct("<" + "".join("I" if field_type == "s" else field_type for _, field_type in fields))
+                  for kind, fields in EVENT_TYPES.items()}
+
+
+class EventLog:
+    """Compact binary log of the state changing events of a game session.
+
+    Every event is a one byte kind, its simulated time as a float64 and a fixed size
+    payload; strings (names, catalog ids) are written once and then referenced by code.
+    The log is disabled until open() is called, so recording costs one check when off.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.file = None
+        self.clock = time.time  # Returns the simulated time of the events
+        self.string_codes = {}
+        self.event_count = 0
+
+    def open(self, file_path, clock=None):
+        """Start appending events to file_path, timestamped by clock()."""
+        self.close()
+        if clock is not None:
+            self.clock = clock
+        new_file = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self.file = open(file_path, 'ab')
+        if new_file:
+            self.file.write(MAGIC)
+        self.enabled = True
+        self.record("session_start")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.enabled = False
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def string_code(self, value):
+        value = str(value)
+        code = self.string_codes.get(value)
+        if code is None:
+            code = self.string_codes[value] = len(self.string_codes)
+            data = value.encode("utf-8")
+            self.file.write(STRING_RECORD.pack(0, code, len(data)) + data)
+        return code
+
+    def record(self, kind, **fields):
+        """Append one event, with the fields listed for its kind in EVENT_TYPES."""
+        if not self.enabled:
+            return
+        if kind == "session_start":
+            self.string_codes = {}  # String codes are per session, so every session can be read on its own
+        values = []
+        for name, field_type in EVENT_TYPES[kind]:
+            value = fields[name]
+            values.append(self.string_code(value) if field_type == "s" else value)
+        self.file.write(EVENT_HEADER.pack(KIND_CODES[kind], self.clock()) + EVENT_PAYLOADS[kind].pack(*values))
+        self.event_count += 1
+
+    def record_listing_add(self, item):
+        self.record("listing_add", **{name: item[name] for name, _ in EVENT_TYPES["listing_add"]})
+
+    def record_demand_add(self, demand):
+        self.record("demand_add", **{name: demand[name] for name, _ in EVENT_TYPES["demand_add"]})
+
+    def record_state(self, global_data_manager):
+        """Record the current listings, demands and wallet, the starting state of a session."""
+        if not self.enabled:
+            return
+        for item in global_data_manager.in_market_items:
+            self.record_listing_add(item)
+        for demand in global_data_manager.demands_list:
+            self.record_demand_add(demand)
+        self.record("wallet", balance=global_data_manager.wallet.balance)
+        self.flush()
+
+
+def read_events(file_path):
+    """Yield (kind, simulated time, fields) for every complete event of a log."""
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{file_path} is not an event log")
+
+    strings = {}
+    position = len(MAGIC)
+    end = len(data)
+    while position < end:
+        kind_code = data[position]
+        if kind_code == 0:
+            if position + STRING_RECORD.size > end:
+                break
+            _, code, length = STRING_RECORD.unpack_from(data, position)
+            position += STRING_RECORD.size
+            strings[code] = data[position:position + length].decode("utf-8")
+            position += length
+            continue
+
+        kind = KIND_NAMES[kind_code - 1]
+        payload = EVENT_PAYLOADS[kind]
+        if position + EVENT_HEADER.size + payload.size > end:
+            break  # A crash in the middle of a write leaves a partial last event
+        _, event_time = EVENT_HEADER.unpack_from(data, position)
+        values = payload.unpack_from(data, position + EVENT_HEADER.size)
+        position += EVENT_HEADER.size + payload.size
+        if kind == "session_start":
+            strings = {}
+        fields = {}
+        for (name, field_type), value in zip(EVENT_TYPES[kind], values):
+            fields[name] = strings[value] if field_type == "s" else value
+        yield kind, event_time, fields
+
+
+def replay(file_path, global_data_manager, engine=None, notify=False):
+    """Apply every event of a log to global_data_manager as fast as possible and return the replay statistics.
+
+    The engine clock, if given, follows the event timestamps; with notify the engine
+    listeners are called after every event that changed their topic.
+    """
+    data = global_data_manager
+    counts = {}
+    started = time.perf_counter()
+    for kind, event_time, fields in read_events(file_path):
+        counts[kind] = counts.get(kind, 0) + 1
+        topic = None
+        if kind == "session_start":
+            data.in_market_items.clear()
+            data.rebuild_market_indexes()
+            data.demands_list.clear()
+            data.rebuild_demand_indexes()
+        elif kind == "listing_add":
+            existing = data.get_market_item(fields["item_id"])
+            if existing:
+                data.remove_market_item(existing)
+            data.add_market_item(fields)
+            topic = "market"
+        elif kind == "market_clear":
+            data.in_market_items.clear()
+            data.rebuild_market_indexes()
+            topic = "market"
+        elif kind == "listing_expire":
+            item = data.get_market_item(fields["item_id"])
+            if item:
+                data.remove_market_item(item)
+                topic = "market"
+        elif kind == "listing_buy":
+            item = data.get_market_item(fields["item_id"])
+            if item:
+                data.update_market_item(item, amount=item["amount"] - fields["amount"])
+                if item["amount"] <= 0:
+                    data.remove_market_item(item)
+                topic = "market"
+        elif kind == "demand_add":
+            existing = data.get_demand(fields["demand_id"])
+            if existing:
+                data.remove_demand(existing)
+            data.add_demand(fields)
+            topic = "demands"
+        elif kind == "demand_price":
+            demand = data.get_demand(fields["demand_id"])
+            if demand:
+                data.update_demand(demand, buy_price=fields["buy_price"])
+                topic = "demands"
+        elif kind == "demand_fill":
+            demand = data.get_demand(fields["demand_id"])
+            if demand:
+                data.update_demand(demand, max_amount=demand["max_amount"] - fields["amount"])
+                if demand["max_amount"] <= 0:
+                    data.remove_demand(demand)
+                topic = "demands"
+        elif kind == "demands_clear":
+            data.demands_list.clear()
+            data.rebuild_demand_indexes()
+            topic = "demands"
+        elif kind == "demand_expire":
+            demand = data.get_demand(fields["demand_id"])
+            if demand:
+                data.remove_demand(demand)
+                topic = "demands"
+        elif kind == "wallet":
+            data.wallet.set_balance(fields["balance"])
+        # Fixed price trades and gambling only move money, which the wallet events replay
+
+        if engine:
+            engine.current_time = event_time
+            if notify and topic:
+                engine.notify(topic)
+
+    elapsed = time.perf_counter() - started
+    events = sum(counts.values())
+    return {
+        "events": events,
+        "seconds": elapsed,
+        "events_per_sec": events / elapsed if elapsed > 0 else None,
+        "counts": counts,
+    }
+
+
+EVENT_LOG = EventLog()  # Shared by every module of the game
+
+
+if __name__ == "__main__":
+    # Offline replay: python event_log.py [log file]
+    import json
+    import sys
+    import global_data
+    from simulation_engine import SimulationEngine
+
+    data = global_data.GlobalDataManager()
+    # replaying_journal stays True, so the replay never touches the saved game
+    data.items_list = data.new_item()
+    data.data_list = data.new_data()
+    data.rebuild_catalog_indexes()
+    data.rebuild_market_indexes()
+    data.rebuild_user_item_indexes()
+    data.rebuild_demand_indexes()
+    engine = SimulationEngine(data)
+
+    log_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data.data_folder, "events.bin")
+    stats = replay(log_file, data, engine)
+    print(json.dumps(stats, indent=4))
+    print(f"{len(data.in_market_items)} listings, {len(data.demands_list)} demands, "
+          f"wallet {data.wallet.balance} copper at simulated time {engine.current_time:.1f}")
@@ -1,18 +1,27 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import random
+from tkinter import messagebox
+import time
+
+from instrumentation import INSTRUMENTATION
+import quote_engine
+from scheduler import SCHEDULER
+import trades
+from virtual_table import VirtualTable
 
 class FixedPriceMarketManager:
-    def __init__(self, root, global_data_manager):
+    def __init__(self, root, global_data_manager, engine):
         self.root = root
         self.global_data_manager = global_data_manager
+        self.engine = engine  # Clock of the quotes, notified of the trades
         self.selling_window = None
         self.selling_window_open = False
-        self.demands_tree = None
+        self.prices_table = None  # VirtualTable showing the quotes
+        self.demands_tree = None  # Its TreeView widget
         self.backpack_manager = None
         self.refresh_task = None  # Track the refresh task ID
         self.refresh_price_time = 10000
         self.search_var = tk.StringVar()
+        self.quote_engine = quote_engine.QuoteEngine(global_data_manager, engine, self.refresh_price_time / 1000)
 
 
     def set_backpack_manager(self, backpack_manager):
@@ -20,28 +29,13 @@ class FixedPriceMarketManager:
 
     def create_fixed_price_table(self, parent):
         """Create a table for displaying items with buy/sell prices, with sorting and search functionality."""
-        self.table_frame = tk.Frame(parent)
-        self.table_frame.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
-
-        scrollbar = tk.Scrollbar(self.table_frame, orient="vertical")
-        scrollbar.grid(row=0, column=1, sticky="ns")
-
         columns = ("Item ID", "Name", "Sell Price", "Purchase Price")
-        self.demands_tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-
-        # Set table headers and column properties, and bind each header for sorting
-        for col in columns:
-            self.demands_tree.heading(col, text=col, anchor=tk.CENTER,
-                                      command=lambda _col=col: self.sort_by_column(_col, False))
-            self.demands_tree.column(col, anchor=tk.CENTER, width=150)
-
-        self.demands_tree.grid(row=0, column=0, sticky="nsew")
-        self.table_frame.grid_rowconfigure(0, weight=1)
-        self.table_frame.grid_columnconfigure(0, weight=1)
-
-        scrollbar.config(command=self.demands_tree.yview)
+        self.prices_table = VirtualTable(parent, columns, widths={col: 150 for col in columns},
+                                         numeric_columns=("Sell Price", "Purchase Price"))
+        self.table_frame = self.prices_table.frame
+        self.table_frame.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
 
-        return self.demands_tree
+        return self.prices_table.tree
 
     def create_search_box(self, parent):
         """Create a search box for filtering items in the table."""
@@ -58,21 +52,7 @@ class FixedPriceMarketManager:
     
     def sort_by_column(self, col, reverse):
         """Sort the table by the selected column."""
-        data = [(self.demands_tree.set(k, col), k) for k in self.demands_tree.get_children('')]
-
-        # Perform the sort, converting numeric columns to integers
-        if col in ("Sell Price", "Purchase Price"):
-            data.sort(key=lambda t: int(t[0]), reverse=reverse)
-        else:
-            data.sort(key=lambda t: t[0].lower(), reverse=reverse)
-
-        for index, (val, k) in enumerate(data):
-            self.demands_tree.move(k, '', index)
-
-        self.demands_tree.heading(col, command=lambda: self.sort_by_column(col, not reverse))
-
-        
-        
+        self.prices_table.sort_by(col, reverse)
 
     def open_fixed_price_market(self):
         """Open a new window displaying items with buy/sell prices."""
@@ -110,86 +90,49 @@ class FixedPriceMarketManager:
         self.selling_window.grid_columnconfigure(0, weight=1)
 
 
-    def refresh_table(self):
-        """Populate the table with items from items_list and calculate the buy/sell prices, while preserving the selection and applying search filters."""
+    def refresh_table(self, requote=False):
+        """Show the cached quotes matching the search; the table keeps the selection and the sorting.
+
+        Searching only filters the quotes of the current refresh window, requote=True re-prices the catalog first.
+        """
         if not self.demands_tree:
             return
 
-        search_term = self.search_var.get().lower().strip()  # Get search term
-
-        selected_item = self.demands_tree.focus()
-        selected_item_id = None
-        if selected_item:
-            selected_item_id = self.demands_tree.item(selected_item, 'values')[0]
-
-        self.demands_tree.delete(*self.demands_tree.get_children())
-
-        for item in self.global_data_manager.items_list:
-            item_name = item['name'].lower()
-
-            # Apply search filter
-            if search_term and search_term not in item_name:
-                continue
-
-            lowest_market_price = self.get_lowest_market_price(item['data_id'])
-            buy_price_from_user = int(lowest_market_price) if lowest_market_price > 0 else int(item['price'])
-            highest_market_price = self.get_highest_market_price(item['data_id'])
-            sell_price_to_user = int(max(item['price'], highest_market_price * 0.9))
-
-            sell_price_to_user = self.apply_randomness(sell_price_to_user)
-            if sell_price_to_user < buy_price_from_user:
-                sell_price_to_user = buy_price_from_user + 1
-
-            item_iid = self.demands_tree.insert("", tk.END, values=(
-                item['item_id'],
-                item['name'],
-                buy_price_from_user,
-                sell_price_to_user
-            ))
-
-            if selected_item_id and str(item['item_id']) == str(selected_item_id):
-                self.demands_tree.selection_set(item_iid)
-                self.demands_tree.focus(item_iid)
-
-    def apply_randomness(self, price):
-        randomness_factor = random.uniform(1, 1.15)
-        return int(price * randomness_factor)
-
-    def get_lowest_market_price(self, data_id):
-        matching_items = [item for item in self.global_data_manager.in_market_items if item['data_id'] == data_id]
-        if matching_items:
-            return min(item['price'] for item in matching_items)
-        return 0
-
-    def get_highest_market_price(self, data_id):
-        matching_items = [item for item in self.global_data_manager.in_market_items if item['data_id'] == data_id]
-        if matching_items:
-            return max(item['price'] for item in matching_items)
-        return 0
-    
+        search_term = self.search_var.get()  # Get search term
+
+        started = time.perf_counter()
+        if requote:
+            self.quote_engine.refresh()
+        quotes = self.quote_engine.get_quotes(search_term)
+
+        rows_touched = self.prices_table.set_rows({
+            quote['item_id']: (quote['item_id'], quote['name'], quote['buy_price'], quote['sell_price'])
+            for quote in quotes
+        })
+        INSTRUMENTATION.record("view.fixed_price_refresh", time.perf_counter() - started, rows=rows_touched)
+
     def auto_refresh_table(self):
-        self.refresh_table()
-        if self.selling_window_open:
-            self.refresh_task = self.root.after(self.refresh_price_time, self.auto_refresh_table)
+        """Re-price the table now, then every refresh_price_time ms while the window is open."""
+        self.refresh_table(requote=True)
+        if self.selling_window_open and self.refresh_task is None:
+            self.refresh_task = SCHEDULER.add("loop.fixed_price_refresh", lambda: self.refresh_table(requote=True),
+                                              self.refresh_price_time / 1000, priority=20)
 
     def stop_auto_refresh(self):
-        if self.refresh_task:
-            self.root.after_cancel(self.refresh_task)
-            self.refresh_task = None
+        SCHEDULER.remove(self.refresh_task)
+        self.refresh_task = None
 
     def buy_selected_item(self):
-        selected_item = self.demands_tree.focus()
-        if selected_item:
-            item_values = self.demands_tree.item(selected_item, 'values')
+        item_values = self.prices_table.get_selected_values()
+        if item_values:
             item_name = item_values[1]
             price_per_item = int(item_values[3])
 
             self.show_amount_popup(item_name, price_per_item, "buy")
 
     def sell_selected_item(self):
-        selected_item = self.demands_tree.focus()
-        if selected_item:
-            item_values = self.demands_tree.item(selected_item, 'values')
+        item_values = self.prices_table.get_selected_values()
+        if item_values:
             item_name = item_values[1]
             price_per_item = int(item_values[2])
 
@@ -197,9 +140,8 @@ class FixedPriceMarketManager:
 
     def sell_selected_item(self):
         """Handle selling the selected item to the market."""
-        selected_item = self.demands_tree.focus()
-        if selected_item:
-            item_values = self.demands_tree.item(selected_item, 'values')
+        item_values = self.prices_table.get_selected_values()
+        if item_values:
             item_name = item_values[1]
             price_per_item = int(item_values[2])  # Market's buying price (Buy Price from User)
 
@@ -209,8 +151,8 @@ class FixedPriceMarketManager:
     def show_amount_popup(self, item_name, price_per_item, action):
         """Display a popup window to select the quantity to buy/sell."""
         
-        # Calculate total available currency (convert to copper for simplicity)
-        total_copper = (self.global_data_manager.gold * 10000) + (self.global_data_manager.silver * 100) + self.global_data_manager.copper
+        # Total available currency, in copper
+        total_copper = self.global_data_manager.wallet.balance
         
         # Calculate the maximum amount the player can afford based on the price per item
         max_affordable_amount = total_copper // price_per_item
@@ -218,7 +160,7 @@ class FixedPriceMarketManager:
         # If the action is to "buy", we need to cap the maximum amount by both what the player can afford and item availability
         if action == "buy":
             # Find the target item to check available amount
-            target_item = next(item for item in self.global_data_manager.items_list if item['name'] == item_name)
+            target_item = self.global_data_manager.find_catalog_item_by_name(item_name)
             available_amount = target_item['amount']
 
             # Set the slider's maximum to the lesser of what the player can afford and what's available
@@ -226,7 +168,7 @@ class FixedPriceMarketManager:
         
         elif action == "sell":
             # For selling, set max_amount to the player's inventory amount of the selected item
-            user_item = next((item for item in self.global_data_manager.user_items if item['name'] == item_name), None)
+            user_item = self.global_data_manager.find_target_items_in_user_item(item_name)
             if user_item:
                 max_amount = user_item['amount']
             else:
@@ -263,30 +205,17 @@ class FixedPriceMarketManager:
                     messagebox.showerror("Error", "Please enter a valid amount.")
                     return
                 
-                total_price = amount * price_per_item
-
-                if action == "buy":
-                    # Check if the user has enough money
-                    if self.backpack_manager.deduct_currency(total_price):
-                        # Add the item to the user's inventory
-                        target_item = next(target_item for target_item in self.global_data_manager.items_list if target_item['name'] == item_name)
-                        self.backpack_manager.add_to_inventory(target_item, amount)
-                        self.backpack_manager.auto_convert_money()
-                        messagebox.showinfo("Purchase Successful", f"You bought {amount}x {item_name} for {total_price} copper!")
-                    else:
-                        messagebox.showerror("Insufficient Funds", "You don't have enough money to buy this item.")
-                elif action == "sell":
-                    # Check if the user has the item in their inventory
-                    user_item = next((item for item in self.global_data_manager.user_items if item['name'] == item_name), None)
-                    if user_item and user_item['amount'] >= amount:
-                        # Sell the item and give the user currency
-                        self.backpack_manager.receive_currency(total_price)
-                        user_item['amount'] -= amount
-                        if user_item['amount'] <= 0:
-                            self.global_data_manager.user_items.remove(user_item)
-                        messagebox.showinfo("Sell Successful", f"You sold {amount}x {item_name} for {total_price} copper!")
-                    else:
-                        messagebox.showerror("Error", f"You don't have enough {item_name} to sell.")
+                # The shown price is a limit, in case the quotes were refreshed since the popup opened
+                trade_type = trades.FIXED_BUY if action == "buy" else trades.FIXED_SELL
+                summary = trades.execute_trades(self.global_data_manager, [{
+                    "type": trade_type, "name": item_name, "amount": amount, "price": price_per_item,
+                }], self.engine, self.quote_engine)
+                if not summary["ok"]:
+                    messagebox.showerror("Error", summary["errors"][0][1])
+                elif action == "buy":
+                    messagebox.showinfo("Purchase Successful", f"You bought {amount}x {item_name} for {summary['spent']} copper!")
+                else:
+                    messagebox.showinfo("Sell Successful", f"You sold {amount}x {item_name} for {summary['earned']} copper!")
                 popup_window.destroy()
 
             except ValueError:
@@ -1,12 +1,28 @@
 import json
 import os
 import sys
+import time
+import heapq
 import atexit
+import threading
+
+import change_events
+from change_events import ChangeBus
+from event_log import EVENT_LOG, EventLog
+from journal import Journal
+from listing_store import ListingStore
+from order_book import BUY, SELL
+from price_history import PriceHistory
+from price_index import PriceIndex
+from rng import RngRegistry
+from search_index import SubstringIndex
+from wallet import Wallet
+from storage import SqliteStorage
 
 class GlobalDataManager:
-    def __init__(self, user_items_file='user_items.json', market_items_file='market_items.json', data_file='data.json', items_file='items.json', demands_file='demands.json', wallet_file='wallet.json'):
-        # Determine the correct path for the Data folder
-        self.data_folder = self.get_data_folder()
+    def __init__(self, user_items_file='user_items.json', market_items_file='market_items.json', data_file='data.json', items_file='items.json', demands_file='demands.json', wallet_file='wallet.json', rng_file='rng.json', journal_file='journal.jsonl', storage_backend='json', db_file='market.db', keep_price_history=True):
+        # Determine the correct path for the Data folder, a market kept in memory never creates it
+        self.data_folder = self.get_data_folder(create=storage_backend != 'memory')
 
         # Define file paths using the Data folder
         self.user_items_file = os.path.join(self.data_folder, user_items_file)
@@ -15,23 +31,71 @@ class GlobalDataManager:
         self.items_file = os.path.join(self.data_folder, items_file)  # Read-only
         self.demands_file = os.path.join(self.data_folder, demands_file)
         self.wallet_file = os.path.join(self.data_folder, wallet_file)
+        self.rng_file = os.path.join(self.data_folder, rng_file)
+
+        # Every mutation is appended to the journal, and replayed on top of the JSON files at startup
+        self.journal = Journal(os.path.join(self.data_folder, journal_file))
+        self.journal_compact_threshold = 5000  # Write a new snapshot after this many journal events
+        self.replaying_journal = True  # No journaling until the data is loaded
+
+        self.save_lock = threading.Lock()  # JSON snapshots can be written from an I/O thread
+
+        # Optional storage backend that replaces the JSON files and the journal ('json' or 'sqlite').
+        # 'memory' is for the markets that are not the player's (world towns, benchmarks): they are filled
+        # directly instead of loaded, never saved, and record their game events to a log that stays closed.
+        self.storage = None
+        if storage_backend == 'sqlite':
+            self.storage = SqliteStorage(os.path.join(self.data_folder, db_file))
+            atexit.register(self.storage.close)  # Runs after save_all_data, registered below
 
         # Initialize shared data
         self.user_items = []  # User's inventory
-        self.in_market_items = []  # Runtime items in the market
+        self.in_market_items = ListingStore()  # Runtime items in the market, iterated as dict-like views
         self.items_list = []  # Original items from JSON (Read-only)
         self.data_list = []  # Original data from JSON (Read-only)
         self.removed_item_ids = []
         self.removed_demands_ids = []
         self.demands_list = []
+
+        # Lookup structures over in_market_items, kept in sync by add/remove_market_item
+        self.market_expiry_heap = []  # (expires_at, item_id), stale entries are skipped when popped
+        self.market_price_index = PriceIndex()  # Listing prices aggregated per data_id
+        self.market_search_index = SubstringIndex()  # item_id by listing name
+        self.market_revision = 0  # Bumped whenever a listing is added or removed
+        self.next_market_item_id = 1
+
+        # Prices of the listings, demands and quotes over time, per data_id, in fixed size buffers
+        self.price_history = PriceHistory(enabled=keep_price_history)
+
+        # Optional order books, with the listings as asks and the demands as bids, see attach_exchange
+        self.exchange = None
+        self.listing_orders = {}  # item_id -> order_id of its ask
+        self.demand_orders = {}  # demand_id -> order_id of its bid
+
+        # Lookup indexes over the other lists, rebuilt on load and kept in sync by the add/remove methods
+        self.catalog_items_by_id = {}  # item_id -> entry of items_list
+        self.catalog_items_by_name = {}  # name -> entry of items_list
+        self.catalog_weights = []  # Generation weight of each entry of items_list, in the same order
+        self.data_by_id = {}  # id -> entry of data_list
+        self.user_items_by_id = {}  # item_id -> entry of user_items
+        self.user_items_by_name = {}  # name -> entries of user_items with that name, in inventory order
+        self.demand_index = {}  # demand_id -> entry of demands_list
+        self.demand_positions = {}  # demand_id -> position in demands_list, so a removal needs no scan
+        self.demand_search_index = SubstringIndex()  # demand_id by the name of the demanded item
+        self.next_demand_id = 1
         
-        self.gold = 0
-        self.silver = 0
-        self.copper = 0
-        
-        atexit.register(self.save_all_data)  # Ensure data is saved at exit
+        self.wallet = Wallet()  # The user's money, in copper
+        self.wallet.subscribe(self.on_wallet_change)
+        self.rng = RngRegistry()  # Random streams of the subsystems, saved with the data
+        self.current_time = None  # Simulated clock of the engine, saved with the random streams
+        self.clock_pending = False  # Changes were recorded since the clock was last journaled
+        self.changes = ChangeBus()  # Typed change events, so the views only redraw what changed
+        self.event_log = EVENT_LOG if storage_backend != 'memory' else EventLog()  # Also used by the engine
+
+        if storage_backend != 'memory':
+            atexit.register(self.save_all_data)  # Ensure data is saved at exit
 
-    def get_data_folder(self):
+    def get_data_folder(self, create=True):
         """Determine the correct path to the 'Data' folder, and create it if necessary."""
         if getattr(sys, 'frozen', False):  # If running as a bundled executable
             base_path = os.path.dirname(sys.executable)
@@ -40,9 +104,9 @@ class GlobalDataManager:
         
         data_folder = os.path.join(base_path, "Data")
 
-        # Ensure the Data folder exists
-        if not os.path.exists(data_folder):
-            os.makedirs(data_folder)  # Create the folder if it doesn't exist
+        # Ensure the Data folder exists, world processes may create it at the same time
+        if create:
+            os.makedirs(data_folder, exist_ok=True)
 
         return data_folder
 
@@ -60,25 +124,71 @@ class GlobalDataManager:
 
     def save_json_file(self, file_path, data):
         """Save data to a JSON file."""
-        with open(file_path, 'w') as file:
+        # Write a temporary file first so a crash never leaves a half written file behind
+        temp_file_path = file_path + ".tmp"
+        with open(temp_file_path, 'w') as file:
             json.dump(data, file, indent=4)
+        os.replace(temp_file_path, file_path)
 
     def load_all_data(self):
-        """Load all data from JSON files."""
+        """Load all data from the storage backend, or from JSON files."""
+        # The journal already holds the fills of the order books, so nothing is matched while loading
+        exchange = self.exchange
+        self.exchange = None
+
         # Load read-only files
         self.items_list = self.new_item()
         self.data_list = self.new_data()  # Read-only
 
-        # Load read-write files, creating defaults if necessary
-        self.user_items = self.load_or_create(self.user_items_file, [])
-        self.in_market_items = self.load_or_create(self.market_items_file, [])
-        self.demands_list = self.load_or_create(self.demands_file, [])
-        wallet = self.load_or_create(self.wallet_file, {'Gold': 0, 'Silver': 0, 'Copper': 50})
+        # An empty storage backend imports the JSON files once
+        state = self.storage.load() if self.storage else None
+        importing = self.storage is not None and state is None
+        if state is None:
+            state = self.load_json_state()
+
+        # The listings are stamped in simulated time, so continue the clock they were stamped with
+        rng_state = state.get("rng") or {}
+        if rng_state.get("clock") is not None:
+            self.current_time = rng_state["clock"]
+
+        self.user_items = state["user_items"]
+        self.in_market_items = state["in_market_items"]
+        self.demands_list = state["demands_list"]
+        self.rebuild_catalog_indexes()
+        self.rebuild_market_indexes()
+        self.rebuild_user_item_indexes()
+        self.rebuild_demand_indexes()
+        wallet = state["wallet"]
         
         # Set currency based on the wallet data
-        self.gold = wallet.get('Gold', 0)
-        self.silver = wallet.get('Silver', 0)
-        self.copper = wallet.get('Copper', 50)
+        self.set_wallet(wallet.get('Gold', 0), wallet.get('Silver', 0), wallet.get('Copper', 50))
+
+        # Continue the random streams where the save left them, older saves start from a new seed
+        self.rng.set_state(rng_state)
+
+        # Apply the changes made after the last JSON snapshot, then start journaling
+        self.replaying_journal = True
+        events = self.journal.read_events() if self.storage is None or importing else []
+        for event in events:
+            self.apply_journal_event(event)
+        self.replaying_journal = False
+        if events:
+            print(f"Replayed {len(events)} journal events.")
+        if events or importing:
+            self.save_all_data()  # Compact them into a new snapshot
+
+        if exchange:
+            self.attach_exchange(exchange)
+
+    def load_json_state(self):
+        """Load the read-write JSON files, creating defaults if necessary."""
+        return {
+            "user_items": self.load_or_create(self.user_items_file, []),
+            "in_market_items": self.load_or_create(self.market_items_file, []),
+            "demands_list": self.load_or_create(self.demands_file, []),
+            "wallet": self.load_or_create(self.wallet_file, {'Gold': 0, 'Silver': 0, 'Copper': 50}),
+            "rng": self.load_or_create(self.rng_file, {}),
+        }
 
     def load_or_create(self, file_path, default_data):
         """Load a file if it exists, otherwise create it with default data."""
@@ -92,32 +202,72 @@ class GlobalDataManager:
 
 
     def save_all_data(self):
-        """Save all data to JSON files."""
-        # Save only the read-write data
-        self.save_json_file(self.user_items_file, self.user_items)
-        self.save_json_file(self.market_items_file, self.in_market_items)
-        self.save_json_file(self.demands_file, self.demands_list)
-        
-        # Save wallet data (gold, silver, copper)
-        wallet_data = {
-            'Gold': self.gold,
-            'Silver': self.silver,
-            'Copper': self.copper
-        }
-        self.save_json_file(self.wallet_file, wallet_data)
+        """Save all data to the storage backend or to JSON files, which also compacts the journal."""
+        if self.replaying_journal:
+            return  # Nothing was loaded yet, so the files on disk are still the latest state
+
+        if self.storage:
+            self.storage.save_snapshot({
+                "user_items": self.user_items,
+                "in_market_items": self.in_market_items,
+                "demands_list": self.demands_list,
+                "items_list": self.items_list,
+                "data_list": self.data_list,
+                "wallet": self.get_wallet_data(),
+                "rng": self.get_rng_state(),
+            })
+            print("All data saved successfully.")
+            return
+
+        # Save only the read-write data. The snapshot now contains every journaled change,
+        # trim the journal under the same lock so a background write cannot land in between
+        snapshot = self.get_json_snapshot()
+        with self.save_lock:
+            for file_path, data in snapshot.items():
+                self.save_json_file(file_path, data)
+            self.journal.truncate()
         print("All data saved successfully.")
+
+    def get_json_snapshot(self):
+        """Return the read-write data as file path -> JSON data, copied so it can be written while the game goes on."""
+        return {
+            self.user_items_file: [dict(item) for item in self.user_items],
+            self.market_items_file: self.in_market_items.to_dicts(),
+            self.demands_file: [dict(demand) for demand in self.demands_list],
+            self.wallet_file: self.get_wallet_data(),  # Gold, silver and copper
+            self.rng_file: self.get_rng_state(),
+        }
+
+    def get_rng_state(self):
+        """Return the state of the random streams and the simulated clock, saved together."""
+        state = self.rng.get_state()
+        state["clock"] = self.current_time
+        return state
+
+    def write_json_snapshot(self, snapshot, truncations=None):
+        """Write a snapshot from get_json_snapshot to the JSON files, also from another thread.
+
+        With truncations, the journal.truncations seen when the snapshot was taken, a snapshot
+        that a save_all_data has overtaken since is dropped instead of overwriting the newer
+        files. Returns whether the files were written.
+        """
+        with self.save_lock:
+            if truncations is not None and truncations != self.journal.truncations:
+                return False
+            for file_path, data in snapshot.items():
+                self.save_json_file(file_path, data)
+            return True
         
     def restart(self):
         """Reset the data and set copper to 50."""
         # Reset currency
-        self.gold = 0
-        self.silver = 0
-        self.copper = 50
+        self.set_wallet(0, 0, 50)
         
         # Reset other game data (if needed)
         self.user_items.clear()  # Clear user items
-        self.in_market_items.clear()  # Clear market items
-        self.demands_list.clear()  # Clear demands list
+        self.rebuild_user_item_indexes()
+        self.clear_market_items()  # Clear market items
+        self.clear_demands()  # Clear demands list
         self.removed_item_ids.clear()  # Clear removed item IDs
         self.removed_demands_ids.clear()  # Clear removed demand IDs
 
@@ -127,11 +277,473 @@ class GlobalDataManager:
         self.save_all_data()
         self.load_all_data()
     
-    def find_target_items_in_user_item(self,name):
+    def upsert_market_item(self, item):
+        """Add a listing, or overwrite the fields of the listing with its item_id."""
+        existing = self.get_market_item(item["item_id"])
+        if existing is None:
+            self.add_market_item(item)
+        else:
+            self.update_market_item(existing, **{key: value for key, value in item.items() if key != "item_id"})
+
+    def upsert_demands(self, demands):
+        """Add demands, or overwrite the fields of the demands with their demand_id."""
+        new_demands = []
+        for demand in demands:
+            existing = self.get_demand(demand["demand_id"])
+            if existing is None:
+                new_demands.append(demand)
+            else:
+                self.update_demand(existing, **demand)
+        if new_demands:
+            self.add_demands(new_demands)
+
+    def record(self, event):
+        """Persist a mutation to the storage backend or the journal, and compact the journal once it grows too long."""
+        if self.replaying_journal:
+            return
+        self.clock_pending = True
+        if self.storage:
+            self.storage.record(event)  # Written to the tables, committed with the tick
+            return
+        self.journal.append(event)
+        if self.journal.event_count >= self.journal_compact_threshold:
+            self.save_all_data()
+
+    def commit(self):
+        """Record the simulated clock after the changes of this tick, and commit them to the storage backend."""
+        if self.clock_pending:
+            # A replay or a restart after a crash continues the clock from the last changes, not from the snapshot
+            self.clock_pending = False
+            event = {"op": "clock", "time": self.current_time}
+            if self.storage:
+                self.storage.record(event)
+            else:
+                self.journal.append(event)
+        if self.storage:
+            self.storage.commit()
+
+    def apply_journal_event(self, event):
+        """Apply one journaled mutation to the loaded data.
+
+        Applying an event the snapshot already holds changes nothing: a crash between writing
+        the snapshot files and truncating the journal replays such events. So adds are upserts
+        keyed on the id, and removes and updates skip the records that are gone.
+        """
+        op = event["op"]
+        if op == "market_add":
+            self.upsert_market_item(event["item"])
+        elif op == "market_remove":
+            item = self.get_market_item(event["item_id"])
+            if item:
+                self.remove_market_item(item)
+        elif op == "market_update":
+            item = self.get_market_item(event["item_id"])
+            if item:
+                self.update_market_item(item, **event["changes"])
+        elif op == "market_clear":
+            self.clear_market_items()
+        elif op == "user_add":
+            item = self.find_user_item_by_id(event["item"]["item_id"])
+            if item:
+                self.update_user_item(item, **event["item"])
+            else:
+                self.add_user_item(event["item"])
+        elif op == "user_remove":
+            item = self.find_user_item_by_id(event["item_id"])
+            if item:
+                self.remove_user_item(item)
+        elif op == "user_update":
+            item = self.find_user_item_by_id(event["item_id"])
+            if item:
+                self.update_user_item(item, **event["changes"])
+        elif op == "demand_add":
+            self.upsert_demands([event["demand"]])
+        elif op == "demands_add":
+            self.upsert_demands(event["demands"])
+        elif op == "demand_remove":
+            demand = self.get_demand(event["demand_id"])
+            if demand:
+                self.remove_demand(demand)
+        elif op == "demand_update":
+            demand = self.get_demand(event["demand_id"])
+            if demand:
+                self.update_demand(demand, **event["changes"])
+        elif op == "demand_clear":
+            self.clear_demands()
+        elif op == "wallet":
+            self.set_wallet(event["gold"], event["silver"], event["copper"])
+        elif op == "clock":
+            self.current_time = event["time"]
+        else:
+            print(f"Unknown journal event: {op}")
+
+    def set_wallet(self, gold, silver, copper):
+        """Set the user's currency, from denominations that do not need to be normalized."""
+        self.wallet.set_balance(Wallet.to_copper(gold, silver, copper))
+
+    def get_wallet_data(self):
+        """Return the wallet in the saved format, with normalized denominations."""
+        gold, silver, copper = Wallet.split(self.wallet.balance)
+        return {'Gold': gold, 'Silver': silver, 'Copper': copper}
+
+    def on_wallet_change(self, old_balance, new_balance):
+        """Journal every change of the wallet, in the saved format."""
+        gold, silver, copper = Wallet.split(new_balance)
+        self.record({"op": "wallet", "gold": gold, "silver": silver, "copper": copper})
+        self.event_log.record("wallet", balance=new_balance)
+        self.changes.publish(change_events.WALLET_CHANGED, None, self.wallet)
+
+    def rebuild_market_indexes(self):
+        """Rebuild the expiry heap, the price index and the search index from in_market_items.
+
+        A plain list of listings, as loaded from a save, is first moved into a ListingStore.
+        """
+        if not isinstance(self.in_market_items, ListingStore):
+            for item in self.in_market_items:
+                if "expires_at" not in item:
+                    # Older saves stored a countdown instead of an absolute expiry time
+                    now = time.time() if self.current_time is None else self.current_time
+                    item["expires_at"] = max(item["available_time_at"], now) + item.pop("not_available_timer", 0)
+            self.in_market_items = ListingStore(self.in_market_items)
+        self.market_expiry_heap = []
+        self.market_price_index.clear()
+        self.market_search_index.clear()
+        for item in self.in_market_items:
+            self.market_expiry_heap.append((item["expires_at"], item["item_id"]))
+            self.market_price_index.add(item["data_id"], item["price"])
+            self.market_search_index.add(item["item_id"], item["name"])
+        heapq.heapify(self.market_expiry_heap)
+        self.market_revision += 1
+        self.next_market_item_id = max(self.in_market_items.slot_by_id, default=0) + 1
+        self.changes.publish(change_events.LISTINGS_RESET)
+        if self.exchange:
+            self.attach_exchange(self.exchange)  # The listings were replaced
+
+    def get_market_item(self, item_id):
+        """Return the market listing with this item_id, or None."""
+        return self.in_market_items.get(item_id)
+
+    def add_market_item(self, item):
+        """Add a listing to the market. The listing is copied into the store, get_market_item returns its view."""
+        self.in_market_items.add(item)
+        heapq.heappush(self.market_expiry_heap, (item["expires_at"], item["item_id"]))
+        self.market_price_index.add(item["data_id"], item["price"])
+        self.market_search_index.add(item["item_id"], item["name"])
+        self.market_revision += 1
+        self.next_market_item_id = max(self.next_market_item_id, item["item_id"] + 1)
+        self.record({"op": "market_add", "item": item})
+        self.changes.publish(change_events.LISTING_ADDED, item["item_id"], self.get_market_item(item["item_id"]))
+        if self.exchange:
+            self.place_listing_order(self.get_market_item(item["item_id"]))
+
+    def update_market_item(self, item, **changes):
+        """Change fields of a listing, such as its amount after a purchase, keeping the market indexes in sync."""
+        if "price" in changes or "data_id" in changes:
+            self.market_price_index.remove(item["data_id"], item["price"])
+        item.update(changes)
+        if "price" in changes or "data_id" in changes:
+            self.market_price_index.add(item["data_id"], item["price"])
+        if "name" in changes:
+            self.market_search_index.add(item["item_id"], item["name"])  # Replaces the old name
+        if "expires_at" in changes:
+            heapq.heappush(self.market_expiry_heap, (item["expires_at"], item["item_id"]))  # The old entry goes stale
+        self.record({"op": "market_update", "item_id": item["item_id"], "changes": changes})
+        self.changes.publish(change_events.LISTING_UPDATED, item["item_id"], item)
+        if self.exchange and ("amount" in changes or "price" in changes):
+            self.sync_order(self.listing_orders, item["item_id"], item["price"], item["amount"],
+                            lambda: self.place_listing_order(item))
+
+    def remove_market_item(self, item):
+        """Remove a listing, given by its view, from the market in O(1) and make its item_id available for reuse."""
+        if not item.alive():
+            return False  # Already removed
+        item_id, data_id, price = item["item_id"], item["data_id"], item["price"]
+        self.in_market_items.remove(item)  # Frees its slot for the next listing
+        if self.exchange:
+            self.exchange.cancel(self.listing_orders.pop(item_id, None))
+        self.market_price_index.remove(data_id, price)
+        self.market_search_index.remove(item_id)
+        self.market_revision += 1
+        self.removed_item_ids.append(item_id)
+        self.record({"op": "market_remove", "item_id": item_id})
+        self.changes.publish(change_events.LISTING_REMOVED, item_id)
+        return True
+
+    def clear_market_items(self):
+        """Remove every listing from the market."""
+        self.in_market_items.clear()
+        self.removed_item_ids.clear()
+        self.rebuild_market_indexes()
+        self.record({"op": "market_clear"})
+        self.event_log.record("market_clear")
+
+    def find_market_items_by_name(self, search_term):
+        """Return the item_ids of the listings whose name contains search_term, case-insensitively."""
+        return self.market_search_index.search(search_term.strip())
+
+    def pop_expired_market_items(self, current_time):
+        """Remove the listings whose expiry time is at or before current_time and return them as dicts."""
+        expired = []
+        while self.market_expiry_heap and self.market_expiry_heap[0][0] <= current_time:
+            expires_at, item_id = heapq.heappop(self.market_expiry_heap)
+            item = self.get_market_item(item_id)
+            # Skip entries left behind by sold out listings or reused item IDs
+            if item is not None and item["expires_at"] == expires_at:
+                expired.append(item.copy())
+                self.remove_market_item(item)
+        return expired
+
+    def rebuild_catalog_indexes(self):
+        """Rebuild the lookups over the read-only items_list and data_list."""
+        self.catalog_items_by_id = {item["item_id"]: item for item in self.items_list}
+        self.catalog_items_by_name = {item["name"]: item for item in self.items_list}
+        self.catalog_weights = [item["weight"] for item in self.items_list]
+        self.data_by_id = {data["id"]: data for data in self.data_list}
+
+    def get_catalog_item(self, item_id):
+        """Return the items_list entry with this item_id, or None."""
+        return self.catalog_items_by_id.get(item_id)
+
+    def find_catalog_item_by_name(self, name):
+        """Return the items_list entry with this name, or None."""
+        return self.catalog_items_by_name.get(name)
+
+    def get_data(self, data_id):
+        """Return the data_list entry with this id, or None."""
+        return self.data_by_id.get(data_id)
+
+    def rebuild_user_item_indexes(self):
+        """Rebuild the item_id and name indexes over user_items."""
+        self.user_items_by_id = {}
+        self.user_items_by_name = {}
         for item in self.user_items:
-            if item['name'] == name:
-                return item
-        
+            self.user_items_by_id.setdefault(item["item_id"], item)
+            self.user_items_by_name.setdefault(item["name"], []).append(item)
+        self.changes.publish(change_events.INVENTORY_RESET)
+
+    def add_user_item(self, item):
+        """Add a new entry to the user's inventory."""
+        self.user_items.append(item)
+        self.user_items_by_id.setdefault(item["item_id"], item)
+        self.user_items_by_name.setdefault(item["name"], []).append(item)
+        self.record({"op": "user_add", "item": item})
+        self.changes.publish(change_events.INVENTORY_ADDED, item["item_id"], item)
+
+    def update_user_item(self, item, **changes):
+        """Change fields of an inventory entry, such as its amount."""
+        item.update(changes)
+        self.record({"op": "user_update", "item_id": item["item_id"], "changes": changes})
+        self.changes.publish(change_events.INVENTORY_UPDATED, item["item_id"], item)
+
+    def remove_user_item(self, item):
+        """Remove an entry from the user's inventory."""
+        self.user_items.remove(item)
+        if self.user_items_by_id.get(item["item_id"]) is item:
+            del self.user_items_by_id[item["item_id"]]
+        same_name = self.user_items_by_name[item["name"]]
+        same_name.remove(item)
+        if not same_name:
+            del self.user_items_by_name[item["name"]]
+        self.record({"op": "user_remove", "item_id": item["item_id"]})
+        self.changes.publish(change_events.INVENTORY_REMOVED, item["item_id"], item)
+
+    def find_user_item_by_id(self, item_id):
+        """Return the inventory entry with this item_id, or None."""
+        return self.user_items_by_id.get(item_id)
+
+    def find_target_items_in_user_item(self,name):
+        """Return the first inventory entry with this name, or None."""
+        same_name = self.user_items_by_name.get(name)
+        return same_name[0] if same_name else None
+
+    def rebuild_demand_indexes(self):
+        """Rebuild the demand_id index over demands_list."""
+        self.demand_index = {demand["demand_id"]: demand for demand in self.demands_list}
+        self.demand_positions = {demand["demand_id"]: position for position, demand in enumerate(self.demands_list)}
+        self.next_demand_id = max(self.demand_index, default=0) + 1
+        self.demand_search_index.clear()
+        for demand in self.demands_list:
+            self.demand_search_index.add(demand["demand_id"], self.get_demand_item_name(demand))
+        self.changes.publish(change_events.DEMANDS_RESET)
+        if self.exchange:
+            self.attach_exchange(self.exchange)  # The demands were replaced
+
+    def get_demand_item_name(self, demand):
+        """Return the catalog name of the item a demand asks for, or "Unknown"."""
+        item = self.catalog_items_by_id.get(demand["item_id"])
+        return item["name"] if item else "Unknown"
+
+    def find_demands_by_name(self, search_term):
+        """Return the demands whose item name contains search_term, case-insensitively."""
+        return [self.demand_index[demand_id] for demand_id in self.demand_search_index.search(search_term.strip())]
+
+    def get_demand(self, demand_id):
+        """Return the demand with this demand_id, or None."""
+        return self.demand_index.get(demand_id)
+
+    def add_demand(self, demand):
+        """Add a demand to the demands board."""
+        self.demand_positions[demand["demand_id"]] = len(self.demands_list)
+        self.demands_list.append(demand)
+        self.demand_index[demand["demand_id"]] = demand
+        self.demand_search_index.add(demand["demand_id"], self.get_demand_item_name(demand))
+        self.next_demand_id = max(self.next_demand_id, demand["demand_id"] + 1)
+        self.record({"op": "demand_add", "demand": demand})
+        self.changes.publish(change_events.DEMAND_ADDED, demand["demand_id"], demand)
+        if self.exchange:
+            self.place_demand_order(demand)
+
+    def add_demands(self, demands):
+        """Add many demands to the board, journaled as a single event."""
+        for demand in demands:
+            self.demand_positions[demand["demand_id"]] = len(self.demands_list)
+            self.demands_list.append(demand)
+            self.demand_index[demand["demand_id"]] = demand
+            self.demand_search_index.add(demand["demand_id"], self.get_demand_item_name(demand))
+            self.next_demand_id = max(self.next_demand_id, demand["demand_id"] + 1)
+        self.record({"op": "demands_add", "demands": demands})
+        for demand in demands:
+            self.changes.publish(change_events.DEMAND_ADDED, demand["demand_id"], demand)
+        if self.exchange:
+            for demand in demands:
+                if self.demand_index.get(demand["demand_id"]) is demand:
+                    self.place_demand_order(demand)
+
+    def update_demand(self, demand, **changes):
+        """Change fields of a demand, such as its remaining amount after a sale.
+
+        The countdown of not_available_timer is not journaled, a replayed demand keeps the
+        timer it had at its last journaled change.
+        """
+        demand.update(changes)
+        if "item_id" in changes:
+            self.demand_search_index.add(demand["demand_id"], self.get_demand_item_name(demand))
+        self.record({"op": "demand_update", "demand_id": demand["demand_id"], "changes": changes})
+        self.changes.publish(change_events.DEMAND_UPDATED, demand["demand_id"], demand)
+        if self.exchange and "item_id" in changes:
+            # Another item is another order book
+            self.exchange.cancel(self.demand_orders.pop(demand["demand_id"], None))
+            self.place_demand_order(demand)
+        elif self.exchange and ("max_amount" in changes or "buy_price" in changes):
+            self.sync_order(self.demand_orders, demand["demand_id"], demand["buy_price"], demand["max_amount"],
+                            lambda: self.place_demand_order(demand))
+
+    def remove_demand(self, demand):
+        """Remove a demand from the board and make its demand_id available for reuse.
+
+        The last demand of demands_list takes the place of the removed one, so the board
+        order is not the order the demands were added in.
+        """
+        if self.demand_index.get(demand["demand_id"]) is not demand:
+            return False  # Already removed
+        position = self.demand_positions.pop(demand["demand_id"])
+        last = self.demands_list.pop()
+        if last is not demand:
+            self.demands_list[position] = last
+            self.demand_positions[last["demand_id"]] = position
+        del self.demand_index[demand["demand_id"]]
+        self.demand_search_index.remove(demand["demand_id"])
+        self.removed_demands_ids.append(demand["demand_id"])
+        self.record({"op": "demand_remove", "demand_id": demand["demand_id"]})
+        self.changes.publish(change_events.DEMAND_REMOVED, demand["demand_id"], demand)
+        if self.exchange:
+            self.exchange.cancel(self.demand_orders.pop(demand["demand_id"], None))
+        return True
+
+    def clear_demands(self):
+        """Remove every demand from the board."""
+        self.demands_list.clear()
+        self.removed_demands_ids.clear()
+        self.rebuild_demand_indexes()
+        self.record({"op": "demand_clear"})
+        self.event_log.record("demands_clear")
+
+    def attach_exchange(self, exchange):
+        """Trade the listings and the demands through an Exchange of limit order books.
+
+        Every listing becomes an ask and every demand a bid of its data_id, kept in sync
+        by the add/update/remove methods. Crossing orders are matched at once, and each
+        fill lowers the amount of its listing and demand, which are removed once filled.
+        """
+        self.exchange = exchange
+        exchange.clear()
+        self.listing_orders.clear()
+        self.demand_orders.clear()
+        for item in list(self.in_market_items):
+            if item.alive():  # An earlier fill may have sold it out
+                self.place_listing_order(item)
+        for demand in list(self.demands_list):
+            if self.demand_index.get(demand["demand_id"]) is demand:
+                self.place_demand_order(demand)
+
+    def place_listing_order(self, item):
+        if item["amount"] <= 0:
+            return
+        order, fills = self.exchange.place(item["data_id"], SELL, item["price"], item["amount"], ("listing", item["item_id"]))
+        if order.amount:
+            self.listing_orders[item["item_id"]] = order.order_id
+        self.settle_fills(fills)
+
+    def place_demand_order(self, demand):
+        base_item = self.get_catalog_item(demand["item_id"])
+        if base_item is None or demand["max_amount"] <= 0:
+            return
+        order, fills = self.exchange.place(base_item["data_id"], BUY, demand["buy_price"], demand["max_amount"],
+                                           ("demand", demand["demand_id"]))
+        if order.amount:
+            self.demand_orders[demand["demand_id"]] = order.order_id
+        self.settle_fills(fills)
+
+    def sync_order(self, orders, key, price, amount, place_again):
+        """Bring the resting order of a listing or demand in line with its new price and amount."""
+        order = self.exchange.get_order(orders.get(key))
+        if order is None or (order.price == price and order.amount == amount):
+            return  # Filled, or already in line after a fill
+        if order.price == price and amount < order.amount:
+            self.exchange.reduce(order.order_id, order.amount - amount)  # Keeps its time priority
+            if amount <= 0:
+                del orders[key]
+            return
+        # A new price or a larger amount is a new order, at the back of the queue
+        self.exchange.cancel(orders.pop(key))
+        place_again()
+
+    def settle_fills(self, fills):
+        """Apply fills of the order books to the listings and demands that own the orders."""
+        for data_id, price, amount, buy_order, sell_order in fills:
+            for order in (buy_order, sell_order):
+                owner = order.owner
+                if not isinstance(owner, tuple):
+                    continue  # Settled by whoever placed the order
+                if owner[0] == "listing":
+                    item = self.get_market_item(owner[1])
+                    if item:
+                        self.event_log.record("listing_buy", item_id=owner[1], amount=amount, price=price)
+                        self.update_market_item(item, amount=item["amount"] - amount)
+                        if item["amount"] <= 0:
+                            self.remove_market_item(item)
+                elif owner[0] == "demand":
+                    demand = self.get_demand(owner[1])
+                    if demand:
+                        self.event_log.record("demand_fill", demand_id=owner[1], amount=amount, price=price)
+                        self.update_demand(demand, max_amount=demand["max_amount"] - amount)
+                        if demand["max_amount"] <= 0:
+                            self.remove_demand(demand)
+
+    def place_order(self, data_id, side, price, amount, owner=None):
+        """Place a limit order in the attached Exchange. Return (the Order, its fills).
+
+        The listings and demands on the other side of the fills are updated; the money
+        and the items of the owner of the order are left to the caller.
+        """
+        order, fills = self.exchange.place(data_id, side, price, amount, owner)
+        self.settle_fills(fills)
+        return order, fills
+
+    def cancel_order(self, order_id):
+        """Cancel an order placed with place_order. Return False if it is no longer resting."""
+        return self.exchange.cancel(order_id)
+
     def new_data(self):
         return [
             {
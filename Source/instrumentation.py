@@ -0,0 +1,156 @@
+import functools
+import json
+import time
+
+
+class Histogram:
+    """Counts of durations in fixed buckets, in milliseconds."""
+
+    BUCKET_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BUCKET_BOUNDS_MS) + 1)  # The last bucket is everything above the bounds
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms):
+        index = 0
+        while index < len(self.BUCKET_BOUNDS_MS) and duration_ms > self.BUCKET_BOUNDS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def mean_ms(self):
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile_ms(self, fraction):
+        """Upper bound of the bucket holding the given fraction of the values."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return self.BUCKET_BOUNDS_MS[index] if index < len(self.BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.mean_ms(),
+            "p50_ms": self.percentile_ms(0.50),
+            "p99_ms": self.percentile_ms(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {f"<={bound}": count for bound, count in zip(self.BUCKET_BOUNDS_MS, self.buckets)} | {"more": self.buckets[-1]},
+        }
+
+
+class LoopStats:
+    """What is known about one periodic callback or trade path."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.rows_touched = 0
+        self.wall_time = Histogram()
+        self.scheduling_lag = Histogram()  # How late the callback ran compared to the requested delay
+        self.missed_deadlines = 0  # Steps dropped or runs skipped or put off by the scheduler
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "rows_touched": self.rows_touched,
+            "wall_time": self.wall_time.to_dict(),
+            "scheduling_lag": self.scheduling_lag.to_dict(),
+            "missed_deadlines": self.missed_deadlines,
+        }
+
+
+class Instrumentation:
+    """Registry of LoopStats, fed by the scheduled loops and the trade paths."""
+
+    def __init__(self):
+        self.enabled = True
+        self.stats = {}  # name -> LoopStats
+        self.started_at = time.time()
+
+    def get(self, name):
+        if name not in self.stats:
+            self.stats[name] = LoopStats(name)
+        return self.stats[name]
+
+    def record(self, name, duration, rows=0):
+        """Record one call that took duration seconds and touched the given number of rows."""
+        if not self.enabled:
+            return
+        stats = self.get(name)
+        stats.calls += 1
+        stats.rows_touched += rows
+        stats.wall_time.add(duration * 1000)
+
+    def add_rows(self, name, rows):
+        """Add rows touched by the current call of name."""
+        if self.enabled:
+            self.get(name).rows_touched += rows
+
+    def record_lag(self, name, lag):
+        if self.enabled:
+            self.get(name).scheduling_lag.add(max(0.0, lag) * 1000)
+
+    def record_missed(self, name, count=1):
+        if self.enabled:
+            self.get(name).missed_deadlines += count
+
+    def timed(self, name):
+        """Decorator recording the calls and wall time of a function."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def after(self, widget, delay_ms, name, callback):
+        """Schedule callback with widget.after, recording its scheduling lag and wall time under name.
+
+        Returns the after id, so it can still be passed to after_cancel.
+        """
+        expected_at = time.perf_counter() + delay_ms / 1000
+
+        def run():
+            started = time.perf_counter()
+            self.record_lag(name, started - expected_at)
+            try:
+                callback()
+            finally:
+                self.record(name, time.perf_counter() - started)
+
+        return widget.after(delay_ms, run)
+
+    def reset(self):
+        self.stats.clear()
+        self.started_at = time.time()
+
+    def dump(self):
+        """Return every statistic as a JSON-serializable dict."""
+        return {
+            "started_at": self.started_at,
+            "dumped_at": time.time(),
+            "loops": {name: stats.to_dict() for name, stats in sorted(self.stats.items())},
+        }
+
+    def save_json(self, file_path):
+        with open(file_path, 'w') as file:
+            json.dump(self.dump(), file, indent=4)
+
+
+# Shared by every manager, like the GLOBAL_DATA of main.py
+INSTRUMENTATION = Instrumentation()
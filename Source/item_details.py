@@ -1,9 +1,10 @@
 # item_details.py
 import tkinter as tk
 from tkinter import messagebox
-from utils import get_data_by_id
 
-def open_item_details_window(root, items_list, data_list):
+from price_history import MINUTE, HOUR
+
+def open_item_details_window(root, global_data_manager, engine, world=None):
     item_details_window = tk.Toplevel(root)
     item_details_window.title("Item Details")
 
@@ -14,7 +15,7 @@ def open_item_details_window(root, items_list, data_list):
     item_id_entry = tk.Entry(item_details_window)
     item_id_entry.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
 
-    show_item_details_button = tk.Button(item_details_window, text="Show Item Details", command=lambda: show_item_details(item_id_entry, item_details_text, items_list, data_list))
+    show_item_details_button = tk.Button(item_details_window, text="Show Item Details", command=lambda: show_item_details(item_id_entry, item_details_text, global_data_manager, engine, world))
     show_item_details_button.grid(row=1, column=1, padx=10, pady=5, sticky="e")
 
     item_details_text = tk.Text(item_details_window, height=15, width=50)
@@ -24,11 +25,11 @@ def open_item_details_window(root, items_list, data_list):
     item_details_window.grid_columnconfigure(0, weight=1)
     item_details_window.grid_rowconfigure(2, weight=1)
 
-def show_item_details(item_id_entry, item_details_text, items_list, data_list):
+def show_item_details(item_id_entry, item_details_text, global_data_manager, engine, world=None):
     selected_item_id = item_id_entry.get()
-    item = next((item for item in items_list if item["item_id"] == selected_item_id), None)
+    item = global_data_manager.get_catalog_item(selected_item_id)
     if item:
-        data_info = get_data_by_id(data_list, item["data_id"])
+        data_info = global_data_manager.get_data(item["data_id"])
         item_info = (
             f"Item ID: {item['item_id']}\n"
             f"Name: {item['name']}\n"
@@ -48,9 +49,42 @@ def show_item_details(item_id_entry, item_details_text, items_list, data_list):
                 f"Stack Number: {data_info['stack_number']}\n"
             )
             item_info += data_info_str
+        item_info += get_price_history_text(global_data_manager, item["data_id"], engine.current_time)
+        if world:
+            item_info += get_town_prices_text(world, item)
         item_details_text.delete(1.0, tk.END)
         item_details_text.insert(tk.END, item_info)
     else:
         messagebox.showwarning("Warning", "Item ID not found.")
         
         
+
+
+def get_price_history_text(global_data_manager, data_id, now):
+    """Summarize the last hour of prices of a data_id before now, in simulated time, from its 1-minute bars."""
+    text = "\n--- Price History (last hour) ---\n"
+    for source, label in (("listing", "Listings"), ("demand", "Demands"), ("quote", "Fixed Price")):
+        series = global_data_manager.price_history.get_series(source, data_id)
+        bars = series.get_bars(MINUTE, now - HOUR, now + MINUTE) if series else []
+        if bars:
+            low = min(bar[3] for bar in bars)
+            high = max(bar[2] for bar in bars)
+            volume = sum(bar[5] for bar in bars)
+            text += f"{label}: last {series.get_last_price():.0f}, low {low:.0f}, high {high:.0f}, volume {volume}\n"
+        else:
+            text += f"{label}: no prices yet\n"
+    return text
+
+
+def get_town_prices_text(world, item):
+    """List the cheapest towns selling the item and the best place to buy and sell it, from the world summaries."""
+    text = "\n--- Other Towns ---\n"
+    rows = world.get_town_prices(item["data_id"])
+    for name, count, lowest, highest, mean in rows[:5]:
+        text += f"{name}: {count} listings, low {lowest:.0f}, high {highest:.0f}, mean {mean:.1f}\n"
+    if not rows:
+        text += "No town sells it right now\n"
+    best_trades = world.get_best_trades(item["data_id"], item["item_id"])
+    if best_trades:
+        text += f"Buy in {best_trades[0]}, sell in {best_trades[1]}\n"
+    return text
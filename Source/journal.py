@@ -0,0 +1,67 @@
+import json
+import os
+
+
+class Journal:
+    """Append-only log of game state changes, one JSON object per line.
+
+    GlobalDataManager appends an event for every mutation and replays the log on top of
+    the JSON snapshot at startup. Writing a new snapshot truncates the log.
+    """
+
+    def __init__(self, file_path, fsync=False):
+        self.file_path = file_path
+        self.fsync = fsync  # Also force every event to disk, not only to the OS
+        self.file = None
+        self.event_count = 0  # Events appended since the last truncate
+        self.truncations = 0  # Number of truncates, to tell whether the events counted earlier are still there
+
+    def append(self, event):
+        """Write one event at the end of the journal."""
+        if self.file is None:
+            self.file = open(self.file_path, 'a')
+        self.file.write(json.dumps(event, separators=(',', ':')) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.event_count += 1
+
+    def read_events(self):
+        """Return every complete event in the journal, in order."""
+        events = []
+        if not os.path.exists(self.file_path):
+            return events
+        with open(self.file_path, 'r') as file:
+            for line in file:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash in the middle of a write leaves a partial last line
+                    print(f"Ignoring the damaged end of {self.file_path}.")
+                    break
+        return events
+
+    def truncate(self):
+        """Drop every event, once they are all part of a snapshot."""
+        self.close()
+        open(self.file_path, 'w').close()
+        self.event_count = 0
+        self.truncations += 1
+
+    def drop_first(self, count):
+        """Drop the first count events, once a snapshot holds them; the events appended since are kept."""
+        if count <= 0:
+            return
+        self.close()
+        with open(self.file_path, 'r') as file:
+            lines = file.readlines()
+        temp_file_path = self.file_path + ".tmp"
+        with open(temp_file_path, 'w') as file:
+            file.writelines(lines[count:])
+        os.replace(temp_file_path, self.file_path)
+        self.event_count = max(0, self.event_count - count)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,292 @@
+from array import array
+from collections.abc import Mapping
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, the bulk operations fall back to plain loops
+    numpy = None
+
+
+class ListingStore:
+    """Market listings kept in parallel typed arrays, one slot per listing.
+
+    Names and data_ids are interned and stored as small integer codes. A removed
+    listing frees its slot, which the next added listing reuses; the generation of
+    a slot changes on every removal so old ListingViews know they are stale.
+    Iterating the store yields dict-like ListingViews, for the code written
+    against the former list of dicts. The bulk operations read the arrays as
+    NumPy arrays, without copying them, when NumPy is installed.
+    """
+
+    FIELDS = ("item_id", "name", "price", "amount", "available_time_at", "expires_at", "data_id")
+
+    def __init__(self, items=()):
+        self.item_ids = array('q')
+        self.name_codes = array('l')
+        self.prices = array('q')
+        self.amounts = array('q')
+        self.available_times = array('d')
+        self.expiry_times = array('d')
+        self.data_codes = array('l')
+        self.occupied = array('b')  # 1 if the slot holds a listing
+        self.generations = array('q')  # Bumped whenever the slot is freed
+
+        self.names = []  # Name code -> name
+        self.name_codes_by_name = {}
+        self.data_ids = []  # Data code -> data_id
+        self.data_codes_by_id = {}
+
+        self.free_slots = []  # Slots of removed listings, reused first
+        self.slot_by_id = {}  # item_id -> slot
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.slot_by_id)
+
+    def __iter__(self):
+        """Yield a ListingView of every listing, in slot order."""
+        occupied = self.occupied
+        for slot in range(len(occupied)):
+            if occupied[slot]:
+                yield ListingView(self, slot)
+
+    def clear(self):
+        """Remove every listing. The slots are freed like in remove, so the views taken before stay stale."""
+        occupied, generations = self.occupied, self.generations
+        for slot in range(len(occupied)):
+            if occupied[slot]:
+                occupied[slot] = 0
+                generations[slot] += 1
+        self.free_slots = list(range(len(occupied) - 1, -1, -1))  # The lowest slots are reused first
+        self.slot_by_id.clear()
+
+    def intern_name(self, name):
+        code = self.name_codes_by_name.get(name)
+        if code is None:
+            code = self.name_codes_by_name[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def intern_data_id(self, data_id):
+        code = self.data_codes_by_id.get(data_id)
+        if code is None:
+            code = self.data_codes_by_id[data_id] = len(self.data_ids)
+            self.data_ids.append(data_id)
+        return code
+
+    def add(self, item):
+        """Copy a listing dict into a free slot and return its ListingView."""
+        if item["item_id"] in self.slot_by_id:
+            raise KeyError(f"Listing {item['item_id']} is already in the market")
+        values = (item["item_id"], self.intern_name(item["name"]), int(item["price"]), int(item["amount"]),
+                  item["available_time_at"], item["expires_at"], self.intern_data_id(item["data_id"]))
+        columns = (self.item_ids, self.name_codes, self.prices, self.amounts,
+                   self.available_times, self.expiry_times, self.data_codes)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            for column, value in zip(columns, values):
+                column[slot] = value
+            self.occupied[slot] = 1
+        else:
+            slot = len(self.occupied)
+            for column, value in zip(columns, values):
+                column.append(value)
+            self.occupied.append(1)
+            self.generations.append(0)
+        self.slot_by_id[item["item_id"]] = slot
+        return ListingView(self, slot)
+
+    def get(self, item_id):
+        """Return the ListingView of the listing with this item_id, or None."""
+        slot = self.slot_by_id.get(item_id)
+        return ListingView(self, slot) if slot is not None else None
+
+    def remove(self, view):
+        """Free the slot of a listing. Return False if the view is stale, the listing being already removed."""
+        if not view.alive():
+            return False
+        slot = view.slot
+        del self.slot_by_id[self.item_ids[slot]]
+        self.occupied[slot] = 0
+        self.generations[slot] += 1
+        self.free_slots.append(slot)
+        return True
+
+    def get_field(self, slot, key):
+        if key == "price":
+            return self.prices[slot]
+        if key == "amount":
+            return self.amounts[slot]
+        if key == "expires_at":
+            return self.expiry_times[slot]
+        if key == "available_time_at":
+            return self.available_times[slot]
+        if key == "item_id":
+            return self.item_ids[slot]
+        if key == "name":
+            return self.names[self.name_codes[slot]]
+        if key == "data_id":
+            return self.data_ids[self.data_codes[slot]]
+        raise KeyError(key)
+
+    def set_field(self, slot, key, value):
+        if key == "price":
+            self.prices[slot] = int(value)
+        elif key == "amount":
+            self.amounts[slot] = int(value)
+        elif key == "expires_at":
+            self.expiry_times[slot] = value
+        elif key == "available_time_at":
+            self.available_times[slot] = value
+        elif key == "name":
+            self.name_codes[slot] = self.intern_name(value)
+        elif key == "data_id":
+            self.data_codes[slot] = self.intern_data_id(value)
+        else:
+            raise KeyError(f"Listing field {key} cannot be changed")
+
+    def to_dicts(self):
+        """Return every listing as a plain dict, for saving."""
+        return [view.copy() for view in self]
+
+    def numpy_columns(self, *columns):
+        """Return zero-copy NumPy views of the given arrays, plus the mask of the occupied slots."""
+        occupied = numpy.frombuffer(self.occupied, dtype=numpy.int8).astype(bool) if len(self.occupied) else numpy.zeros(0, dtype=bool)
+        views = []
+        for column in columns:
+            views.append(numpy.frombuffer(column, dtype=column.typecode) if len(column) else numpy.zeros(0))
+        return occupied, views
+
+    def available_rows(self, current_time, item_ids=None):
+        """Return item_id -> (name, price, amount, seconds left) of the listings available at current_time.
+
+        Only the given item_ids are considered when item_ids is not None.
+        """
+        names, data = self.names, (self.name_codes, self.prices, self.amounts, self.available_times, self.expiry_times)
+        name_codes, prices, amounts, available_times, expiry_times = data
+        slots = range(len(self.occupied)) if item_ids is None else (self.slot_by_id[item_id] for item_id in item_ids)
+        rows = {}
+        occupied = self.occupied
+        for slot in slots:
+            if occupied[slot] and current_time >= available_times[slot]:
+                rows[self.item_ids[slot]] = (names[name_codes[slot]], prices[slot], amounts[slot],
+                                             int(expiry_times[slot] - current_time))
+        return rows
+
+    def upcoming(self, current_time):
+        """Return (available time, item_id) of the listings that are not available yet at current_time."""
+        available_times, item_ids, occupied = self.available_times, self.item_ids, self.occupied
+        return [(available_times[slot], item_ids[slot]) for slot in range(len(occupied))
+                if occupied[slot] and available_times[slot] > current_time]
+
+    def expired_item_ids(self, current_time):
+        """Return the item_ids of the listings whose expiry time is at or before current_time."""
+        if numpy is not None:
+            occupied, (expiry_times, item_ids) = self.numpy_columns(self.expiry_times, self.item_ids)
+            return item_ids[occupied & (expiry_times <= current_time)].tolist()
+        return [self.item_ids[slot] for slot in range(len(self.occupied))
+                if self.occupied[slot] and self.expiry_times[slot] <= current_time]
+
+    def price_aggregates(self):
+        """Return data_id -> (count, lowest price, highest price, sum of prices) over every listing."""
+        if numpy is not None and len(self.occupied):
+            occupied, (data_codes, prices) = self.numpy_columns(self.data_codes, self.prices)
+            data_codes = data_codes[occupied]
+            prices = prices[occupied]
+            size = len(self.data_ids)
+            counts = numpy.bincount(data_codes, minlength=size)
+            sums = numpy.bincount(data_codes, weights=prices, minlength=size)
+            lowest = numpy.full(size, numpy.iinfo(numpy.int64).max)
+            highest = numpy.full(size, numpy.iinfo(numpy.int64).min)
+            numpy.minimum.at(lowest, data_codes, prices)
+            numpy.maximum.at(highest, data_codes, prices)
+            return {self.data_ids[code]: (int(counts[code]), int(lowest[code]), int(highest[code]), int(sums[code]))
+                    for code in numpy.nonzero(counts)[0].tolist()}
+
+        aggregates = {}
+        for slot in range(len(self.occupied)):
+            if self.occupied[slot]:
+                data_id = self.data_ids[self.data_codes[slot]]
+                price = self.prices[slot]
+                count, lowest, highest, total = aggregates.get(data_id, (0, price, price, 0))
+                aggregates[data_id] = (count + 1, min(lowest, price), max(highest, price), total + price)
+        return aggregates
+
+    def sorted_item_ids(self, field, reverse=False):
+        """Return the item_ids of every listing sorted by a numeric field."""
+        column = {"price": self.prices, "amount": self.amounts, "expires_at": self.expiry_times,
+                  "available_time_at": self.available_times, "item_id": self.item_ids}[field]
+        if numpy is not None:
+            occupied, (values, item_ids) = self.numpy_columns(column, self.item_ids)
+            order = numpy.argsort(values[occupied], kind="stable")
+            if reverse:
+                order = order[::-1]
+            return item_ids[occupied][order].tolist()
+        slots = sorted((slot for slot in range(len(self.occupied)) if self.occupied[slot]),
+                       key=column.__getitem__, reverse=reverse)
+        return [self.item_ids[slot] for slot in slots]
+
+
+class ListingView(Mapping):
+    """Dict-like access to one listing of a ListingStore.
+
+    A view stays bound to its listing: once the listing is removed, alive() is
+    False and reading it raises KeyError, even after the slot is reused.
+    """
+
+    __slots__ = ("store", "slot", "generation")
+
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
+        self.generation = store.generations[slot]
+
+    def alive(self):
+        return self.store.occupied[self.slot] == 1 and self.store.generations[self.slot] == self.generation
+
+    def __getitem__(self, key):
+        if not self.alive():
+            raise KeyError(f"{key}: the listing was removed from the market")
+        return self.store.get_field(self.slot, key)
+
+    def __setitem__(self, key, value):
+        if not self.alive():
+            raise KeyError(f"{key}: the listing was removed from the market")
+        self.store.set_field(self.slot, key, value)
+
+    def __iter__(self):
+        return iter(ListingStore.FIELDS)
+
+    def __len__(self):
+        return len(ListingStore.FIELDS)
+
+    def update(self, changes=(), **more_changes):
+        for key, value in dict(changes, **more_changes).items():
+            self[key] = value
+
+    def copy(self):
+        """Return the listing as a plain dict."""
+        return {key: self[key] for key in ListingStore.FIELDS}
+
+    def __repr__(self):
+        return f"ListingView({self.copy() if self.alive() else 'removed'})"
+
+
+if __name__ == "__main__":
+    # Self-check of the view staleness rules: python listing_store.py
+    def listing(item_id, name):
+        return {"item_id": item_id, "name": name, "price": 10, "amount": 1,
+                "available_time_at": 0.0, "expires_at": 60.0, "data_id": "101"}
+
+    store = ListingStore([listing(1, "Wheat"), listing(2, "Iron Sword")])
+    old_views = list(store)
+    store.clear()
+    assert len(store) == 0 and not any(view.alive() for view in old_views)
+    new_view = store.add(listing(3, "Glass Vase"))
+    assert new_view.slot == old_views[0].slot, "the freed slots are reused"
+    assert not old_views[0].alive() and store.remove(old_views[0]) is False
+    assert new_view.alive() and new_view["name"] == "Glass Vase" and store.get(3)["item_id"] == 3
+    store.remove(new_view)
+    assert store.add(listing(3, "Glass Vase"))["name"] == "Glass Vase" and not new_view.alive()
+    print("ListingStore views stay stale across clear, remove and slot reuse.")
@@ -1,7 +1,9 @@
-import random
 import tkinter as tk
 from tkinter import messagebox
 
+from event_log import EVENT_LOG
+from scheduler import SCHEDULER
+
 class LotteryCenter:
     def __init__(self, root, global_data_manager,backpack_manager):
         self.root = root
@@ -11,12 +13,14 @@ class LotteryCenter:
         self.lottery_running = False
         self.lottery_task = None
         self.ticket_price = 10  # Example ticket price in copper
+        self.random = global_data_manager.rng.stream("lottery")
 
     def start_lottery(self):
         """Start the lottery that picks a winner every 30 seconds."""
         if not self.lottery_running:
             self.lottery_running = True
             self.lottery_loop()  # Start the loop automatically
+            self.lottery_task = SCHEDULER.add("loop.lottery", self.lottery_loop, 30, priority=10)  # Every 30 seconds
         #     messagebox.showinfo("Lottery", "The lottery has started! Buy your ticket!")
         # else:
         #     messagebox.showwarning("Lottery", "Lottery is already running!")
@@ -39,25 +43,24 @@ class LotteryCenter:
             messagebox.showerror("Insufficient Funds", "You don't have enough money to buy a ticket.")
 
     def lottery_loop(self):
-        """Run the lottery loop, picking the user as the winner every 30 seconds if they have a ticket."""
+        """Draw the lottery, the user winning if they have a ticket and are lucky. Called every 30 seconds."""
         if self.user_has_ticket:
                 # Generate a random number between 1 and 1000
-                if random.randint(1, 1000) == 1:
-                    reward = random.randint(10000, 50000)  # Random reward for the user, always an integer
+                if self.random.randint(1, 1000) == 1:
+                    reward = self.random.randint(10000, 50000)  # Random reward for the user, always an integer
                     self.backpack_manager.receive_currency(reward) 
+                    EVENT_LOG.record("gamble", game="lottery", stake=self.ticket_price, reward=reward, detail="won")
                     messagebox.showinfo("Lottery Winner!", f"Congratulations! You won {reward} coins!")
+                else:
+                    EVENT_LOG.record("gamble", game="lottery", stake=self.ticket_price, reward=0, detail="lost")
                 self.user_has_ticket = False  # Reset for the next round
         # No prompt if the user didn't buy a ticket
 
-        # Schedule the next lottery in 30 seconds
-        if self.lottery_running:
-            self.lottery_task = self.root.after(30000, self.lottery_loop)  # 30 seconds
-
     def stop_lottery(self):
         """Stop the lottery."""
         self.lottery_running = False
-        if self.lottery_task:
-            self.root.after_cancel(self.lottery_task)
+        SCHEDULER.remove(self.lottery_task)
+        self.lottery_task = None
         messagebox.showinfo("Lottery", "Lottery has been stopped.")
 
     def create_gambling_ui(self):
@@ -1,3 +1,6 @@
+import atexit
+import multiprocessing
+import os
 import time
 import tkinter as tk
 
@@ -5,40 +8,57 @@ from fixed_price_market import FixedPriceMarketManager
 from gambling_parent_page import GamblingPageUI
 from items_view import open_items_window
 from item_details import open_item_details_window
+from stats_view import open_stats_window
+from instrumentation import INSTRUMENTATION
+from scheduler import SCHEDULER
+from async_runtime import AsyncRuntime
+from event_log import EVENT_LOG
 import market_table
 import global_data
 import backpack
 import selling_market
 import demands_control
+import simulation_engine
+from order_book import Exchange
+from world import World, random_town_configs
 
 # Global settings for FPS control
 record_GAME_START_TIME = time.time()  # Record the start time
-record_LAST_UPDATE_TIME = time.time()  # Initialize the last update time
 FRAME_RATE = 24  # Target frame rate (24 FPS)
-FIXED_FRAME_GAP = 1 / FRAME_RATE  # Calculate the time gap between frames
-GLOBAL_DATA = global_data.GlobalDataManager()
+FIXED_FRAME_GAP = 1 / FRAME_RATE  # Calculate the time gap between frames, the fixed step of the simulation
+STORAGE_BACKEND = "json"  # "json" for JSON files plus a journal, "sqlite" for an SQLite database
+GLOBAL_DATA = global_data.GlobalDataManager(storage_backend=STORAGE_BACKEND)
+ENGINE = simulation_engine.SimulationEngine(GLOBAL_DATA)
 root = None
 ENABLE_SWITCH_MARKET = False
+ENABLE_ORDER_BOOK = False  # Trade the listings (asks) and demands (bids) through limit order books that match them
+ENABLE_ASYNC_RUNTIME = False  # Run the frames, the saves and the client server on an asyncio loop pumped by Tk
+CLIENT_SERVER_PORT = None  # Port serving external clients with the async runtime, None for no server
+ENABLE_WORLD = False  # Simulate other towns in worker processes, only their price summaries reach this process
+WORLD_TOWNS = 20
 
 
 def main():
-    global GLOBAL_DATA, root
+    global GLOBAL_DATA, ENGINE, root
 
     # Main application setup
     root = tk.Tk()
     root.title("Market")
 
+    # Other towns, started once the player's market is loaded
+    world = World(random_town_configs(WORLD_TOWNS)) if ENABLE_WORLD else None
+
     # Initialize BackpackManager
     backpack_manager = backpack.BackpackManager(root, GLOBAL_DATA)
 
     # Initialize MarketManager
-    market_manager = market_table.MarketManager(root, GLOBAL_DATA, backpack_manager)
+    market_manager = market_table.MarketManager(root, GLOBAL_DATA, backpack_manager, ENGINE)
 
-    selling_market_manager = selling_market.SellingMarketManager(root, GLOBAL_DATA)
+    selling_market_manager = selling_market.SellingMarketManager(root, GLOBAL_DATA, ENGINE)
     selling_market_manager.set_backpack_manager(backpack_manager)
 
-    demands_manager = demands_control.DemandsManager(root, GLOBAL_DATA, selling_market_manager)  # Manages demands
-    demands_manager.random_generate_demands_loop()
+    demands_manager = demands_control.DemandsManager(root, GLOBAL_DATA, selling_market_manager, ENGINE)  # Manages demands
+    demands_manager.start_demand_updates()
 
     # Market table setup
     items_frame = tk.Frame(root)
@@ -60,7 +80,7 @@ def main():
     selling_market_button = tk.Button(button_frame, text="Demands Board", command=selling_market_manager.open_selling_market)
     selling_market_button.grid(row=2, column=0, sticky="ew", pady=2)
 
-    fixed_price_market = FixedPriceMarketManager(root, GLOBAL_DATA)
+    fixed_price_market = FixedPriceMarketManager(root, GLOBAL_DATA, ENGINE)
     fixed_price_market.set_backpack_manager(backpack_manager)
 
     # Button to open the fixed price market, using grid layout
@@ -94,34 +114,53 @@ def main():
     wiki_menu = tk.Menu(main_menu, tearoff=0)
     main_menu.add_cascade(label="Wiki", menu=wiki_menu)
     wiki_menu.add_command(label="Items", command=lambda: open_items_window(root, GLOBAL_DATA.items_list))
-    wiki_menu.add_command(label="Item Details", command=lambda: open_item_details_window(root, GLOBAL_DATA.items_list, GLOBAL_DATA.data_list))
+    wiki_menu.add_command(label="Item Details", command=lambda: open_item_details_window(root, GLOBAL_DATA, ENGINE, world))
 
     # Backpack menu item    
     backpack_menu = tk.Menu(main_menu, tearoff=0)
     main_menu.add_cascade(label="Backpack", menu=backpack_menu)
     backpack_menu.add_command(label="Show Backpack", command=lambda: backpack_manager.show_backpack())
 
+    # Debug menu, with the timings of the periodic callbacks and trades
+    debug_menu = tk.Menu(main_menu, tearoff=0)
+    main_menu.add_cascade(label="Debug", menu=debug_menu)
+    debug_menu.add_command(label="Performance Stats", command=lambda: open_stats_window(root, INSTRUMENTATION, os.path.join(GLOBAL_DATA.data_folder, "stats.json")))
+
     # Load items and data from JSON files
+    if ENABLE_ORDER_BOOK:
+        GLOBAL_DATA.attach_exchange(Exchange())  # Filled with the listings and demands once they are loaded
     GLOBAL_DATA.load_all_data()
 
-    # Start the market refresh loop
-    market_manager.refresh_market()
-
-    # Start regenerating items periodically
-    market_manager.regenerate_items()
-
-    # Start the periodic update for demand timers
-    # The time has been hard coded into the function.
-    def update_demand_timers():
-        demands_manager.refresh_loop()
-    
-        root.after(500, update_demand_timers)  # Schedule the next update
-
-    update_demand_timers()
+    # Record the session to the event log, starting from the loaded listings, demands and wallet
+    EVENT_LOG.open(os.path.join(GLOBAL_DATA.data_folder, "events.bin"), clock=lambda: ENGINE.current_time)
+    EVENT_LOG.record_state(GLOBAL_DATA)
+    atexit.register(EVENT_LOG.close)
+
+    # Refresh the market table whenever the engine updates the market
+    market_manager.start_market_updates()
+
+    # The other towns run on the clock of the player's market, a simulated second per summary exchange
+    if ENABLE_WORLD:
+        world.start_time = ENGINE.current_time
+        world.start()
+        atexit.register(world.stop)
+        SCHEDULER.add("loop.world", lambda: world.advance(FIXED_FRAME_GAP, FRAME_RATE), 1, priority=40)
+
+    # Every periodic system runs from the scheduler's frames, the simulation first at the fixed step
+    SCHEDULER.add_fixed_step("loop.engine_frame", ENGINE.step, priority=0)
+    if ENABLE_ASYNC_RUNTIME:
+        SCHEDULER.set_step(FIXED_FRAME_GAP)
+        runtime = AsyncRuntime(GLOBAL_DATA, ENGINE)
+        runtime.attach_tk(root)
+        runtime.start(port=CLIENT_SERVER_PORT)
+    else:
+        SCHEDULER.start(root, FIXED_FRAME_GAP)
 
     # Start the Tkinter main loop
     root.mainloop()
 
 
 
-main()
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # The world's worker processes import this module again
+    main()
@@ -1,31 +1,36 @@
-import time
+import heapq
 import tkinter as tk
-from tkinter import ttk, messagebox
-import random
+from tkinter import messagebox
+
+import change_events
+
+from instrumentation import INSTRUMENTATION
+from search_index import IncrementalSearch
+import trades
+from virtual_table import VirtualTable
+from wallet import Wallet
 
 
 class MarketManager:
-    def __init__(self, root, global_data_manager, backpack_manager):
+    COLUMNS = ("Name", "Price", "Amount", "Not_Available_Timer")
+
+    def __init__(self, root, global_data_manager, backpack_manager, engine):
         self.root = root
         self.global_data_manager = global_data_manager  # Use GlobalDataManager for accessing shared data
         self.backpack_manager = backpack_manager  # Use BackpackManager for handling inventory and currency
-        self.items_tree = None  # Placeholder for the TreeView widget
+        self.engine = engine  # SimulationEngine that generates and expires the market items
+        self.items_table = None  # VirtualTable showing the listings
+        self.items_tree = None  # Its TreeView widget
         self.search_var = tk.StringVar()  # Search variable for filtering items
-        self.refresh_rate = 1
-        self.MAX_ITEMS = 100
-        self.PRICE_ADJUST_MIN = 0.85
-        self.PRICE_ADJUST_MAX = 1.85
-        self.TIME_ADJUST_MIN = 0
-        self.TIME_ADJUST_MAX = 1
-        self.TIMER_ADJUST_MIN = 0.5
-        self.TIMER_ADJUST_MAX = 1.5
-        self.AMOUNT_ADJUST_MIN = 0.15
-        self.AMOUNT_ADJUST_MAX = 2.5
-        self.GENERATE_DELAY_MIN = 0.5
-        self.GENERATE_DELAY_MAX = 2.5
-
-        self.last_sorted_column = None
-        self.sort_reverse = False
+        self.market_search = IncrementalSearch(global_data_manager.market_search_index)
+        self.search_delay = 150  # Milliseconds without typing before the search runs
+        self.search_task = None
+
+        # Listing changes waiting to be drawn, applied together once Tk is idle
+        self.changed_item_ids = set()
+        self.reset_pending = False
+        self.apply_task = None
+        self.upcoming_listings = []  # Heap of (available time, item_id) of the matching listings not shown yet
 
     def create_market_table(self, parent):
         """Create the market table with a vertical scrollbar and a search box."""
@@ -41,92 +46,42 @@ class MarketManager:
         tk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=5)
         search_entry = tk.Entry(search_frame, textvariable=self.search_var)
         search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-        search_entry.bind("<KeyRelease>", self.refresh_table)  # Update table on key release
-
-        # Create a frame for the table and scrollbar
-        tree_frame = tk.Frame(table_frame)
-        tree_frame.pack(fill=tk.BOTH, expand=True)
-
-        # Create the vertical scrollbar
-        scrollbar = tk.Scrollbar(tree_frame, orient="vertical")
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        # Define the remaining columns without 'Item ID'
-        columns = ("Name", "Price", "Amount", "Not_Available_Timer")
-        self.items_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-
-        # Set up the column headers and center-align them
-        # Add sorting functionality to each header
-        self.items_tree.heading("Name", text="Name", anchor=tk.CENTER, command=lambda: self.sort_by_column("Name", False))
-        self.items_tree.heading("Price", text="Price", anchor=tk.CENTER, command=lambda: self.sort_by_column("Price", False))
-        self.items_tree.heading("Amount", text="Amount", anchor=tk.CENTER, command=lambda: self.sort_by_column("Amount", False))
-        self.items_tree.heading("Not_Available_Timer", text="Available For", anchor=tk.CENTER, command=lambda: self.sort_by_column("Not_Available_Timer", False))
-
-        # Configure the column width and center the text in each column
-        self.items_tree.column("Name", anchor=tk.CENTER, width=150)
-        self.items_tree.column("Price", anchor=tk.CENTER, width=100)
-        self.items_tree.column("Amount", anchor=tk.CENTER, width=100)
-        self.items_tree.column("Not_Available_Timer", anchor=tk.CENTER, width=150)
+        search_entry.bind("<KeyRelease>", self.schedule_search)  # Update table once the user pauses typing
 
-        # Pack the TreeView into the frame
-        self.items_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        # Configure the scrollbar to control the TreeView's yview
-        scrollbar.config(command=self.items_tree.yview)
+        # Only the rows on screen are real TreeView rows, sorting and selection live in the table model
+        self.items_table = VirtualTable(
+            table_frame, self.COLUMNS,
+            headings={"Not_Available_Timer": "Available For"},
+            widths={"Name": 150, "Price": 100, "Amount": 100, "Not_Available_Timer": 150},
+            numeric_columns=("Price", "Amount", "Not_Available_Timer"))
+        self.items_tree = self.items_table.tree
+        self.items_table.frame.pack(fill=tk.BOTH, expand=True)
 
     def sort_by_column(self, col, reverse):
         """Sort the market table by the selected column."""
-        data = [(self.items_tree.set(k, col), k) for k in self.items_tree.get_children('')]
-
-        # Convert numeric values to integers for sorting
-        if col in ("Price", "Amount", "Not_Available_Timer"):
-            data.sort(key=lambda t: int(t[0]), reverse=reverse)
-        else:
-            data.sort(key=lambda t: t[0].lower(), reverse=reverse)
-
-        # Rearrange items in the sorted order
-        for index, (val, k) in enumerate(data):
-            self.items_tree.move(k, '', index)
-
-        # Reverse the sort order for the next time this column is clicked
-        self.items_tree.heading(col, command=lambda: self.sort_by_column(col, not reverse))
-
-        # Update last sorted column and order
-        self.last_sorted_column = col
-        self.sort_reverse = reverse
+        self.items_table.sort_by(col, reverse)
 
     def purchase_item(self, item, amount):
         """Handle purchasing an item from the market."""
-        total_price = item["price"] * amount
-        user_items = self.global_data_manager.user_items
-        in_market_items = self.global_data_manager.in_market_items
-
-        if self.backpack_manager.deduct_currency(total_price):  # Deduct currency based on the total price
-            # Add the item to the user's inventory
-            item_copy = item.copy()  # Create a copy of the item for the inventory
-            item_copy["amount"] = amount
-            self.backpack_manager.add_to_inventory(item_copy,amount)
-            self.backpack_manager.auto_convert_money()
-
-            # Reduce the amount in the market
-            item['amount'] -= amount
-            if item['amount'] <= 0:
-                self.global_data_manager.removed_item_ids.append(item['item_id'])
-                in_market_items.remove(item)  # Remove item if it's sold out
-
-            messagebox.showinfo("Purchase Successful", f"You bought {amount}x {item['name']} for {total_price} copper!")
-
-            # Refresh both the money and inventory in the backpack
-            self.backpack_manager.update_money_display()
-            self.backpack_manager.refresh_backpack_inventory()  # Refresh the inventory table in the backpack
+        if not item.alive():
+            # The listing expired or sold out while the confirmation popup was open
+            messagebox.showerror("Error", "This item is no longer in the market.")
+            return
+        summary = trades.execute_trades(self.global_data_manager,
+                                        [{"type": trades.LISTING_BUY, "item_id": item["item_id"], "amount": amount}], self.engine)
+        if summary["ok"]:
+            # The inventory and the money display follow the notifications of the trade
+            messagebox.showinfo("Purchase Successful", f"You bought {amount}x {summary['results'][0]['name']} for {summary['spent']} copper!")
         else:
-            messagebox.showerror("Insufficient Funds", "You don't have enough money to complete this purchase.")
+            messagebox.showerror("Purchase Failed", summary["errors"][0][1])
 
     def purchase_confirmation_popup(self, item):
         """Popup window to confirm purchase and input desired amount."""
+        listing = item
+        item = item.copy()  # The display keeps working if the listing leaves the market meanwhile
         
-        # Convert the user's currency to copper
-        total_copper = (self.global_data_manager.gold * 10000) + (self.global_data_manager.silver * 100) + self.global_data_manager.copper
+        # The user's currency, in copper
+        total_copper = self.global_data_manager.wallet.balance
         
         # Calculate the maximum amount the user can buy
         max_buyable_amount = total_copper // item['price']  # Max units user can afford
@@ -160,7 +115,7 @@ class MarketManager:
                 elif amount <= 0:
                     messagebox.showerror("Error", "Please enter a valid amount.")
                 else:
-                    self.purchase_item(item, amount)
+                    self.purchase_item(listing, amount)
                     popup_window.destroy()  # Close the confirmation window
             except ValueError:
                 messagebox.showerror("Error", "Please enter a valid number.")
@@ -211,136 +166,139 @@ class MarketManager:
             amount = int(amount_entry.get())
             total_price_in_copper = item["price"] * amount
 
-            # Convert to gold, silver, and copper
-            total_gold = total_price_in_copper // 10000  # 1 gold = 10,000 copper
-            remaining_copper = total_price_in_copper % 10000
-            total_silver = remaining_copper // 100  # 1 silver = 100 copper
-            total_copper = remaining_copper % 100  # Remaining copper
-
             # Display the total price in gold, silver, and copper
-            total_price_label.config(
-                text=f"Total Price: {total_gold} gold, {total_silver} silver, {total_copper} copper"
-            )
+            total_price_label.config(text=f"Total Price: {Wallet.format(total_price_in_copper)}")
         except ValueError:
             total_price_label.config(text="Total Price: 0 copper")
 
     def purchase_selected_item(self):
         """Purchase the currently selected item from the market table."""
-        selected_item = self.items_tree.focus()  # Get the selected item
-        if selected_item:
-            item_id = int(self.items_tree.item(selected_item, 'tags')[0])
-            item_to_purchase = next((item for item in self.global_data_manager.in_market_items if item['item_id'] == item_id), None)
+        item_id = self.get_selected_item()  # Get the selected item
+        if item_id is not None:
+            item_to_purchase = self.global_data_manager.get_market_item(item_id)
 
             if item_to_purchase:
                 self.purchase_confirmation_popup(item_to_purchase)
         else:
             messagebox.showerror("Error", "Please select an item to purchase.")
 
-    def refresh_table(self, event=None):
-        """Refresh the market items table, filtering by the search term."""
-        search_term = self.search_var.get().lower().strip()  # Get the search term
-        selected_item_id = self.get_selected_item()  # Remember selected item ID
+    def schedule_search(self, event=None):
+        """Debounce the search box: refresh the table search_delay ms after the last keystroke."""
+        if self.search_task:
+            self.root.after_cancel(self.search_task)
+        self.search_task = self.root.after(self.search_delay, self.run_search)
 
-        # Clear the current items in the table
-        for row in self.items_tree.get_children():
-            self.items_tree.delete(row)
+    def run_search(self):
+        self.search_task = None
+        self.refresh_table()
 
-        # Insert the filtered items from the market based on the search term
-        for item in self.global_data_manager.in_market_items:
-            if search_term in item["name"].lower():
-                current_time = time.time()
-                if current_time >= item["available_time_at"]:
-                    self.items_tree.insert(
-                        "", tk.END, values=(item["name"], item["price"], item['amount'], int(item['not_available_timer'])),
-                        tags=(str(item['item_id']),)  # Store 'item_id' in tags
-                    )
+    def get_matching_items(self, search_term):
+        """Return the item_ids of the listings whose name contains search_term, or None for every listing.
 
-        # Reselect the previously selected item (if available)
-        if selected_item_id is not None:
-            self.reselect_item(selected_item_id)
+        The previous search is narrowed when possible.
+        """
+        if not search_term:
+            return None
+        return self.market_search.search(search_term, self.global_data_manager.market_revision)
 
-        # Apply the last sorting after refresh
-        if self.last_sorted_column:
-            self.sort_by_column(self.last_sorted_column, self.sort_reverse)
+    def refresh_table(self, event=None):
+        """Refresh the market items table, filtering by the search term.
 
+        The table model gets every matching listing, but only the rows on screen are redrawn.
+        """
+        search_term = self.search_var.get().lower().strip()  # Get the search term
+        store = self.global_data_manager.in_market_items
+        current_time = self.engine.current_time
+
+        # Read the rows that should be displayed, keyed by item_id, straight from the listing columns;
+        # "Available For" is derived from the listing's expiry time
+        matching_items = self.get_matching_items(search_term)
+        wanted_rows = store.available_rows(current_time, matching_items)
+
+        # The listings that show up later are added by refresh_countdowns
+        upcoming = store.upcoming(current_time)
+        if matching_items is not None:
+            matching_items = set(matching_items)
+            upcoming = [entry for entry in upcoming if entry[1] in matching_items]
+        heapq.heapify(upcoming)
+        self.upcoming_listings = upcoming
+
+        self.changed_item_ids.clear()
+        self.reset_pending = False
+        rows_touched = self.items_table.set_rows(wanted_rows)
+        INSTRUMENTATION.add_rows("view.market_refresh", rows_touched)
+
+    def on_listing_changed(self, item_id, item):
+        """Remember a listing that was added, updated or removed, to redraw only its row."""
+        self.changed_item_ids.add(item_id)
+        self.schedule_apply_changes()
+
+    def on_listings_reset(self, key, record):
+        self.reset_pending = True
+        self.schedule_apply_changes()
+
+    def schedule_apply_changes(self):
+        if self.apply_task is None:
+            self.apply_task = self.root.after_idle(self.apply_changes)
+
+    def apply_changes(self):
+        """Apply the listing changes since the last call to the table, touching only their rows."""
+        self.apply_task = None
+        if self.reset_pending:
+            self.refresh_table()
+            return
+        changed, self.changed_item_ids = self.changed_item_ids, set()
+        self.update_rows(changed)
+
+    def update_rows(self, item_ids):
+        """Redraw the rows of these listings: added, replaced or dropped depending on the listing now."""
+        store = self.global_data_manager.in_market_items
+        current_time = self.engine.current_time
+        search_term = self.search_var.get().lower().strip()
+        present = [item_id for item_id in item_ids if item_id in store.slot_by_id]
+        rows = store.available_rows(current_time, present)
+        if search_term:
+            rows = {item_id: values for item_id, values in rows.items() if search_term in values[0].lower()}
+        for item_id in present:
+            if item_id not in rows:
+                item = store.get(item_id)
+                if item["available_time_at"] > current_time:
+                    heapq.heappush(self.upcoming_listings, (item["available_time_at"], item_id))
+        removed = [item_id for item_id in item_ids if item_id not in rows]
+        rows_touched = self.items_table.update_rows(rows, removed)
+        INSTRUMENTATION.add_rows("view.market_refresh", rows_touched)
+
+    def refresh_countdowns(self):
+        """Update the "Available For" countdowns on screen and show the listings that became available."""
+        current_time = self.engine.current_time
+        upcoming = self.upcoming_listings
+        shown = []
+        while upcoming and upcoming[0][0] <= current_time:
+            shown.append(heapq.heappop(upcoming)[1])
+        if shown:
+            self.update_rows(shown)
+
+        store = self.global_data_manager.in_market_items
+        visible = [item_id for item_id in self.items_table.visible_keys() if item_id in store.slot_by_id]
+        rows_touched = self.items_table.update_rows(store.available_rows(current_time, visible), keep_order=True)
+        INSTRUMENTATION.add_rows("view.market_refresh", rows_touched)
 
     def get_selected_item(self):
-        """Get the selected item's item_id from the TreeView."""
-        selected_item = self.items_tree.focus()
-        if selected_item:
-            return int(self.items_tree.item(selected_item, 'tags')[0])
-        return None
+        """Get the selected item's item_id from the table model."""
+        return self.items_table.get_selected_key()
 
     def reselect_item(self, item_id):
-        """Reselect an item in the TreeView by its item_id."""
-        for row in self.items_tree.get_children():
-            item_values = self.items_tree.item(row, 'tags')
-            if int(item_values[0]) == item_id:
-                self.items_tree.selection_set(row)
-                self.items_tree.focus(row)
-                break
-
-    def regenerate_items(self):
-        """Generate a new item periodically and refresh the market."""
-        def generate_runtime_item():
-            if len(self.global_data_manager.in_market_items) >= self.MAX_ITEMS:
-                return
-            if not self.global_data_manager.items_list:
-                print("No items available to generate.")
-                return
-
-            base_item = random.choices(self.global_data_manager.items_list, weights=[item['weight'] for item in self.global_data_manager.items_list], k=1)[0]
-
-            # Adjust the price within the specified range
-            price_adjustment_factor = random.uniform(self.PRICE_ADJUST_MIN, self.PRICE_ADJUST_MAX)
-            adjusted_price = int(base_item["price"] * price_adjustment_factor)
-
-            available_time_at = time.time() + random.uniform(self.TIME_ADJUST_MIN, self.TIME_ADJUST_MAX)
-            not_available_timer = int(base_item["not_available_timer"] * random.uniform(self.TIMER_ADJUST_MIN, self.TIMER_ADJUST_MAX))
-            adjusted_amount = int(base_item["amount"] * random.uniform(self.AMOUNT_ADJUST_MIN, self.AMOUNT_ADJUST_MAX))
-
-            # Reuse removed item ID if available, otherwise find the next unique ID
-            if self.global_data_manager.removed_item_ids:
-                item_id = self.global_data_manager.removed_item_ids.pop(0)
-            else:
-                item_id = max([item['item_id'] for item in self.global_data_manager.in_market_items], default=0) + 1
-
-            new_item = {
-                "item_id": item_id,
-                "name": base_item["name"],
-                "price": adjusted_price,
-                "amount": adjusted_amount,
-                "available_time_at": available_time_at,
-                "not_available_timer": not_available_timer,
-                "data_id": base_item["data_id"]
-            }
-
-            # Add the new item to the market and refresh the table
-            self.global_data_manager.in_market_items.append(new_item)
-            self.refresh_table()
-
-        def generate_items_loop():
-            generate_runtime_item()
-            next_delay = int(random.uniform(self.GENERATE_DELAY_MIN, self.GENERATE_DELAY_MAX) * 1000)
-            self.root.after(next_delay, generate_items_loop)
-
-        generate_items_loop()
-
-    def refresh_market(self):
-        """Refresh the market every second."""
-        def update_timers():
-            current_time = time.time()
-            for item in self.global_data_manager.in_market_items[:]:
-                if current_time >= item["available_time_at"]:
-                    item['not_available_timer'] -= self.refresh_rate
-                    if item['not_available_timer'] <= 0 or item['amount'] <= 0:
-                        self.global_data_manager.removed_item_ids.append(item["item_id"])
-                        self.global_data_manager.in_market_items.remove(item)
-
-            self.refresh_table()
-            self.root.after(self.refresh_rate * 1000, update_timers)
-
-        update_timers()
+        """Reselect an item in the table by its item_id."""
+        self.items_table.select(item_id)
+
+    def start_market_updates(self):
+        """Draw every listing change as it happens, and refresh the countdowns whenever the engine ticks the market."""
+        changes = self.global_data_manager.changes
+        for event_type in (change_events.LISTING_ADDED, change_events.LISTING_UPDATED, change_events.LISTING_REMOVED):
+            changes.subscribe(event_type, self.on_listing_changed)
+        changes.subscribe(change_events.LISTINGS_RESET, self.on_listings_reset)
+        self.engine.subscribe("market", self.refresh_countdowns)
+        self.refresh_table()
 
     def clear_market(self):
         """Clear all items from the market and calculate the cost for changing providers."""
@@ -350,35 +308,22 @@ class MarketManager:
         change_provider_cost = self.calculate_change_provider_cost()
 
         # Clear market items
-        self.global_data_manager.in_market_items.clear()
-        self.refresh_table()
+        self.global_data_manager.clear_market_items()  # The table follows the LISTINGS_RESET event
 
     def apply_tax_fee(self):
         """Apply a 12% tax to the user's total currency (gold, silver, copper)."""
-        # Convert the user's currency into copper for easy calculation
-        total_copper = (self.global_data_manager.gold * 10000) + (self.global_data_manager.silver * 100) + self.global_data_manager.copper
-
-        # Calculate the 12% tax
-        tax_amount = total_copper * 0.12
-
-        # Deduct the tax from the total copper
-        total_copper -= int(tax_amount)
-
-        # Convert the total copper back into gold, silver, and copper
-        self.global_data_manager.gold = total_copper // 10000  # 1 gold = 10,000 copper
-        remaining_copper = total_copper % 10000
-        self.global_data_manager.silver = remaining_copper // 100  # 1 silver = 100 copper
-        self.global_data_manager.copper = remaining_copper % 100  # Remaining copper
+        # Calculate the 12% tax, it never exceeds the balance
+        tax_amount = self.global_data_manager.wallet.balance * 0.12
 
-        # Update the display for the user's currency
-        self.backpack_manager.update_money_display()
+        # Deduct the tax, the currency display follows the wallet
+        self.global_data_manager.wallet.debit(int(tax_amount))
 
         # Inform the user about the tax deduction
         messagebox.showinfo("Tax Applied", f"A 12% tax fee has been applied: {int(tax_amount)} copper.")
 
     def calculate_change_provider_cost(self):
         """Calculate the amount of currency required to change providers dynamically."""
-        total_copper = (self.global_data_manager.gold * 10000) + (self.global_data_manager.silver * 100) + self.global_data_manager.copper
+        total_copper = self.global_data_manager.wallet.balance
         return int(total_copper * 0.05)  # For example, 5% of total currency
 
 
@@ -1,12 +1,14 @@
-import random
 from tkinter import messagebox
 import tkinter as tk
 
+from event_log import EVENT_LOG
+
 class MysteryBoxGame:
     def __init__(self, root, global_data_manager,backpack_manager):
         self.root = root
         self.global_data_manager = global_data_manager
         self.backpack_manager = backpack_manager
+        self.random = global_data_manager.rng.stream("mystery_box")
         self.box_details = {
             'copper': {
                 'price': 10,
@@ -45,15 +47,16 @@ class MysteryBoxGame:
         # Deduct the cost from the user's currency
         if self.backpack_manager.deduct_currency(cost):
             # Randomly select the number of items based on weights
-            num_items = random.choices(possible_item_counts, weights=item_weights)[0]
+            num_items = self.random.choices(possible_item_counts, weights=item_weights)[0]
             items_awarded = self.random_items(num_items)
 
             # Add the random items to the user's inventory
             self.backpack_manager.add_to_inventory(items_awarded, num_items)
+            EVENT_LOG.record("gamble", game=f"{box_type} mystery box", stake=cost, reward=0,
+                             detail=f"{num_items}x {items_awarded['name']}")
 
             # Notify the user of their reward with a color-coded dialog
             self.show_color_dialog(f"You received {num_items} x {items_awarded['name']} from the {box_type} mystery box!", item_colors[num_items])
-            self.backpack_manager.refresh_backpack_inventory()
         else:
             messagebox.showerror("Insufficient Funds", f"You don't have enough money to buy a {box_type} mystery box.")
 
@@ -72,4 +75,4 @@ class MysteryBoxGame:
     def random_items(self, num_items):
         """Generate a list of random items."""
         all_items = self.global_data_manager.items_list  # Assuming a list of available items
-        return random.choice(all_items)
+        return self.random.choice(all_items)
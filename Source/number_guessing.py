@@ -1,13 +1,15 @@
-import random
 import tkinter as tk
 from tkinter import messagebox
 
+from event_log import EVENT_LOG
+
 class NumberGuessGame:
     def __init__(self, root, global_data_manager, backpack_manager):
         self.root = root
         self.global_data_manager = global_data_manager
         self.backpack_manager = backpack_manager
         self.default_cost_per_guess = 10 
+        self.random = global_data_manager.rng.stream("number_guessing")
 
     def guess_number(self):
         """Allow the user to guess a number between 1 and 6, with the option to bid a custom amount."""
@@ -41,7 +43,7 @@ class NumberGuessGame:
     def start_guessing_game(self, bid_amount):
         """Start the guessing game with the given bid amount."""
         # Generate a random number between 1 and 6
-        correct_number = random.randint(1, 6)
+        correct_number = self.random.randint(1, 6)
 
         # Create a popup window for guessing
         guess_window = tk.Toplevel(self.root)
@@ -59,6 +61,9 @@ class NumberGuessGame:
 
                 reward = bid_amount * 4  # Reward is bid amount times 4
 
+                EVENT_LOG.record("gamble", game="number guessing", stake=bid_amount,
+                                 reward=reward if user_guess == correct_number else 0,
+                                 detail=f"guessed {user_guess}, was {correct_number}")
                 if user_guess == correct_number:
                     self.backpack_manager.receive_currency(reward)
                     messagebox.showinfo("Correct!", f"Congratulations! You guessed right and won {reward} copper!")
@@ -0,0 +1,208 @@
+import heapq
+
+BUY = "buy"
+SELL = "sell"
+
+
+class Order:
+    """A limit order; amount is what is left to fill, 0 once the order is filled or cancelled."""
+
+    __slots__ = ("order_id", "data_id", "side", "price", "amount", "owner", "sequence")
+
+    def __init__(self, order_id, data_id, side, price, amount, owner, sequence):
+        self.order_id = order_id
+        self.data_id = data_id
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.owner = owner  # Anything the caller uses to settle fills, such as ("listing", item_id)
+        self.sequence = sequence  # Arrival order, the time priority between orders at the same price
+
+    def __repr__(self):
+        return f"Order({self.order_id}, {self.side} {self.amount} of {self.data_id} at {self.price}, {self.owner})"
+
+
+class OrderBook:
+    """The resting bids and asks of one data_id.
+
+    Bids are a heap of (-price, sequence, order) and asks a heap of (price, sequence,
+    order), so the top of each heap is the best price, earliest first. Cancelled
+    orders stay in their heap with amount 0 until they reach the top, or until they
+    outnumber the live ones and the heap is compacted.
+    """
+
+    def __init__(self, data_id):
+        self.data_id = data_id
+        self.bids = []
+        self.asks = []
+        self.dead_orders = 0  # Cancelled orders still in the heaps
+
+    def best_bid(self):
+        """Return the best resting bid Order, or None."""
+        bids = self.bids
+        while bids and bids[0][2].amount == 0:
+            heapq.heappop(bids)
+            self.dead_orders -= 1
+        return bids[0][2] if bids else None
+
+    def best_ask(self):
+        """Return the best resting ask Order, or None."""
+        asks = self.asks
+        while asks and asks[0][2].amount == 0:
+            heapq.heappop(asks)
+            self.dead_orders -= 1
+        return asks[0][2] if asks else None
+
+    def compact(self):
+        """Drop the cancelled orders from both heaps."""
+        self.bids = [entry for entry in self.bids if entry[2].amount]
+        self.asks = [entry for entry in self.asks if entry[2].amount]
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+        self.dead_orders = 0
+
+    def depth(self, side, levels=5):
+        """Return [(price, total amount)] of the best price levels of a side, best first."""
+        totals = {}
+        for entry in self.bids if side == BUY else self.asks:
+            order = entry[2]
+            if order.amount:
+                totals[order.price] = totals.get(order.price, 0) + order.amount
+        return sorted(totals.items(), reverse=side == BUY)[:levels]
+
+
+class Exchange:
+    """Limit order books, one per data_id, matching with price-time priority.
+
+    An incoming order trades against the best resting orders of the other side as
+    long as the prices cross, at the resting order's price, and whatever is left
+    rests in the book. Fills are returned as tuples
+    (data_id, price, amount, buy order, sell order), the orders being the Order objects.
+    """
+
+    def __init__(self):
+        self.books = {}  # data_id -> OrderBook
+        self.orders = {}  # order_id -> resting Order
+        self.next_order_id = 1
+        self.next_sequence = 0
+
+    def get_book(self, data_id):
+        book = self.books.get(data_id)
+        if book is None:
+            book = self.books[data_id] = OrderBook(data_id)
+        return book
+
+    def get_order(self, order_id):
+        """Return the resting Order with this order_id, or None if it was filled or cancelled."""
+        return self.orders.get(order_id)
+
+    def place(self, data_id, side, price, amount, owner=None):
+        """Place a limit order. Return (the Order, its fills); the Order rests in the book if its amount is not 0."""
+        order = Order(self.next_order_id, data_id, side, price, amount, owner, self.next_sequence)
+        self.next_order_id += 1
+        self.next_sequence += 1
+        book = self.get_book(data_id)
+        fills = []
+        orders = self.orders
+
+        if side == BUY:
+            asks = book.asks
+            while order.amount and asks:
+                maker = asks[0][2]
+                if maker.amount == 0:
+                    heapq.heappop(asks)
+                    book.dead_orders -= 1
+                    continue
+                if maker.price > price:
+                    break
+                filled = order.amount if order.amount < maker.amount else maker.amount
+                order.amount -= filled
+                maker.amount -= filled
+                fills.append((data_id, maker.price, filled, order, maker))
+                if maker.amount == 0:
+                    heapq.heappop(asks)
+                    del orders[maker.order_id]
+            if order.amount:
+                heapq.heappush(book.bids, (-price, order.sequence, order))
+                orders[order.order_id] = order
+        else:
+            bids = book.bids
+            while order.amount and bids:
+                maker = bids[0][2]
+                if maker.amount == 0:
+                    heapq.heappop(bids)
+                    book.dead_orders -= 1
+                    continue
+                if maker.price < price:
+                    break
+                filled = order.amount if order.amount < maker.amount else maker.amount
+                order.amount -= filled
+                maker.amount -= filled
+                fills.append((data_id, maker.price, filled, maker, order))
+                if maker.amount == 0:
+                    heapq.heappop(bids)
+                    del orders[maker.order_id]
+            if order.amount:
+                heapq.heappush(book.asks, (price, order.sequence, order))
+                orders[order.order_id] = order
+        return order, fills
+
+    def cancel(self, order_id):
+        """Cancel a resting order. Return False if it was already filled or cancelled."""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.amount = 0
+        book = self.books[order.data_id]
+        book.dead_orders += 1
+        if book.dead_orders > 64 and book.dead_orders * 2 > len(book.bids) + len(book.asks):
+            book.compact()
+        return True
+
+    def reduce(self, order_id, amount):
+        """Lower the amount left of a resting order, keeping its time priority. Return False if it is not resting."""
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        if amount >= order.amount:
+            return self.cancel(order_id)
+        order.amount -= amount
+        return True
+
+    def clear(self):
+        for order in self.orders.values():
+            order.amount = 0
+        self.books.clear()
+        self.orders.clear()
+
+
+if __name__ == "__main__":
+    # Headless throughput: python order_book.py [operations]
+    import random
+    import sys
+    import time
+
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(0)
+    exchange = Exchange()
+    data_ids = [str(101 + index) for index in range(20)]
+    resting = []
+    fill_count = 0
+
+    started = time.perf_counter()
+    for _ in range(operations):
+        if resting and rng.random() < 0.3:
+            # Cancel a random resting order, filled ones just return False
+            position = rng.randrange(len(resting))
+            resting[position], resting[-1] = resting[-1], resting[position]
+            exchange.cancel(resting.pop())
+        else:
+            side = BUY if rng.random() < 0.5 else SELL
+            price = rng.randint(90, 110) if side == BUY else rng.randint(95, 115)
+            order, fills = exchange.place(rng.choice(data_ids), side, price, rng.randint(1, 20))
+            fill_count += len(fills)
+            if order.amount:
+                resting.append(order.order_id)
+    elapsed = time.perf_counter() - started
+    print(f"{operations} order operations in {elapsed:.3f}s ({operations / elapsed:.0f} ops/s), "
+          f"{fill_count} fills, {len(exchange.orders)} resting orders")
@@ -0,0 +1,155 @@
+from array import array
+
+MINUTE = 60
+HOUR = 3600
+
+
+class RingBuffer:
+    """Fixed number of rows in parallel typed arrays, the oldest row being overwritten when full.
+
+    Rows are appended in time order, so the first column (the time) is sorted and
+    searched with a binary search over the logical positions. The arrays grow with
+    the rows up to the capacity, an idle series takes no room.
+    """
+
+    def __init__(self, capacity, typecodes):
+        self.capacity = capacity
+        self.columns = [array(typecode) for typecode in typecodes]
+        self.start = 0  # Physical position of the oldest row
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, *row):
+        if self.size < self.capacity:
+            # Not full yet, so start is still 0 and the row goes at the end of the arrays
+            self.size += 1
+            for column, value in zip(self.columns, row):
+                column.append(value)
+            return
+        position = self.start  # Full, overwrite the oldest row
+        self.start = (self.start + 1) % self.capacity
+        for column, value in zip(self.columns, row):
+            column[position] = value
+
+    def row(self, index):
+        """Return the row at a logical position, 0 being the oldest."""
+        position = (self.start + index) % self.capacity
+        return tuple(column[position] for column in self.columns)
+
+    def last_time(self):
+        return self.columns[0][(self.start + self.size - 1) % self.capacity] if self.size else None
+
+    def bisect_left(self, time_value):
+        """Return the logical position of the first row whose time is at or after time_value."""
+        times = self.columns[0]
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if times[(self.start + middle) % self.capacity] < time_value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start_time, end_time):
+        """Return the rows with start_time <= time < end_time, oldest first."""
+        first = self.bisect_left(start_time)
+        last = self.bisect_left(end_time)
+        return [self.row(index) for index in range(first, last)]
+
+
+class BarTier:
+    """OHLCV bars of a fixed duration: a ring buffer of the closed bars plus the bar being built."""
+
+    def __init__(self, duration, capacity):
+        self.duration = duration
+        self.bars = RingBuffer(capacity, ('d', 'd', 'd', 'd', 'd', 'q'))  # start, open, high, low, close, volume
+        self.current = None  # [start, open, high, low, close, volume] of the open bar
+
+    def add(self, time_value, price, volume):
+        bar_start = time_value - time_value % self.duration
+        current = self.current
+        if current is not None and current[0] == bar_start:
+            if price > current[2]:
+                current[2] = price
+            if price < current[3]:
+                current[3] = price
+            current[4] = price
+            current[5] += volume
+            return
+        if current is not None:
+            self.bars.append(*current)  # The bar is over, roll it into the tier
+        self.current = [bar_start, price, price, price, price, volume]
+
+    def range(self, start_time, end_time):
+        """Return (start, open, high, low, close, volume) of the bars starting in [start_time, end_time)."""
+        bars = self.bars.range(start_time, end_time)
+        if self.current is not None and start_time <= self.current[0] < end_time:
+            bars.append(tuple(self.current))
+        return bars
+
+
+class PriceSeries:
+    """Price history of one data_id: the latest raw ticks plus 1-minute and 1-hour OHLCV bars.
+
+    Every tier is a ring buffer, so the memory of a series is fixed: by default the
+    last 1024 ticks, 24 hours of minutes and 30 days of hours.
+    """
+
+    def __init__(self, tick_capacity=1024, minute_capacity=1440, hour_capacity=720):
+        self.ticks = RingBuffer(tick_capacity, ('d', 'd', 'q'))  # time, price, volume
+        self.tiers = {
+            MINUTE: BarTier(MINUTE, minute_capacity),
+            HOUR: BarTier(HOUR, hour_capacity),
+        }
+
+    def add(self, time_value, price, volume=0):
+        """Record a price at time_value. Times must not go backwards, earlier times are moved to the last one."""
+        last_time = self.ticks.last_time()
+        if last_time is not None and time_value < last_time:
+            time_value = last_time
+        self.ticks.append(time_value, price, volume)
+        for tier in self.tiers.values():
+            tier.add(time_value, price, volume)
+
+    def get_ticks(self, start_time, end_time):
+        """Return the (time, price, volume) ticks with start_time <= time < end_time."""
+        return self.ticks.range(start_time, end_time)
+
+    def get_bars(self, duration, start_time, end_time):
+        """Return the OHLCV bars of the MINUTE or HOUR tier starting in [start_time, end_time)."""
+        return self.tiers[duration].range(start_time, end_time)
+
+    def get_last_price(self):
+        return self.ticks.row(self.ticks.size - 1)[1] if self.ticks.size else None
+
+
+class PriceHistory:
+    """Price series per source and data_id.
+
+    The sources are "listing" (price and amount of every new listing), "demand"
+    (buy price and amount of every new or repriced demand) and "quote" (sell price
+    of the fixed price market quotes). A disabled history records nothing.
+    """
+
+    def __init__(self, tick_capacity=1024, minute_capacity=1440, hour_capacity=720, enabled=True):
+        self.capacities = (tick_capacity, minute_capacity, hour_capacity)
+        self.enabled = enabled
+        self.series = {}  # (source, data_id) -> PriceSeries
+
+    def clear(self):
+        self.series.clear()
+
+    def record(self, source, data_id, time_value, price, volume=0):
+        if not self.enabled:
+            return
+        series = self.series.get((source, data_id))
+        if series is None:
+            series = self.series[(source, data_id)] = PriceSeries(*self.capacities)
+        series.add(time_value, price, volume)
+
+    def get_series(self, source, data_id):
+        """Return the PriceSeries of a data_id, or None if nothing was recorded for it."""
+        return self.series.get((source, data_id))
@@ -0,0 +1,101 @@
+import heapq
+
+COMPACT_SLACK = 16  # Stale heap entries tolerated on top of one per live price before a rebuild
+
+
+class PriceIndex:
+    """Min/max/average/count of the listing prices, kept per data_id and updated incrementally.
+
+    Each data_id has a multiset of prices (price -> number of listings), a min-heap and a
+    max-heap over the distinct prices, and a running sum. Heap entries whose price has no
+    listings left are dropped lazily when they reach the top, and the heaps of a data_id are
+    rebuilt from its live prices once stale entries outnumber them, so churn below the top
+    does not grow the heaps without bound.
+    """
+
+    def __init__(self):
+        self.price_counts = {}  # data_id -> {price: number of listings}
+        self.min_heaps = {}  # data_id -> heap of prices
+        self.max_heaps = {}  # data_id -> heap of negated prices
+        self.price_sums = {}  # data_id -> sum of listing prices
+        self.listing_counts = {}  # data_id -> number of listings
+
+    def clear(self):
+        """Forget every price."""
+        self.price_counts.clear()
+        self.min_heaps.clear()
+        self.max_heaps.clear()
+        self.price_sums.clear()
+        self.listing_counts.clear()
+
+    def add(self, data_id, price):
+        """Record a listing at this price."""
+        counts = self.price_counts.setdefault(data_id, {})
+        if not counts.get(price):
+            # First listing at this price, so it needs a heap entry
+            counts[price] = 0
+            min_heap = self.min_heaps.setdefault(data_id, [])
+            if len(min_heap) > 2 * len(counts) + COMPACT_SLACK:
+                self.compact(data_id)
+            else:
+                heapq.heappush(min_heap, price)
+                heapq.heappush(self.max_heaps.setdefault(data_id, []), -price)
+        counts[price] += 1
+        self.price_sums[data_id] = self.price_sums.get(data_id, 0) + price
+        self.listing_counts[data_id] = self.listing_counts.get(data_id, 0) + 1
+
+    def remove(self, data_id, price):
+        """Forget one listing at this price."""
+        counts = self.price_counts.get(data_id)
+        if not counts or not counts.get(price):
+            return
+        counts[price] -= 1
+        if counts[price] == 0:
+            del counts[price]
+        self.price_sums[data_id] -= price
+        self.listing_counts[data_id] -= 1
+        if self.listing_counts[data_id] == 0:
+            # Drop the data_id entirely so the heaps do not keep stale prices around
+            del self.price_counts[data_id], self.min_heaps[data_id], self.max_heaps[data_id]
+            del self.price_sums[data_id], self.listing_counts[data_id]
+
+    def compact(self, data_id):
+        """Rebuild the heaps of data_id from its live prices, dropping the stale entries."""
+        prices = list(self.price_counts[data_id])
+        min_heap = prices[:]
+        heapq.heapify(min_heap)
+        max_heap = [-price for price in prices]
+        heapq.heapify(max_heap)
+        self.min_heaps[data_id] = min_heap
+        self.max_heaps[data_id] = max_heap
+
+    def get_count(self, data_id):
+        """Number of listings for this data_id."""
+        return self.listing_counts.get(data_id, 0)
+
+    def get_lowest_price(self, data_id):
+        """Lowest listing price for this data_id, or 0 if there is none."""
+        heap = self.min_heaps.get(data_id)
+        if not heap:
+            return 0
+        counts = self.price_counts[data_id]
+        while heap[0] not in counts:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def get_highest_price(self, data_id):
+        """Highest listing price for this data_id, or 0 if there is none."""
+        heap = self.max_heaps.get(data_id)
+        if not heap:
+            return 0
+        counts = self.price_counts[data_id]
+        while -heap[0] not in counts:
+            heapq.heappop(heap)
+        return -heap[0]
+
+    def get_average_price(self, data_id):
+        """Average listing price for this data_id, or None if there is none."""
+        count = self.listing_counts.get(data_id, 0)
+        if count == 0:
+            return None
+        return self.price_sums[data_id] / count
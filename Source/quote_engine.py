@@ -0,0 +1,73 @@
+class QuoteEngine:
+    """Buy and sell quotes of every catalog item, computed in one pass and cached for a refresh window.
+
+    The randomness of the sell price is part of the cached quote, so a quote does not
+    change between two searches of the same window. Windows and price samples are in the
+    simulated time of the engine, like the listing and demand prices.
+    """
+
+    def __init__(self, global_data_manager, engine, refresh_interval=10):
+        self.global_data_manager = global_data_manager
+        self.engine = engine
+        self.refresh_interval = refresh_interval  # Simulated seconds a set of quotes stays valid
+        self.quotes = []  # One dict per catalog item, in items_list order
+        self.quotes_by_name = {}
+        self.refreshed_at = None
+        self.random = global_data_manager.rng.stream("fixed_price")  # Randomness of the sell prices
+
+    def refresh(self):
+        """Re-price the whole catalog and return the new quotes."""
+        price_index = self.global_data_manager.market_price_index
+        price_history = self.global_data_manager.price_history
+        now = self.engine.current_time
+        extremes = {}  # data_id -> (lowest, highest) market price, read once even if several items share it
+        quotes = []
+        for item in self.global_data_manager.items_list:
+            data_id = item['data_id']
+            if data_id not in extremes:
+                extremes[data_id] = (price_index.get_lowest_price(data_id), price_index.get_highest_price(data_id))
+            buy_price_from_user, sell_price_to_user = self.calculate_prices(item, *extremes[data_id])
+            quotes.append({
+                "item_id": item['item_id'],
+                "name": item['name'],
+                "search_name": item['name'].lower(),
+                "buy_price": buy_price_from_user,
+                "sell_price": sell_price_to_user
+            })
+            price_history.record("quote", data_id, now, sell_price_to_user)  # A sample of the fixed price market
+        self.quotes = quotes
+        self.quotes_by_name = {quote["name"]: quote for quote in quotes}
+        self.refreshed_at = now
+        return quotes
+
+    def is_stale(self):
+        return self.refreshed_at is None or self.engine.current_time - self.refreshed_at >= self.refresh_interval
+
+    def get_quotes(self, search_term=""):
+        """Return the cached quotes whose name contains search_term, re-pricing only once the window is over."""
+        if self.is_stale():
+            self.refresh()
+        search_term = search_term.lower().strip()
+        if not search_term:
+            return self.quotes
+        return [quote for quote in self.quotes if search_term in quote["search_name"]]
+
+    def get_quote(self, name):
+        """Return the cached quote of the catalog item with this name, re-pricing only once the window is over."""
+        if self.is_stale():
+            self.refresh()
+        return self.quotes_by_name[name]
+
+    def calculate_prices(self, item, lowest_market_price, highest_market_price):
+        """Return the (buy price from user, sell price to user) of a catalog item, given the market extremes."""
+        buy_price_from_user = int(lowest_market_price) if lowest_market_price > 0 else int(item['price'])
+        sell_price_to_user = int(max(item['price'], highest_market_price * 0.9))
+
+        sell_price_to_user = self.apply_randomness(sell_price_to_user)
+        if sell_price_to_user < buy_price_from_user:
+            sell_price_to_user = buy_price_from_user + 1
+        return buy_price_from_user, sell_price_to_user
+
+    def apply_randomness(self, price):
+        randomness_factor = self.random.uniform(1, 1.15)
+        return int(price * randomness_factor)
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import random
+
+
+class RngRegistry:
+    """Independent random streams, one per subsystem, all derived from a single seed.
+
+    Each stream is a random.Random seeded from a hash of the seed and the stream name,
+    so the draws of one subsystem never shift the draws of another. reseed and
+    set_state update the existing streams in place, so subsystems can keep a
+    reference to their stream across a load or a restart.
+    """
+
+    def __init__(self, seed=None):
+        self.streams = {}  # Name -> random.Random
+        self.seed = None
+        self.reseed(seed)
+
+    def derive_seed(self, name):
+        """Return the seed of the stream called name, the same on every platform and Python run."""
+        digest = hashlib.sha256(f"{self.seed}/{name}".encode()).digest()
+        return int.from_bytes(digest[:16], "big")
+
+    def reseed(self, seed=None):
+        """Restart every stream from seed, or from a new random seed that is kept so the run can be replayed."""
+        self.seed = int.from_bytes(os.urandom(8), "big") if seed is None else seed
+        for name, stream in self.streams.items():
+            stream.seed(self.derive_seed(name))
+
+    def stream(self, name):
+        """Return the stream of a subsystem, creating it on first use."""
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = self.streams[name] = random.Random(self.derive_seed(name))
+        return stream
+
+    def get_state(self):
+        """Return the seed and the position of every stream, as JSON-compatible data."""
+        streams = {}
+        for name, stream in self.streams.items():
+            version, internal_state, gauss_next = stream.getstate()
+            streams[name] = [version, list(internal_state), gauss_next]
+        return {"seed": self.seed, "streams": streams}
+
+    def set_state(self, state):
+        """Restore the streams saved by get_state. An empty state starts over from a new random seed."""
+        if not state:
+            self.reseed()
+            return
+        self.reseed(state["seed"])
+        for name, (version, internal_state, gauss_next) in state.get("streams", {}).items():
+            self.stream(name).setstate((version, tuple(internal_state), gauss_next))
@@ -0,0 +1,169 @@
+import time
+
+from instrumentation import INSTRUMENTATION
+
+
+class ScheduledTask:
+    """A system driven by the Scheduler: stepped at the fixed timestep, or called every interval seconds."""
+
+    __slots__ = ("name", "callback", "interval", "priority", "next_due", "active")
+
+    def __init__(self, name, callback, interval, priority, next_due):
+        self.name = name
+        self.callback = callback
+        self.interval = interval  # None for the fixed step tasks, called with the step length
+        self.priority = priority  # Lower runs first
+        self.next_due = next_due
+        self.active = True
+
+
+class Scheduler:
+    """Drives every periodic system of the game from one fixed-timestep loop.
+
+    Real time is added to an accumulator every frame and the fixed step tasks (the
+    simulation) are called once per step of it, at most max_catch_up_steps times a
+    frame; time beyond that is dropped, so the simulation slows down under load
+    instead of spiralling. Interval tasks run when due, by priority, as long as the
+    frame stays within its work budget; a task late by whole intervals runs once,
+    not once per interval. Skipped steps, late intervals and tasks put off by the
+    budget count as missed deadlines in INSTRUMENTATION, next to the frame times.
+    """
+
+    def __init__(self, step=1 / 24, max_catch_up_steps=4, frame_budget=None, clock=time.perf_counter):
+        self.step = step
+        self.max_catch_up_steps = max_catch_up_steps
+        self.frame_budget = step * 0.5 if frame_budget is None else frame_budget  # Seconds of work per frame
+        self.clock = clock
+        self.fixed_tasks = []
+        self.interval_tasks = []
+        self.accumulator = 0.0
+        self.last_frame_at = None
+        self.next_frame_at = None
+        self.frame_count = 0
+        self.root = None
+        self.frame_task = None
+
+    def add_fixed_step(self, name, callback, priority=0):
+        """Call callback(step) once per fixed step. Return the task, for remove."""
+        task = ScheduledTask(name, callback, None, priority, None)
+        self.fixed_tasks.append(task)
+        self.fixed_tasks.sort(key=lambda fixed_task: fixed_task.priority)
+        return task
+
+    def add(self, name, callback, interval, priority=10, delay=None):
+        """Call callback() every interval seconds, the first time after delay (interval by default). Return the task."""
+        task = ScheduledTask(name, callback, interval, priority, self.clock() + (interval if delay is None else delay))
+        self.interval_tasks.append(task)
+        return task
+
+    def remove(self, task):
+        """Stop a task, also from inside its own callback."""
+        if task is None or not task.active:
+            return
+        task.active = False
+        tasks = self.fixed_tasks if task.interval is None else self.interval_tasks
+        tasks.remove(task)
+
+    def start(self, root, step=None):
+        """Run the frames from the Tk event loop of root, every step seconds."""
+        if step is not None:
+            self.set_step(step)
+        self.root = root
+        self.reset_clock()
+        self.schedule_next_frame()
+
+    def set_step(self, step):
+        """Change the fixed step, and the frame budget with it."""
+        self.step = step
+        self.frame_budget = step * 0.5
+
+    def reset_clock(self):
+        """Start counting the time owed to the fixed steps from now."""
+        self.accumulator = 0.0
+        self.last_frame_at = self.next_frame_at = self.clock()
+
+    def stop(self):
+        if self.root and self.frame_task:
+            self.root.after_cancel(self.frame_task)
+        self.frame_task = None
+        self.root = None
+
+    def schedule_next_frame(self):
+        # Aim at the ideal frame times so the loop does not drift, but never queue up missed frames
+        now = self.clock()
+        self.next_frame_at += self.step
+        if self.next_frame_at < now:
+            self.next_frame_at = now + self.step
+        self.frame_task = self.root.after(max(1, int((self.next_frame_at - now) * 1000)), self.on_frame)
+
+    def on_frame(self):
+        self.run_frame()
+        if self.root:
+            self.schedule_next_frame()
+
+    def run_frame(self, now=None):
+        """Run one frame: the fixed steps owed since the last frame, then the due interval tasks."""
+        clock = self.clock
+        frame_started = clock()
+        now = frame_started if now is None else now
+        if self.last_frame_at is None:
+            self.last_frame_at = now
+        self.accumulator += max(0.0, now - self.last_frame_at)
+        self.last_frame_at = now
+        deadline = frame_started + self.frame_budget
+        self.frame_count += 1
+
+        # Fixed steps, at least one when owed, catching up while the budget lasts
+        steps = 0
+        while self.accumulator >= self.step and steps < self.max_catch_up_steps:
+            if steps and clock() > deadline:
+                break
+            for task in list(self.fixed_tasks):
+                started = clock()
+                task.callback(self.step)
+                INSTRUMENTATION.record(task.name, clock() - started)
+            self.accumulator -= self.step
+            steps += 1
+        if self.accumulator >= self.step:
+            # Too far behind: drop the time, the simulation runs slower than real time for this frame
+            dropped = int(self.accumulator / self.step)
+            self.accumulator -= dropped * self.step
+            for task in self.fixed_tasks:
+                INSTRUMENTATION.record_missed(task.name, dropped)
+
+        # Due interval tasks, most important first, while the budget lasts
+        due = [task for task in self.interval_tasks if task.next_due <= now]
+        due.sort(key=lambda task: (task.priority, task.next_due))
+        for task in due:
+            if not task.active:
+                continue  # Removed by a task that ran before it
+            if clock() > deadline:
+                INSTRUMENTATION.record_missed(task.name)  # Put off to the next frame
+                continue
+            late = now - task.next_due
+            missed = int(late / task.interval)
+            task.next_due += (missed + 1) * task.interval
+            INSTRUMENTATION.record_lag(task.name, late)
+            if missed:
+                INSTRUMENTATION.record_missed(task.name, missed)
+            started = clock()
+            task.callback()
+            INSTRUMENTATION.record(task.name, clock() - started)
+
+        INSTRUMENTATION.record("scheduler.frame", clock() - frame_started, rows=steps)
+        return steps
+
+    def report(self):
+        """Return the frame time and the missed deadlines of every task, from INSTRUMENTATION."""
+        frame = INSTRUMENTATION.get("scheduler.frame")
+        return {
+            "frames": self.frame_count,
+            "step": self.step,
+            "frame_budget": self.frame_budget,
+            "frame_time": frame.wall_time.to_dict(),
+            "missed_deadlines": {task.name: INSTRUMENTATION.get(task.name).missed_deadlines
+                                 for task in self.fixed_tasks + self.interval_tasks},
+        }
+
+
+SCHEDULER = Scheduler()  # Shared by every module, started by main.py
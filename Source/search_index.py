@@ -0,0 +1,110 @@
+class SubstringIndex:
+    """Case-insensitive substring search over keys that each have a name.
+
+    Keys are grouped by lowercased name, and every name is indexed by all of its
+    n-grams up to gram_size characters. A query of at most gram_size characters is
+    a single lookup; a longer one intersects the postings of its gram_size-grams,
+    smallest first, and checks the few candidate names that are left.
+    """
+
+    def __init__(self, gram_size=3):
+        self.gram_size = gram_size
+        self.keys_by_name = {}  # lowercased name -> {key: None}, in insertion order
+        self.names_by_gram = {}  # n-gram -> set of lowercased names containing it
+        self.name_of_key = {}  # key -> lowercased name
+
+    def clear(self):
+        self.keys_by_name.clear()
+        self.names_by_gram.clear()
+        self.name_of_key.clear()
+
+    def grams(self, name):
+        """Return every substring of name of 1 to gram_size characters."""
+        return {name[start:start + length]
+                for length in range(1, self.gram_size + 1)
+                for start in range(len(name) - length + 1)}
+
+    def add(self, key, name):
+        """Index key under name, replacing the name it had before."""
+        name = name.lower()
+        if key in self.name_of_key:
+            if self.name_of_key[key] == name:
+                return
+            self.remove(key)
+        self.name_of_key[key] = name
+        keys = self.keys_by_name.get(name)
+        if keys is None:
+            keys = self.keys_by_name[name] = {}
+            for gram in self.grams(name):
+                self.names_by_gram.setdefault(gram, set()).add(name)
+        keys[key] = None
+
+    def remove(self, key):
+        """Forget key. Return False if it was not indexed."""
+        name = self.name_of_key.pop(key, None)
+        if name is None:
+            return False
+        keys = self.keys_by_name[name]
+        del keys[key]
+        if not keys:
+            # Last key with this name, drop the name from the n-gram postings
+            del self.keys_by_name[name]
+            for gram in self.grams(name):
+                names = self.names_by_gram[gram]
+                names.discard(name)
+                if not names:
+                    del self.names_by_gram[gram]
+        return True
+
+    def matching_names(self, query):
+        """Return the indexed lowercased names that contain query."""
+        query = query.lower()
+        if not query:
+            return list(self.keys_by_name)
+        if len(query) <= self.gram_size:
+            return list(self.names_by_gram.get(query, ()))
+
+        postings = []
+        for start in range(len(query) - self.gram_size + 1):
+            names = self.names_by_gram.get(query[start:start + self.gram_size])
+            if not names:
+                return []
+            postings.append(names)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [name for name in candidates if query in name]
+
+    def search(self, query):
+        """Return the keys whose name contains query, grouped by name."""
+        found = []
+        for name in self.matching_names(query):
+            found.extend(self.keys_by_name[name])
+        return found
+
+
+class IncrementalSearch:
+    """Remembers the last result of a SubstringIndex, to narrow it when the query is extended.
+
+    The result is reused only while the indexed keys are unchanged, which the caller
+    tells with a revision number that changes whenever a key is added or removed.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.query = None
+        self.revision = None
+        self.result = []
+
+    def search(self, query, revision):
+        """Return the keys whose name contains query."""
+        query = query.lower()
+        if self.query is not None and revision == self.revision and self.query in query:
+            # Every match of the longer query is also a match of the previous one
+            if query != self.query:
+                name_of_key = self.index.name_of_key
+                self.result = [key for key in self.result if query in name_of_key[key]]
+        else:
+            self.result = self.index.search(query)
+        self.query = query
+        self.revision = revision
+        return self.result
@@ -1,23 +1,32 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import tkinter
+from tkinter import messagebox
+
+from instrumentation import INSTRUMENTATION
+import trades
+from virtual_table import VirtualTable
+from wallet import Wallet
 
 class SellingMarketManager:
-    def __init__(self, root, global_data_manager):
+    def __init__(self, root, global_data_manager, engine=None):
         self.root = root
         self.global_data_manager = global_data_manager
+        self.engine = engine  # Notified of the trades, if given
         self.demands_control_manager = None
         self.selling_window = None
         self.selling_window_open = False
-        self.demands_tree = None
+        self.demands_table = None  # VirtualTable showing the demands
+        self.demands_tree = None  # Its TreeView widget
         self.refresh_task = None
         self.backpack_manager = None
         self.table_frame = None
         self.demands_frame = None
         self.search_var = None
         self.if_set_up = False
-        self.current_sort_column = None
-        self.sort_direction = True
+
+        # Demand changes waiting to be drawn, applied together once Tk is idle
+        self.changed_demand_ids = set()
+        self.reset_pending = False
+        self.apply_task = None
 
 
         
@@ -40,77 +49,17 @@ class SellingMarketManager:
             self.demands_control_manager.search_entry.bind("<KeyRelease>", lambda event: self.demands_control_manager.filter_demands(self.demands_control_manager.search_var.get()))
 
     def create_selling_table(self, parent):
-        """Create the selling demands table with a vertical scrollbar and sorting functionality."""
-        self.table_frame = tk.Frame(parent)
-        self.table_frame.grid(row=1, column=0, columnspan=2, sticky="nsew")  # Use grid instead of pack
-
-        # Create the scrollbar
-        scrollbar = tk.Scrollbar(self.table_frame, orient="vertical")
-        scrollbar.grid(row=0, column=1, sticky="ns")  # Grid for scrollbar
-
-        # Create the table
+        """Create the selling demands table, a VirtualTable with sorting and a vertical scrollbar."""
         columns = ("Demand ID", "Name", "Reward", "Max Amount", "Not Available Timer")
-        self.demands_tree = ttk.Treeview(self.table_frame, columns=columns, show="headings", yscrollcommand=scrollbar.set)
-
-        # Set table headers and column properties, and bind headers for sorting
-        for col in columns:
-            self.demands_tree.heading(col, text=col, anchor=tk.CENTER, command=lambda c=col: self.sort_by_column(c, False))
-            self.demands_tree.column(col, anchor=tk.CENTER, width=100)
-
-        self.demands_tree.grid(row=0, column=0, sticky="nsew")  # Grid for treeview
-        self.table_frame.grid_rowconfigure(0, weight=1)
-        self.table_frame.grid_columnconfigure(0, weight=1)
-
-        # Configure scrollbar
-        scrollbar.config(command=self.demands_tree.yview)
-
-        # Track the current sort state (column and direction)
-        self.current_sort_column = None
-        self.sort_direction = False
-
-        return self.demands_tree
-
-    def sort_by_column(self, col, reverse):
-        """Sort the demands table based on the selected column."""
-        # Get all the items in the table
-        items = [(self.demands_tree.set(k, col), k) for k in self.demands_tree.get_children('')]
-
-        # Sort the items based on the selected column
-        try:
-            items.sort(key=lambda t: int(t[0]) if t[0].isdigit() else t[0], reverse=reverse)
-        except ValueError:
-            # Fallback for sorting non-numeric values
-            items.sort(key=lambda t: t[0], reverse=reverse)
-
-        # Reorder the items in the table based on the sorted list
-        for index, (_, k) in enumerate(items):
-            self.demands_tree.move(k, '', index)
-
-        # Toggle the sort direction for the next click
-        self.sort_direction = not reverse
+        self.demands_table = VirtualTable(parent, columns, numeric_columns=("Demand ID", "Reward", "Max Amount", "Not Available Timer"))
+        self.table_frame = self.demands_table.frame
+        self.table_frame.grid(row=1, column=0, columnspan=2, sticky="nsew")  # Use grid instead of pack
 
-        # Store the current sort column
-        self.current_sort_column = col
+        return self.demands_table.tree
 
     def sort_by_column(self, col, reverse):
         """Sort the demands based on the selected column."""
-        # Get the current items from the table
-        items = [(self.demands_tree.set(k, col), k) for k in self.demands_tree.get_children('')]
-
-        # Sort items based on the column value
-        items.sort(reverse=reverse, key=lambda x: float(x[0]) if x[0].replace('.', '', 1).isdigit() else x[0].lower())
-
-        # Rearrange the table items based on the sorted order
-        for index, (val, k) in enumerate(items):
-            self.demands_tree.move(k, '', index)
-
-        # Update the sorting indicators
-        self.demands_tree.heading(col, text=col, command=lambda: self.sort_by_column(col, not reverse))
-
-        # Track the current sorted column and direction
-        self.current_sort_column = col
-        self.sort_direction = reverse
-
+        self.demands_table.sort_by(col, reverse)
 
     def open_selling_market(self):
         """Open a new window displaying user demand, allowing users to sell items."""
@@ -144,13 +93,13 @@ class SellingMarketManager:
         # Ensure the buttons are centered by configuring the grid
         self.selling_window.grid_columnconfigure(0, weight=1)
         self.if_set_up = True
+        self.refresh_table()
 
 
     def sell_selected_item(self):
         """Handle selling the currently selected item from the demands table."""
-        selected_item = self.demands_tree.focus()
-        if selected_item:
-            item_values = self.demands_tree.item(selected_item, 'values')
+        item_values = self.demands_table.get_selected_values()
+        if item_values:
             demand_id = item_values[0]
             asked_name = item_values[1]
             max_amount = int(item_values[3])
@@ -168,56 +117,91 @@ class SellingMarketManager:
         if self.refresh_task:
             self.selling_window.after_cancel(self.refresh_task)
         self.selling_window_open = False
+        self.demands_table = None
         self.demands_tree = None
         self.selling_window.destroy()
         
     def refresh_table(self):
         """Populate the table with all demands or filtered demands based on the search term and maintain sorting."""
         if self.demands_control_manager and self.demands_tree and self.if_set_up:
-            # Get the search term from the search box
-            search_term = self.demands_control_manager.search_var.get().lower().strip() if self.demands_control_manager.search_var else ""
+            search_term = self.get_search_term()
             
-            # Save the currently selected item's demand_id (if any)
-            selected = self.demands_tree.focus()
-            selected_demand_id = None
-            if selected:
-                selected_demand_id = self.demands_tree.item(selected, 'values')[0]  # Get the demand_id of the selected item
-
-            # Clear the demands table
-            self.demands_tree.delete(*self.demands_tree.get_children())
-
             # Decide whether to filter demands or show all
             if search_term:
                 filtered_demands = self.demands_control_manager.get_filtered_demands(search_term)
             else:
                 filtered_demands = self.demands_control_manager.global_data_manager.demands_list
 
-            # Populate the table with filtered demands or all demands
-            for demand in filtered_demands:
-                item_name = self.demands_control_manager.find_item_name(demand["item_id"])
-                item_name = item_name if item_name else "Unknown Item"  # Fallback to "Unknown Item" if item name is missing
-
-                # Insert the demand into the table
-                iid = self.demands_tree.insert("", tk.END, values=(
-                    demand["demand_id"],
-                    item_name,
-                    demand["buy_price"],
-                    demand["max_amount"],
-                    int(demand["not_available_timer"])
-                ))
-
-                # Restore the selection if the previously selected item matches
-                if selected_demand_id and str(demand["demand_id"]) == str(selected_demand_id):
-                    self.demands_tree.selection_set(iid)
-                    self.demands_tree.focus(iid)
-
-            # Reapply the last used sorting after populating the table
-            if self.current_sort_column:
-                self.sort_by_column(self.current_sort_column, self.sort_direction)
-
-
+            # Build the table model, the table keeps the selection and the last used sorting
+            rows = {demand["demand_id"]: self.get_demand_row(demand) for demand in filtered_demands}
+            self.changed_demand_ids.clear()
+            self.reset_pending = False
+            rows_touched = self.demands_table.set_rows(rows)
+            INSTRUMENTATION.add_rows("view.demands_refresh", rows_touched)
+
+    def get_search_term(self):
+        """Return the search term from the search box, lowercased."""
+        search_var = self.demands_control_manager.search_var
+        return search_var.get().lower().strip() if search_var else ""
+
+    def get_demand_row(self, demand):
+        item_name = self.demands_control_manager.find_item_name(demand["item_id"])
+        item_name = item_name if item_name else "Unknown Item"  # Fallback to "Unknown Item" if item name is missing
+        return (
+            demand["demand_id"],
+            item_name,
+            demand["buy_price"],
+            demand["max_amount"],
+            int(demand["not_available_timer"])
+        )
+
+    def on_demand_changed(self, demand_id, demand):
+        """Remember a demand that was added, updated or removed, to redraw only its row while the window is open."""
+        if self.demands_tree and self.if_set_up:
+            self.changed_demand_ids.add(demand_id)
+            self.schedule_apply_changes()
+
+    def on_demands_reset(self, key, record):
+        if self.demands_tree and self.if_set_up:
+            self.reset_pending = True
+            self.schedule_apply_changes()
+
+    def schedule_apply_changes(self):
+        if self.apply_task is None:
+            self.apply_task = self.root.after_idle(self.apply_changes)
+
+    def apply_changes(self):
+        """Apply the demand changes since the last call to the table, touching only their rows."""
+        self.apply_task = None
+        if not (self.demands_tree and self.if_set_up):
+            return
+        if self.reset_pending:
+            self.refresh_table()
+            return
+        changed, self.changed_demand_ids = self.changed_demand_ids, set()
+        search_term = self.get_search_term()
+        rows = {}
+        for demand_id in changed:
+            demand = self.global_data_manager.get_demand(demand_id)
+            if demand:
+                row = self.get_demand_row(demand)
+                if search_term in row[1].lower():
+                    rows[demand_id] = row
+        removed = [demand_id for demand_id in changed if demand_id not in rows]
+        rows_touched = self.demands_table.update_rows(rows, removed)
+        INSTRUMENTATION.add_rows("view.demands_refresh", rows_touched)
+
+    def refresh_countdowns(self):
+        """Update the timers of the demands on screen."""
+        if self.demands_tree and self.if_set_up:
+            rows = {}
+            for demand_id in self.demands_table.visible_keys():
+                demand = self.global_data_manager.get_demand(demand_id)
+                if demand:
+                    rows[demand_id] = self.get_demand_row(demand)
+            rows_touched = self.demands_table.update_rows(rows, keep_order=True)
+            INSTRUMENTATION.add_rows("view.demands_refresh", rows_touched)
 
-    
     def show_sell_confirmation_popup(self, user_item, item_values, max_amount):
         """Display a popup window asking how much to sell and handle the confirmation."""
         
@@ -242,14 +226,7 @@ class SellingMarketManager:
         def update_total_price_label(sell_amount):
             """Update the total price display in gold, silver, and copper."""
             total_copper_earned = sell_amount * int(item_values[2])
-            total_gold = total_copper_earned // 10000
-            remaining_copper = total_copper_earned % 10000
-            total_silver = remaining_copper // 100
-            total_copper = remaining_copper % 100
-
-            total_price_label.config(
-                text=f"Total Price: {total_gold} gold, {total_silver} silver, {total_copper} copper"
-            )
+            total_price_label.config(text=f"Total Price: {Wallet.format(total_copper_earned)}")
 
         def confirm_sale():
             """Confirm the sale and process it."""
@@ -260,42 +237,19 @@ class SellingMarketManager:
                 elif sell_amount > max_amount:
                     messagebox.showerror("Error", f"Demand only allows a maximum of {max_amount} units.")
                 else:
-                    total_copper_earned = sell_amount * int(item_values[2])
-                    self.backpack_manager.receive_currency(total_copper_earned)
-                    
-                    try:
-                        self.backpack_manager.refresh_backpack_inventory()
-                    except tkinter.TclError as e:
-                        # Handle the specific TclError when trying to access destroyed widgets
-                        print("Backpack not open, skip refresh.")
-                        
-                    self.backpack_manager.auto_convert_money()
-
-                    # Update the demand
-                    demand = next((d for d in self.global_data_manager.demands_list if int(d['demand_id']) == int(item_values[0])), None)
-                    if demand:
-                        demand['max_amount'] -= sell_amount
-
-                    # If the demand is fully met, remove it
-                    if demand and demand['max_amount'] <= 0:
-                        self.global_data_manager.demands_list.remove(demand)
-                        self.global_data_manager.removed_demands_ids.append(demand['demand_id'])
-
-                    # Remove the user item if the quantity is 0
-                    user_item['amount'] -= sell_amount
-                    if user_item['amount'] <= 0:
-                        self.global_data_manager.user_items.remove(user_item)
-                    self.backpack_manager.refresh_backpack_inventory()
+                    # The shown price is a limit, in case the demand's price changed since the popup opened
+                    summary = trades.execute_trades(self.global_data_manager, [{
+                        "type": trades.DEMAND_SELL, "demand_id": int(item_values[0]), "amount": sell_amount,
+                        "price": int(item_values[2]),
+                    }], self.engine)
+                    if not summary["ok"]:
+                        messagebox.showerror("Error", summary["errors"][0][1])
+                        return
 
                     # Inform the user about the sale
-                    total_gold = total_copper_earned // 10000
-                    remaining_copper = total_copper_earned % 10000
-                    total_silver = remaining_copper // 100
-                    total_copper = remaining_copper % 100
-
                     messagebox.showinfo(
                         "Sell Successful",
-                        f"You sold {sell_amount}x {user_item['name']} for {total_gold} gold, {total_silver} silver, {total_copper} copper!"
+                        f"You sold {sell_amount}x {user_item['name']} for {Wallet.format(summary['earned'])}!"
                     )
                     
                     # Close the popup window after the sale is successful
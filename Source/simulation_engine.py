@@ -0,0 +1,459 @@
+import math
+import time
+
+from event_log import EVENT_LOG
+from instrumentation import INSTRUMENTATION
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, generate_demands_batch falls back to generate_demand
+    numpy = None
+
+
+SEED_EPOCH = 0.0  # Simulated start time of seeded runs without a saved clock
+
+
+class SimulationEngine:
+    """GUI-free simulation core that advances the market and the demands in simulated time.
+
+    The engine owns the GlobalDataManager state. Views subscribe to a topic
+    ("market" or "demands") and get called after a step changed that part of the state.
+    """
+
+    def __init__(self, global_data_manager, start_time=None, instrumentation=None):
+        self.global_data_manager = global_data_manager
+        self.event_log = global_data_manager.event_log  # The game events of this market
+        self.instrumentation = INSTRUMENTATION if instrumentation is None else instrumentation  # Timings of the steps
+        # The simulated clock, in seconds, is kept and saved by the data manager with the listings stamped by it
+        if start_time is not None:
+            global_data_manager.current_time = start_time
+        elif global_data_manager.current_time is None:
+            global_data_manager.current_time = time.time()  # A new game, load_all_data restores a saved clock
+        self.tick_length = 1 / 24  # Default dt used by run()
+        self.listeners = {}  # Topic -> list of callbacks
+
+        # Independent random streams, so listings and demands are reproducible from the saved seed
+        self.market_random = global_data_manager.rng.stream("market")
+        self.demand_random = global_data_manager.rng.stream("demands")
+
+        # Market settings
+        self.refresh_rate = 1  # Seconds between two market table refreshes
+        self.MAX_ITEMS = 100
+        self.PRICE_ADJUST_MIN = 0.85
+        self.PRICE_ADJUST_MAX = 1.85
+        self.TIME_ADJUST_MIN = 0
+        self.TIME_ADJUST_MAX = 1
+        self.TIMER_ADJUST_MIN = 0.5
+        self.TIMER_ADJUST_MAX = 1.5
+        self.AMOUNT_ADJUST_MIN = 0.15
+        self.AMOUNT_ADJUST_MAX = 2.5
+        self.GENERATE_DELAY_MIN = 0.5
+        self.GENERATE_DELAY_MAX = 2.5
+
+        # Demand settings
+        self.adjust_demands_with_market = False
+        self.demand_refresh_rate = 0.5  # Seconds between two demand timer updates
+        self.demands_generation_interval_min = 500  # Milliseconds
+        self.demands_generation_interval_max = 1000  # Milliseconds
+        self.max_demand_amount = 20  # Maximum demand amount per item
+        self.amount_divisor = 50  # Divisor for calculating demand amount
+        self.not_available_timer_min = 30  # Minimum time for not available timer
+        self.not_available_timer_max = 120  # Maximum time for not available timer
+        self.demand_timer_divisor = 100  # Divisor for adjusting the timer based on demand amount
+        self.default_price_multiplier = 1.8  # Default price multiplier when no matching items in market
+        self.market_divisor = 100  # Divisor for adjusting price based on market supply
+        self.min_price_multiplier = 0.3  # Minimum price multiplier
+        self.max_demands = 50  # Maximum number of demands allowed
+
+        # Time accumulated towards the next periodic update, and countdowns until the next generation
+        self.market_timer_elapsed = 0.0
+        self.demand_timer_elapsed = 0.0
+        self.next_item_generation = 0.0
+        self.next_demand_generation = 0.0
+
+    @property
+    def current_time(self):
+        return self.global_data_manager.current_time
+
+    @current_time.setter
+    def current_time(self, value):
+        self.global_data_manager.current_time = value
+
+    def subscribe(self, topic, callback):
+        """Call `callback` whenever a step changes the state behind `topic`."""
+        self.listeners.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic, callback):
+        """Remove a callback registered with subscribe."""
+        if callback in self.listeners.get(topic, []):
+            self.listeners[topic].remove(callback)
+
+    def notify(self, topic):
+        """Call every listener of the topic."""
+        for callback in list(self.listeners.get(topic, [])):
+            callback()
+
+    def step(self, dt):
+        """Advance the simulation by dt simulated seconds."""
+        self.current_time += dt
+        changed = set()
+
+        # Market listing expiry, and a market refresh every refresh_rate seconds for the countdowns
+        started = time.perf_counter()
+        expired = self.expire_market_items()
+        self.instrumentation.record("engine.market_expiry", time.perf_counter() - started, rows=len(expired))
+        if expired:
+            changed.add("market")
+        self.market_timer_elapsed += dt
+        if self.market_timer_elapsed >= self.refresh_rate:
+            self.market_timer_elapsed %= self.refresh_rate
+            changed.add("market")
+
+        # Market item generation
+        self.next_item_generation -= dt
+        while self.next_item_generation <= 0:
+            started = time.perf_counter()
+            generated = self.generate_market_item()
+            self.instrumentation.record("engine.item_generation", time.perf_counter() - started, rows=1 if generated else 0)
+            if generated:
+                changed.add("market")
+            self.next_item_generation += self.market_random.uniform(self.GENERATE_DELAY_MIN, self.GENERATE_DELAY_MAX)
+
+        # Demand timers
+        self.demand_timer_elapsed += dt
+        while self.demand_timer_elapsed >= self.demand_refresh_rate:
+            self.demand_timer_elapsed -= self.demand_refresh_rate
+            started = time.perf_counter()
+            self.update_demand_timers(self.demand_refresh_rate)
+            self.instrumentation.record("engine.demand_timers", time.perf_counter() - started,
+                                   rows=len(self.global_data_manager.demands_list))
+            changed.add("demands")
+
+        # Demand generation
+        self.next_demand_generation -= dt
+        while self.next_demand_generation <= 0:
+            started = time.perf_counter()
+            generated = self.generate_demand()
+            self.instrumentation.record("engine.demand_generation", time.perf_counter() - started, rows=1 if generated else 0)
+            if generated:
+                changed.add("demands")
+            self.next_demand_generation += self.demand_random.randint(int(self.demands_generation_interval_min), int(self.demands_generation_interval_max)) / 1000
+
+        # Persist the changes of this tick in one batch
+        self.global_data_manager.commit()
+
+        for topic in ("market", "demands"):
+            if topic in changed:
+                started = time.perf_counter()
+                self.notify(topic)
+                self.instrumentation.record(f"view.{topic}_refresh", time.perf_counter() - started)
+
+    def run(self, ticks, dt=None):
+        """Run the given number of ticks of dt seconds (tick_length by default) as fast as possible."""
+        dt = self.tick_length if dt is None else dt
+        for _ in range(ticks):
+            self.step(dt)
+
+    def generate_market_item(self):
+        """Generate a new market listing from a weighted random base item. Return it, or None if the market is full."""
+        if len(self.global_data_manager.in_market_items) >= self.MAX_ITEMS:
+            return None
+        if not self.global_data_manager.items_list:
+            print("No items available to generate.")
+            return None
+
+        base_item = self.market_random.choices(self.global_data_manager.items_list, weights=self.global_data_manager.catalog_weights, k=1)[0]
+
+        # Adjust the price within the specified range
+        price_adjustment_factor = self.market_random.uniform(self.PRICE_ADJUST_MIN, self.PRICE_ADJUST_MAX)
+        adjusted_price = int(base_item["price"] * price_adjustment_factor)
+
+        # The listing shows up after a short delay, then stays available for not_available_timer seconds
+        available_time_at = self.current_time + self.market_random.uniform(self.TIME_ADJUST_MIN, self.TIME_ADJUST_MAX)
+        not_available_timer = int(base_item["not_available_timer"] * self.market_random.uniform(self.TIMER_ADJUST_MIN, self.TIMER_ADJUST_MAX))
+        adjusted_amount = int(base_item["amount"] * self.market_random.uniform(self.AMOUNT_ADJUST_MIN, self.AMOUNT_ADJUST_MAX))
+
+        # Reuse removed item ID if available, otherwise find the next unique ID
+        if self.global_data_manager.removed_item_ids:
+            item_id = self.global_data_manager.removed_item_ids.pop(0)
+        else:
+            item_id = self.global_data_manager.next_market_item_id
+
+        new_item = {
+            "item_id": item_id,
+            "name": base_item["name"],
+            "price": adjusted_price,
+            "amount": adjusted_amount,
+            "available_time_at": available_time_at,
+            "expires_at": available_time_at + not_available_timer,
+            "data_id": base_item["data_id"]
+        }
+
+        self.event_log.record_listing_add(new_item)  # Before the fills it may get from the order books
+        self.global_data_manager.add_market_item(new_item)
+        self.global_data_manager.price_history.record("listing", new_item["data_id"], self.current_time,
+                                                      adjusted_price, adjusted_amount)
+        return new_item
+
+    def expire_market_items(self):
+        """Remove the listings that expired by the current time. Return the removed listings."""
+        expired = self.global_data_manager.pop_expired_market_items(self.current_time)
+        for item in expired:
+            self.event_log.record("listing_expire", item_id=item["item_id"])
+        return expired
+
+    def generate_demand(self, limit=None):
+        """Generate a new demand based on available items, considering their weights. Return it, or None.
+
+        No demand is generated once the board holds limit demands, max_demands by default.
+        """
+        if len(self.global_data_manager.demands_list) >= (self.max_demands if limit is None else limit):
+            return None
+
+        # Check if there are items to generate demands from
+        if not self.global_data_manager.items_list:
+            return None
+
+        # Select a base item from the items list based on their weights
+        base_item = self.demand_random.choices(
+            self.global_data_manager.items_list,
+            weights=self.global_data_manager.catalog_weights,
+            k=1
+        )[0]
+
+        # Adjust demand price based on the availability of similar items in the market
+        adjusted_price = self.adjust_demand_price(base_item)
+
+        # Generate random demand amount, not to exceed the base item's stock
+        demand_amount = self.demand_random.randint(1, min(self.max_demand_amount, base_item['amount'])) + \
+                        int(math.floor((base_item['amount'] / self.amount_divisor) ** 2))
+
+        # Calculate the price influence on the timer
+        price_influence_factor = max(0.3, adjusted_price / base_item['price'])  # Higher prices increase the timer
+
+        # Set the random not available timer, scaled by the price influence
+        demand_not_available_timer = (self.demand_random.uniform(self.not_available_timer_min, self.not_available_timer_max) +
+                                      int(demand_amount / self.demand_timer_divisor)) * price_influence_factor
+
+        # One more time adjustment, based on the demand's price, decrease the max value, minimum to 1.
+        def adjust_max_demand_based_on_price(adjusted_price, base_price, max_demand_amount):
+            """Adjust the maximum demand amount based on the demand's generated price."""
+            price_scale_factor = max(0.1, 1.0 - ((adjusted_price / base_price) - 1.0))  # Scales down as price increases
+            return max(1, int(max_demand_amount * price_scale_factor))  # Ensure minimum is 1
+
+        # Adjust max demand amount based on the adjusted demand price
+        max_demand_scaled = adjust_max_demand_based_on_price(adjusted_price, base_item['price'], self.max_demand_amount)
+
+        # Generate the final demand amount with the adjusted max value
+        demand_amount = self.demand_random.randint(1, min(max_demand_scaled, base_item['amount'])) + \
+                        int(math.floor((base_item['amount'] / self.amount_divisor) ** 2))
+
+        # Reuse a removed demand ID if available, otherwise generate a new one
+        if self.global_data_manager.removed_demands_ids:
+            demand_id = self.global_data_manager.removed_demands_ids.pop(0)
+        else:
+            demand_id = self.global_data_manager.next_demand_id
+
+        new_demand = {
+            "demand_id": int(demand_id),
+            "item_id": base_item["item_id"],
+            "buy_price": int(adjusted_price),
+            "max_amount": int(demand_amount),
+            "not_available_timer": demand_not_available_timer
+        }
+
+        self.event_log.record_demand_add(new_demand)  # Before the fills it may get from the order books
+        self.global_data_manager.add_demand(new_demand)
+        self.global_data_manager.price_history.record("demand", base_item["data_id"], self.current_time,
+                                                      new_demand["buy_price"], new_demand["max_amount"])
+        return new_demand
+
+    def generate_demands_batch(self, n, limit=None):
+        """Generate up to n demands at once with the formulas of generate_demand. Return the new demands.
+
+        The board is filled up to limit demands, max_demands by default; refilling a large
+        board passes its own capacity. With NumPy every random draw is made for the whole
+        batch as an array, otherwise this falls back to calling generate_demand n times.
+        """
+        limit = self.max_demands if limit is None else limit
+        n = min(n, limit - len(self.global_data_manager.demands_list))
+        items_list = self.global_data_manager.items_list
+        if n <= 0 or not items_list:
+            return []
+
+        if numpy is None:
+            new_demands = []
+            for _ in range(n):
+                new_demands.append(self.generate_demand(limit))
+            return new_demands
+
+        # Seeded from the demand stream so both stay reproducible together
+        rng = numpy.random.default_rng(self.demand_random.getrandbits(64))
+
+        # Per catalog entry: base price, base amount and the market supply read from the price index
+        price_index = self.global_data_manager.market_price_index
+        base_prices = numpy.array([item['price'] for item in items_list], dtype=float)
+        base_amounts = numpy.array([item['amount'] for item in items_list], dtype=numpy.int64)
+        counts = numpy.array([price_index.get_count(item['data_id']) for item in items_list], dtype=float)
+        averages = numpy.array([price_index.get_average_price(item['data_id']) or item['price'] for item in items_list], dtype=float)
+
+        # Select the base items based on their weights
+        weights = numpy.array(self.global_data_manager.catalog_weights, dtype=float)
+        chosen = rng.choice(len(items_list), size=n, p=weights / weights.sum())
+        base_price = base_prices[chosen]
+        base_amount = base_amounts[chosen]
+        count = counts[chosen]
+
+        # Adjust demand prices, as in adjust_demand_price
+        supply_influence = numpy.where(count > 0,
+                                       (1.0 - (0.5 * (count / self.market_divisor))) * rng.uniform(0.8, 1.2, n),
+                                       self.default_price_multiplier)
+        price_increase_factor = numpy.maximum(1.0, (averages[chosen] / base_price) ** (1.5 * rng.uniform(1.0, 1.3, n)))
+        final_price_multiplier = (0.7 * price_increase_factor) + (0.3 * supply_influence)
+        final_price = base_price * final_price_multiplier * rng.uniform(0.90, 1.10, n)
+        adjusted_price = numpy.maximum(final_price, base_price * self.min_price_multiplier).astype(numpy.int64)
+
+        # First demand amount, which only scales the timer
+        amount_bonus = numpy.floor((base_amount / self.amount_divisor) ** 2).astype(numpy.int64)
+        demand_amount = rng.integers(1, numpy.minimum(self.max_demand_amount, base_amount) + 1) + amount_bonus
+
+        # Timer scaled by the price influence
+        price_influence_factor = numpy.maximum(0.3, adjusted_price / base_price)
+        timers = (rng.uniform(self.not_available_timer_min, self.not_available_timer_max, n) +
+                  (demand_amount // self.demand_timer_divisor)) * price_influence_factor
+
+        # Final demand amount, with the maximum scaled down as the price goes up
+        price_scale_factor = numpy.maximum(0.1, 1.0 - ((adjusted_price / base_price) - 1.0))
+        max_demand_scaled = numpy.maximum(1, (self.max_demand_amount * price_scale_factor).astype(numpy.int64))
+        demand_amount = rng.integers(1, numpy.minimum(max_demand_scaled, base_amount) + 1) + amount_bonus
+
+        # Reuse removed demand IDs first, then continue after the highest ID
+        removed_ids = self.global_data_manager.removed_demands_ids
+        reused = min(n, len(removed_ids))
+        demand_ids = removed_ids[:reused]
+        del removed_ids[:reused]
+        next_demand_id = self.global_data_manager.next_demand_id
+        demand_ids.extend(range(next_demand_id, next_demand_id + n - reused))
+
+        item_ids = [items_list[index]["item_id"] for index in chosen.tolist()]
+        new_demands = [
+            {
+                "demand_id": int(demand_id),
+                "item_id": item_id,
+                "buy_price": buy_price,
+                "max_amount": max_amount,
+                "not_available_timer": timer
+            }
+            for demand_id, item_id, buy_price, max_amount, timer
+            in zip(demand_ids, item_ids, adjusted_price.tolist(), demand_amount.tolist(), timers.tolist())
+        ]
+        price_history = self.global_data_manager.price_history
+        for index, demand in zip(chosen.tolist(), new_demands):
+            price_history.record("demand", items_list[index]["data_id"], self.current_time,
+                                 demand["buy_price"], demand["max_amount"])
+            self.event_log.record_demand_add(demand)  # Before the fills they may get from the order books
+        self.global_data_manager.add_demands(new_demands)
+        return new_demands
+
+    def adjust_demand_price(self, base_item):
+        """Adjust demand price based on supply in the market and average market prices with added randomness."""
+        # Read the supply and the average price of matching items from the market price index
+        price_index = self.global_data_manager.market_price_index
+        count = price_index.get_count(base_item['data_id'])
+        average_market_price = price_index.get_average_price(base_item['data_id'])
+        if average_market_price is None:
+            average_market_price = base_item['price']  # Fallback to base item price if no matching items
+
+        # Randomly adjust the supply influence to add more variability
+        supply_influence_randomness = self.demand_random.uniform(0.8, 1.2)  # Adding randomness to supply influence
+        supply_influence = (1.0 - (0.5 * (count / self.market_divisor))) * supply_influence_randomness if count > 0 else self.default_price_multiplier
+
+        # Stronger influence of the average market price with random variability
+        price_increase_randomness = self.demand_random.uniform(1.0, 1.3)  # Adding randomness to price increase factor
+        price_increase_factor = max(1.0, (average_market_price / base_item['price']) ** (1.5 * price_increase_randomness))
+
+        # Random fluctuation to simulate market volatility
+        random_fluctuation = self.demand_random.uniform(0.90, 1.10)  # Adjusted fluctuation range for more volatility
+
+        # Combine the influences with more variability
+        final_price_multiplier = (0.7 * price_increase_factor) + (0.3 * supply_influence)
+
+        # Apply the random fluctuation to the final price
+        final_price = base_item['price'] * final_price_multiplier * random_fluctuation
+
+        # Ensure the price stays above the minimum multiplier
+        return int(max(final_price, base_item['price'] * self.min_price_multiplier))
+
+    def all_demands_change(self):
+        """Refresh all demand prices based on the current market."""
+        # Create a dictionary to store adjusted prices by item ID
+        item_price_map = {}
+
+        for demand in self.global_data_manager.demands_list:
+            item_id = demand['item_id']
+
+            # If the item's price hasn't been adjusted yet, adjust it
+            if item_id not in item_price_map:
+                base_item = self.global_data_manager.get_catalog_item(item_id)
+                if base_item:
+                    item_price_map[item_id] = self.adjust_demand_price(base_item)
+                    self.global_data_manager.price_history.record("demand", base_item["data_id"], self.current_time,
+                                                                  item_price_map[item_id])
+
+            # Update the demand's buy_price with the adjusted price
+            if item_id in item_price_map and demand['buy_price'] != item_price_map[item_id]:
+                self.global_data_manager.update_demand(demand, buy_price=item_price_map[item_id])
+                self.event_log.record("demand_price", demand_id=demand["demand_id"], buy_price=demand["buy_price"])
+
+    def update_demand_timers(self, elapsed):
+        """Decrease the timer of every demand and remove the expired ones."""
+        if self.adjust_demands_with_market:
+            self.all_demands_change()
+
+        to_remove = []  # List to store demands that should be removed
+        for demand in self.global_data_manager.demands_list:
+            if demand["not_available_timer"] > 0:
+                demand["not_available_timer"] -= elapsed
+
+            if demand["not_available_timer"] <= 0:
+                to_remove.append(demand)  # Add expired demands to the removal list
+
+        # Remove expired demands, which adds their IDs to the removed list
+        for demand in to_remove:
+            self.global_data_manager.remove_demand(demand)
+            self.event_log.record("demand_expire", demand_id=demand["demand_id"])
+
+
+if __name__ == "__main__":
+    # Headless run: python simulation_engine.py [ticks] [--stats] [--seed=N] [--record=events file] [--order-book]
+    # A seeded run starts from the saved clock, or from SEED_EPOCH, and does not save, so it can be repeated exactly
+    import json
+    import sys
+    import global_data
+
+    data = global_data.GlobalDataManager()
+    if "--order-book" in sys.argv:
+        from order_book import Exchange
+        data.attach_exchange(Exchange())
+    data.load_all_data()
+    for arg in sys.argv[1:]:
+        if arg.startswith("--seed="):
+            data.rng.reseed(int(arg.split("=", 1)[1]))  # Restart every random stream from this seed
+            if data.current_time is None:
+                data.current_time = SEED_EPOCH
+            data.replaying_journal = True  # Keep the saved game as it was loaded
+    engine = SimulationEngine(data)
+    for arg in sys.argv[1:]:
+        if arg.startswith("--record="):
+            EVENT_LOG.open(arg.split("=", 1)[1], clock=lambda: engine.current_time)
+            EVENT_LOG.record_state(data)
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 10000
+
+    started = time.perf_counter()
+    engine.run(ticks)
+    elapsed = time.perf_counter() - started
+    print(f"{ticks} ticks in {elapsed:.3f}s ({ticks / elapsed:.0f} ticks/s), "
+          f"{len(data.in_market_items)} listings, {len(data.demands_list)} demands")
+    EVENT_LOG.close()
+    if "--stats" in sys.argv:
+        print(json.dumps(INSTRUMENTATION.dump(), indent=4))
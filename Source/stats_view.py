@@ -0,0 +1,54 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from scheduler import SCHEDULER
+
+
+def open_stats_window(root, instrumentation, dump_file):
+    stats_window = tk.Toplevel(root)
+    stats_window.title("Performance Stats")
+
+    # One row per periodic callback or trade path
+    columns = ("Name", "Calls", "Mean ms", "P99 ms", "Max ms", "Lag mean ms", "Lag max ms", "Missed", "Rows")
+    stats_tree = ttk.Treeview(stats_window, columns=columns, show="headings")
+    for col in columns:
+        stats_tree.heading(col, text=col)
+        stats_tree.column(col, width=90 if col != "Name" else 200, anchor=tk.W if col == "Name" else tk.E)
+    stats_tree.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+
+    def refresh_stats():
+        """Redraw the table from the instrumentation registry, once per second while the window is open."""
+        if not stats_window.winfo_exists():
+            SCHEDULER.remove(refresh_task)
+            return
+        stats_tree.delete(*stats_tree.get_children())
+        for name, stats in sorted(instrumentation.stats.items()):
+            stats_tree.insert("", tk.END, values=(
+                name,
+                stats.calls,
+                f"{stats.wall_time.mean_ms():.3f}",
+                f"{stats.wall_time.percentile_ms(0.99):.3f}",
+                f"{stats.wall_time.max_ms:.3f}",
+                f"{stats.scheduling_lag.mean_ms():.1f}" if stats.scheduling_lag.count else "-",
+                f"{stats.scheduling_lag.max_ms:.1f}" if stats.scheduling_lag.count else "-",
+                stats.missed_deadlines,
+                stats.rows_touched
+            ))
+
+    def dump_stats():
+        """Write the machine-readable statistics next to the save files."""
+        instrumentation.save_json(dump_file)
+        messagebox.showinfo("Performance Stats", f"Statistics written to {dump_file}")
+
+    dump_button = tk.Button(stats_window, text="Dump JSON", command=dump_stats)
+    dump_button.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+    reset_button = tk.Button(stats_window, text="Reset", command=instrumentation.reset)  # The table catches up on its next refresh
+    reset_button.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+
+    # Allow the table to resize with the window
+    stats_window.grid_columnconfigure(0, weight=1)
+    stats_window.grid_columnconfigure(1, weight=1)
+    stats_window.grid_rowconfigure(0, weight=1)
+
+    refresh_stats()
+    refresh_task = SCHEDULER.add("loop.stats_refresh", refresh_stats, 1, priority=30)
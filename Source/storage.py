@@ -0,0 +1,170 @@
+import json
+import sqlite3
+
+
+class SqliteStorage:
+    """Storage backend that keeps the game state in indexed SQLite tables.
+
+    GlobalDataManager hands it every journal event through record(), which applies the
+    change to the matching rows. The changes of a tick are committed together by commit().
+    """
+
+    # Columns of each table, in the order of the dictionary keys they store
+    LISTING_COLUMNS = ("item_id", "name", "price", "amount", "available_time_at", "expires_at", "data_id")
+    USER_ITEM_COLUMNS = ("item_id", "name", "amount", "data_id")
+    DEMAND_COLUMNS = ("demand_id", "item_id", "buy_price", "max_amount", "not_available_timer")
+    CATALOG_ITEM_COLUMNS = ("item_id", "name", "price", "amount", "not_available_timer", "data_id", "weight")
+    CATALOG_DATA_COLUMNS = ("id", "name", "description", "default_price", "type", "stack_number")
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+
+    def create_tables(self):
+        # Id columns have no declared type, so SQLite keeps the int or str type they were saved with
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                item_id PRIMARY KEY, name TEXT, price INTEGER, amount INTEGER,
+                available_time_at REAL, expires_at REAL, data_id);
+            CREATE INDEX IF NOT EXISTS listings_by_data_id ON listings (data_id, price);
+            CREATE INDEX IF NOT EXISTS listings_by_name ON listings (name, price);
+            CREATE INDEX IF NOT EXISTS listings_by_expiry ON listings (expires_at);
+
+            CREATE TABLE IF NOT EXISTS user_items (
+                position INTEGER PRIMARY KEY AUTOINCREMENT, item_id, name TEXT, amount INTEGER, data_id);
+            CREATE INDEX IF NOT EXISTS user_items_by_id ON user_items (item_id);
+
+            CREATE TABLE IF NOT EXISTS demands (
+                demand_id INTEGER PRIMARY KEY, item_id, buy_price INTEGER, max_amount INTEGER,
+                not_available_timer REAL);
+            CREATE INDEX IF NOT EXISTS demands_by_item_id ON demands (item_id);
+
+            CREATE TABLE IF NOT EXISTS wallet (
+                id INTEGER PRIMARY KEY CHECK (id = 1), gold INTEGER, silver INTEGER, copper INTEGER);
+
+            CREATE TABLE IF NOT EXISTS rng_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1), state TEXT);
+
+            CREATE TABLE IF NOT EXISTS catalog_items (
+                item_id PRIMARY KEY, name TEXT, price INTEGER, amount INTEGER,
+                not_available_timer REAL, data_id, weight REAL);
+            CREATE INDEX IF NOT EXISTS catalog_items_by_name ON catalog_items (name);
+
+            CREATE TABLE IF NOT EXISTS catalog_data (
+                id PRIMARY KEY, name TEXT, description TEXT, default_price INTEGER, type TEXT,
+                stack_number INTEGER);
+        """)
+        self.connection.commit()
+
+    def load(self):
+        """Return the saved state, or None if the database is still empty."""
+        wallet = self.connection.execute("SELECT gold, silver, copper FROM wallet WHERE id = 1").fetchone()
+        if wallet is None:
+            return None
+        rng_state = self.connection.execute("SELECT state FROM rng_state WHERE id = 1").fetchone()
+        return {
+            "user_items": self.select_rows("user_items", self.USER_ITEM_COLUMNS, "position"),
+            "in_market_items": self.select_rows("listings", self.LISTING_COLUMNS, "rowid"),
+            "demands_list": self.select_rows("demands", self.DEMAND_COLUMNS, "rowid"),
+            "wallet": {"Gold": wallet[0], "Silver": wallet[1], "Copper": wallet[2]},
+            "rng": json.loads(rng_state[0]) if rng_state else {},
+        }
+
+    def select_rows(self, table, columns, order_by):
+        rows = self.connection.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order_by}")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def insert_row(self, table, columns, row):
+        placeholders = ", ".join("?" for _ in columns)
+        self.connection.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                                [row.get(column) for column in columns])
+
+    def update_row(self, table, columns, key_column, key, changes):
+        changes = {column: value for column, value in changes.items() if column in columns}
+        if changes:
+            assignments = ", ".join(f"{column} = ?" for column in changes)
+            self.connection.execute(f"UPDATE {table} SET {assignments} WHERE {key_column} = ?",
+                                    list(changes.values()) + [key])
+
+    def record(self, event):
+        """Apply one GlobalDataManager journal event to the tables."""
+        op = event["op"]
+        if op == "market_add":
+            self.insert_row("listings", self.LISTING_COLUMNS, event["item"])
+        elif op == "market_remove":
+            self.connection.execute("DELETE FROM listings WHERE item_id = ?", (event["item_id"],))
+        elif op == "market_update":
+            self.update_row("listings", self.LISTING_COLUMNS, "item_id", event["item_id"], event["changes"])
+        elif op == "market_clear":
+            self.connection.execute("DELETE FROM listings")
+        elif op == "user_add":
+            self.insert_row("user_items", self.USER_ITEM_COLUMNS, event["item"])
+        elif op == "user_remove":
+            # Like find_user_item_by_id, only the first entry with this item_id is affected
+            self.connection.execute("DELETE FROM user_items WHERE position = (SELECT MIN(position) FROM user_items WHERE item_id = ?)",
+                                    (event["item_id"],))
+        elif op == "user_update":
+            changes = {column: value for column, value in event["changes"].items() if column in self.USER_ITEM_COLUMNS}
+            if changes:
+                assignments = ", ".join(f"{column} = ?" for column in changes)
+                self.connection.execute(f"UPDATE user_items SET {assignments} WHERE position = (SELECT MIN(position) FROM user_items WHERE item_id = ?)",
+                                        list(changes.values()) + [event["item_id"]])
+        elif op == "demand_add":
+            self.insert_row("demands", self.DEMAND_COLUMNS, event["demand"])
+        elif op == "demands_add":
+            for demand in event["demands"]:
+                self.insert_row("demands", self.DEMAND_COLUMNS, demand)
+        elif op == "demand_remove":
+            self.connection.execute("DELETE FROM demands WHERE demand_id = ?", (event["demand_id"],))
+        elif op == "demand_update":
+            self.update_row("demands", self.DEMAND_COLUMNS, "demand_id", event["demand_id"], event["changes"])
+        elif op == "demand_clear":
+            self.connection.execute("DELETE FROM demands")
+        elif op == "wallet":
+            self.connection.execute("INSERT OR REPLACE INTO wallet (id, gold, silver, copper) VALUES (1, ?, ?, ?)",
+                                    (event["gold"], event["silver"], event["copper"]))
+        elif op == "clock":
+            # The clock is saved in the random stream state, see GlobalDataManager.get_rng_state
+            self.connection.execute("UPDATE rng_state SET state = json_set(state, '$.clock', ?) WHERE id = 1",
+                                    (event["time"],))
+        else:
+            print(f"Unknown journal event: {op}")
+
+    def commit(self):
+        """Commit the changes recorded since the last commit in one transaction."""
+        if self.connection.in_transaction:
+            self.connection.commit()
+
+    def save_snapshot(self, state):
+        """Replace every table with the given state, in one transaction."""
+        with self.connection:
+            for table in ("listings", "user_items", "demands", "wallet", "rng_state", "catalog_items", "catalog_data"):
+                self.connection.execute(f"DELETE FROM {table}")
+            for item in state["in_market_items"]:
+                self.insert_row("listings", self.LISTING_COLUMNS, item)
+            for item in state["user_items"]:
+                self.insert_row("user_items", self.USER_ITEM_COLUMNS, item)
+            for demand in state["demands_list"]:
+                self.insert_row("demands", self.DEMAND_COLUMNS, demand)
+            for item in state["items_list"]:
+                self.insert_row("catalog_items", self.CATALOG_ITEM_COLUMNS, item)
+            for data in state["data_list"]:
+                self.insert_row("catalog_data", self.CATALOG_DATA_COLUMNS, data)
+            wallet = state["wallet"]
+            self.connection.execute("INSERT INTO wallet (id, gold, silver, copper) VALUES (1, ?, ?, ?)",
+                                    (wallet["Gold"], wallet["Silver"], wallet["Copper"]))
+            self.connection.execute("INSERT INTO rng_state (id, state) VALUES (1, ?)",
+                                    (json.dumps(state["rng"], separators=(',', ':')),))
+
+    def find_cheapest_listing(self, name):
+        """Return the cheapest saved listing with this item name, or None, without loading the market."""
+        row = self.connection.execute(f"SELECT {', '.join(self.LISTING_COLUMNS)} FROM listings WHERE name = ? ORDER BY price LIMIT 1",
+                                      (name,)).fetchone()
+        return dict(zip(self.LISTING_COLUMNS, row)) if row else None
+
+    def close(self):
+        self.commit()
+        self.connection.close()
@@ -0,0 +1,167 @@
+import time
+
+from instrumentation import INSTRUMENTATION
+
+# Trade types, the "type" of a trade dict
+LISTING_BUY = "listing_buy"  # Buy "amount" units of the market listing "item_id"
+DEMAND_SELL = "demand_sell"  # Sell "amount" units from the inventory to the demand "demand_id"
+FIXED_BUY = "fixed_buy"  # Buy "amount" units of the catalog item "name" at the fixed price market quote
+FIXED_SELL = "fixed_sell"  # Sell "amount" units of the catalog item "name" at the fixed price market quote
+
+
+def trade_price(global_data_manager, trade, quote_engine, listings_left, demands_left, current_time):
+    """Return (name, unit price) of a trade, or raise ValueError if it cannot be made."""
+    data = global_data_manager
+    trade_type = trade["type"]
+    if trade_type == LISTING_BUY:
+        item = data.get_market_item(trade["item_id"])
+        if item is None:
+            raise ValueError(f"Listing {trade['item_id']} is no longer in the market")
+        if current_time is not None and item["available_time_at"] > current_time:
+            raise ValueError(f"Listing {trade['item_id']} is not available yet")
+        left = listings_left.setdefault(trade["item_id"], item["amount"])
+        if trade["amount"] > left:
+            raise ValueError(f"Listing {trade['item_id']} only has {left} {item['name']} left")
+        return item["name"], item["price"]
+    if trade_type == DEMAND_SELL:
+        demand = data.get_demand(trade["demand_id"])
+        if demand is None:
+            raise ValueError(f"Demand {trade['demand_id']} is no longer on the board")
+        left = demands_left.setdefault(trade["demand_id"], demand["max_amount"])
+        if trade["amount"] > left:
+            raise ValueError(f"Demand {trade['demand_id']} only wants {left} more")
+        return data.get_demand_item_name(demand), demand["buy_price"]
+    if trade_type in (FIXED_BUY, FIXED_SELL):
+        if data.find_catalog_item_by_name(trade["name"]) is None:
+            raise ValueError(f"Unknown item {trade['name']}")
+        if quote_engine is None:
+            raise ValueError("Fixed price trades need the quotes of the fixed price market")
+        quote = quote_engine.get_quote(trade["name"])
+        # The market sells at its sell price and buys at its buy price
+        return trade["name"], quote["sell_price"] if trade_type == FIXED_BUY else quote["buy_price"]
+    raise ValueError(f"Unknown trade type {trade_type}")
+
+
+def execute_trades(global_data_manager, trades, engine=None, quote_engine=None):
+    """Make a basket of buys and sells as one transaction and return its summary.
+
+    Every trade is a dict with a "type" (LISTING_BUY, DEMAND_SELL, FIXED_BUY or
+    FIXED_SELL), an "amount" and the listing, demand or item it trades; an optional
+    "price" is a limit, the most a buy may cost or the least a sell must earn per unit.
+    The whole basket is checked first, in order, so money from a sale can pay for a
+    later buy and a bought item can be sold later on. If any trade fails nothing is
+    applied; otherwise the wallet changes once and each engine topic whose state
+    changed ("market", "demands") is notified once. The inventory has no engine
+    topic, its views follow the INVENTORY_* events of global_data_manager.changes.
+    """
+    data = global_data_manager
+    started = time.perf_counter()
+    current_time = engine.current_time if engine else None
+
+    # Check the basket against running totals, without touching the data
+    balance = data.wallet.balance
+    listings_left = {}  # item_id -> amount left in the listing after the trades so far
+    demands_left = {}  # demand_id -> amount still wanted
+    stock = {}  # Item name -> amount in the inventory after the trades so far
+    results = []
+    errors = []
+    for index, trade in enumerate(trades):
+        try:
+            amount = trade["amount"]
+            if not isinstance(amount, int) or amount <= 0:
+                raise ValueError(f"Invalid amount {amount!r}")
+            name, price = trade_price(data, trade, quote_engine, listings_left, demands_left, current_time)
+            limit = trade.get("price")
+            is_buy = trade["type"] in (LISTING_BUY, FIXED_BUY)
+            if limit is not None and (price > limit if is_buy else price < limit):
+                raise ValueError(f"The price of {name} moved to {price}")
+            if name not in stock:
+                stock[name] = sum(item["amount"] for item in data.user_items_by_name.get(name, ()))
+            total = price * amount
+            if is_buy:
+                if total > balance:
+                    raise ValueError(f"Not enough money for {amount}x {name}")
+                balance -= total
+                stock[name] += amount
+            else:
+                if amount > stock[name]:
+                    raise ValueError(f"Not enough {name} in the inventory")
+                balance += total
+                stock[name] -= amount
+            if trade["type"] == LISTING_BUY:
+                listings_left[trade["item_id"]] -= amount
+            elif trade["type"] == DEMAND_SELL:
+                demands_left[trade["demand_id"]] -= amount
+        except (KeyError, ValueError) as error:
+            errors.append((index, str(error)))
+            continue
+        results.append({"type": trade["type"], "name": name, "amount": amount, "price": price, "total": total})
+
+    summary = {
+        "ok": not errors,
+        "trades": len(trades),
+        "spent": sum(result["total"] for result in results if result["type"] in (LISTING_BUY, FIXED_BUY)),
+        "earned": sum(result["total"] for result in results if result["type"] in (DEMAND_SELL, FIXED_SELL)),
+        "balance": balance if not errors else data.wallet.balance,
+        "results": results,
+        "errors": errors,
+    }
+    if errors:
+        return summary
+
+    # Apply the basket in one pass
+    topics = set()
+    for trade, result in zip(trades, results):
+        amount = result["amount"]
+        trade_type = trade["type"]
+        if trade_type == LISTING_BUY:
+            item = data.get_market_item(trade["item_id"])
+            add_to_inventory(data, item["item_id"], item["name"], item["data_id"], amount)
+            data.event_log.record("listing_buy", item_id=trade["item_id"], amount=amount, price=result["price"])
+            data.update_market_item(item, amount=item["amount"] - amount)
+            if item["amount"] <= 0:
+                data.remove_market_item(item)
+            topics.add("market")
+        elif trade_type == DEMAND_SELL:
+            demand = data.get_demand(trade["demand_id"])
+            take_from_inventory(data, result["name"], amount)
+            data.event_log.record("demand_fill", demand_id=trade["demand_id"], amount=amount, price=result["price"])
+            data.update_demand(demand, max_amount=demand["max_amount"] - amount)
+            if demand["max_amount"] <= 0:
+                data.remove_demand(demand)
+            topics.add("demands")
+        elif trade_type == FIXED_BUY:
+            item = data.find_catalog_item_by_name(trade["name"])
+            add_to_inventory(data, item["item_id"], item["name"], item["data_id"], amount)
+            data.event_log.record("fixed_buy", name=trade["name"], amount=amount, price=result["price"])
+        else:
+            take_from_inventory(data, trade["name"], amount)
+            data.event_log.record("fixed_sell", name=trade["name"], amount=amount, price=result["price"])
+
+    data.wallet.set_balance(balance)  # A single wallet change for the whole basket
+    INSTRUMENTATION.record("trade.execute_trades", time.perf_counter() - started, rows=len(trades))
+    if engine:
+        for topic in sorted(topics):
+            engine.notify(topic)
+    return summary
+
+
+def add_to_inventory(global_data_manager, item_id, name, data_id, amount):
+    """Add amount units to the inventory entry with this item_id, creating it if needed."""
+    user_item = global_data_manager.find_user_item_by_id(item_id)
+    if user_item:
+        global_data_manager.update_user_item(user_item, amount=user_item["amount"] + amount)
+        return
+    global_data_manager.add_user_item({"item_id": item_id, "name": name, "amount": amount, "data_id": data_id})
+
+
+def take_from_inventory(global_data_manager, name, amount):
+    """Remove amount units of an item from the inventory, emptying its entries in order."""
+    for user_item in list(global_data_manager.user_items_by_name.get(name, ())):
+        taken = min(amount, user_item["amount"])
+        global_data_manager.update_user_item(user_item, amount=user_item["amount"] - taken)
+        if user_item["amount"] <= 0:
+            global_data_manager.remove_user_item(user_item)
+        amount -= taken
+        if amount == 0:
+            return
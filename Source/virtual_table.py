@@ -0,0 +1,257 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTable:
+    """Treeview that only holds the rows currently on screen.
+
+    The records live in the model (rows, keyed by a record key, and order, the keys
+    in display order); the Treeview keeps a small pool of rows that is refilled from
+    the model on scroll, so the Tk cost of a refresh depends on the window height,
+    not on the number of records. Sorting and the selection are kept in the model
+    and survive scrolling and refreshes.
+    """
+
+    def __init__(self, parent, columns, headings=None, widths=None, numeric_columns=(), page_size=20):
+        self.columns = tuple(columns)
+        self.headings = headings or {}  # column -> heading text, the column name by default
+        self.numeric_columns = set(numeric_columns)  # Sorted by value instead of case-insensitive text
+        self.page_size = page_size  # Number of rows on screen, follows the widget height
+
+        # Model
+        self.rows = {}  # key -> tuple of values, one per column
+        self.order = []  # Keys in display order
+        self.first = 0  # Position in order of the first row on screen
+        self.sort_column = None
+        self.sort_reverse = False
+        self.selected_key = None
+
+        # Pooled Treeview rows
+        self.row_iids = []  # iids on screen, top to bottom
+        self.iid_keys = {}  # iid -> key of the record shown in it
+        self.displayed = {}  # iid -> values shown in it
+
+        # Widgets
+        self.frame = tk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=self.columns, show="headings", height=page_size, selectmode="browse")
+        self.scrollbar = tk.Scrollbar(self.frame, orient="vertical", command=self.on_scrollbar)
+        for col in self.columns:
+            self.tree.heading(col, text=self.headings.get(col, col), anchor=tk.CENTER,
+                              command=lambda _col=col: self.sort_by(_col))
+            self.tree.column(col, anchor=tk.CENTER, width=(widths or {}).get(col, 100))
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3) or "break")
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3) or "break")
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3) or "break")
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1) or "break")
+        self.tree.bind("<Down>", lambda event: self.move_selection(1) or "break")
+        self.tree.bind("<Prior>", lambda event: self.move_selection(-self.page_size) or "break")
+        self.tree.bind("<Next>", lambda event: self.move_selection(self.page_size) or "break")
+
+    def set_rows(self, rows):
+        """Replace the records with rows (key -> values) and redraw. Return the number of Treeview rows touched."""
+        old_rows = self.rows
+        self.rows = rows
+        if self.sort_column is None:
+            self.order = list(rows)
+        else:
+            # Sort again only if records came or went, or a value of the sorted column changed
+            index = self.columns.index(self.sort_column)
+            if len(rows) != len(old_rows) or any(
+                    key not in old_rows or old_rows[key][index] != values[index] for key, values in rows.items()):
+                self.order = self.sorted_keys()
+        return self.render()
+
+    def update_rows(self, changed, removed=(), keep_order=False):
+        """Apply a delta: changed (key -> values) records are added or replaced and removed keys dropped.
+
+        Only the records that came, went or changed in the sorted column move; with
+        keep_order nothing moves, for values that change without reordering, such as
+        countdowns. Return the number of Treeview rows touched.
+        """
+        rows = self.rows
+        if keep_order:
+            for key, values in changed.items():
+                if key in rows:
+                    rows[key] = values
+            return self.render()
+
+        index = self.columns.index(self.sort_column) if self.sort_column is not None else None
+        moved = []  # Keys to put at their place in the order
+        dropped = set()  # Keys to take out of the order
+        for key, values in changed.items():
+            old_values = rows.get(key)
+            if old_values is None:
+                moved.append(key)
+            elif index is not None and old_values[index] != values[index]:
+                moved.append(key)
+                dropped.add(key)
+            rows[key] = values
+        for key in removed:
+            if key in rows:
+                del rows[key]
+                dropped.add(key)
+        if not moved and not dropped:
+            return self.render()
+
+        if dropped:
+            self.order = [key for key in self.order if key not in dropped]
+        if index is None:
+            self.order.extend(moved)
+        elif len(moved) * 8 > len(self.order):
+            self.order = self.sorted_keys()  # Cheaper than inserting so many one by one
+        else:
+            sort_key = self.sort_key_function()
+            for key in moved:
+                self.insert_sorted(key, sort_key)
+        return self.render()
+
+    def insert_sorted(self, key, sort_key):
+        """Insert key into the sorted order with a binary search, after its equals."""
+        order = self.order
+        value = sort_key(key)
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            other = sort_key(order[middle])
+            if (value < other) if not self.sort_reverse else (value > other):
+                high = middle
+            else:
+                low = middle + 1
+        order.insert(low, key)
+
+    def clear(self):
+        return self.set_rows({})
+
+    def visible_keys(self):
+        """Return the keys of the records on screen."""
+        return self.order[self.first:self.first + self.page_size]
+
+    def sort_key_function(self):
+        index = self.columns.index(self.sort_column)
+        if self.sort_column in self.numeric_columns:
+            def sort_key(key):
+                return self.rows[key][index]
+        else:
+            def sort_key(key):
+                return str(self.rows[key][index]).lower()
+        return sort_key
+
+    def sorted_keys(self):
+        return sorted(self.rows, key=self.sort_key_function(), reverse=self.sort_reverse)
+
+    def sort_by(self, column, reverse=None):
+        """Sort the records by column; without reverse, clicking the same column again flips the order."""
+        if reverse is None:
+            reverse = not self.sort_reverse if column == self.sort_column else False
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self.order = self.sorted_keys()
+        self.render()
+
+    def render(self):
+        """Fill the pooled Treeview rows with the records of the current window. Return the rows touched."""
+        self.first = max(0, min(self.first, len(self.order) - self.page_size))
+        visible = self.order[self.first:self.first + self.page_size]
+        touched = 0
+
+        # Grow or shrink the pool to the number of rows on screen
+        while len(self.row_iids) < len(visible):
+            self.row_iids.append(self.tree.insert("", tk.END))
+        while len(self.row_iids) > len(visible):
+            iid = self.row_iids.pop()
+            self.tree.delete(iid)
+            self.iid_keys.pop(iid, None)
+            self.displayed.pop(iid, None)
+            touched += 1
+
+        selected_iid = None
+        for iid, key in zip(self.row_iids, visible):
+            values = self.rows[key]
+            if self.displayed.get(iid) != values:
+                self.tree.item(iid, values=values)
+                self.displayed[iid] = values
+                touched += 1
+            self.iid_keys[iid] = key
+            if key == self.selected_key:
+                selected_iid = iid
+
+        # Show the model's selection, if its record is on screen
+        if selected_iid:
+            if self.tree.selection() != (selected_iid,):
+                self.tree.selection_set(selected_iid)
+            self.tree.focus(selected_iid)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if self.order:
+            self.scrollbar.set(self.first / len(self.order), (self.first + len(visible)) / len(self.order))
+        else:
+            self.scrollbar.set(0, 1)
+        return touched
+
+    def scroll(self, rows):
+        self.first += rows
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.order))
+            self.render()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.page_size if unit == "pages" else 1))
+
+    def on_resize(self, event):
+        """Fit the pool to the widget height, using the measured row height when a row is on screen."""
+        row_height, header_height = 20, 24
+        if self.row_iids:
+            bbox = self.tree.bbox(self.row_iids[0])
+            if bbox:
+                header_height, row_height = bbox[1], bbox[3]
+        page_size = max(1, (event.height - header_height) // row_height)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.render()
+
+    def on_select(self, event=None):
+        # Clearing the selection only happens when the selected record scrolls away, which keeps it in the model
+        selection = self.tree.selection()
+        if selection and selection[0] in self.iid_keys:
+            self.selected_key = self.iid_keys[selection[0]]
+
+    def move_selection(self, offset):
+        """Move the selection by offset records, scrolling to keep it on screen."""
+        if not self.order:
+            return
+        if self.selected_key in self.rows:
+            position = self.order.index(self.selected_key) + offset
+        else:
+            position = self.first
+        position = max(0, min(position, len(self.order) - 1))
+        self.select(self.order[position])
+
+    def select(self, key):
+        """Select the record with this key and scroll it on screen."""
+        if key not in self.rows:
+            return
+        self.selected_key = key
+        position = self.order.index(key)
+        if position < self.first:
+            self.first = position
+        elif position >= self.first + self.page_size:
+            self.first = position - self.page_size + 1
+        self.render()
+
+    def get_selected_key(self):
+        """Return the key of the selected record, or None if nothing or a removed record is selected."""
+        return self.selected_key if self.selected_key in self.rows else None
+
+    def get_selected_values(self):
+        key = self.get_selected_key()
+        return self.rows[key] if key is not None else None
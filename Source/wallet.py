@@ -0,0 +1,88 @@
+COPPER_PER_SILVER = 100
+COPPER_PER_GOLD = 10000
+
+
+class Wallet:
+    """The user's money as a single copper balance.
+
+    Gold and silver only exist for display: 1 gold = 100 silver = 10,000 copper.
+    Every change goes through credit, debit, transfer or set_balance, which call
+    the subscribed listeners with the old and the new balance.
+    """
+
+    __slots__ = ("balance", "listeners")
+
+    def __init__(self, balance=0):
+        self.balance = balance  # Total copper
+        self.listeners = []
+
+    @staticmethod
+    def to_copper(gold, silver, copper):
+        return gold * COPPER_PER_GOLD + silver * COPPER_PER_SILVER + copper
+
+    @staticmethod
+    def split(amount):
+        """Return the (gold, silver, copper) denominations of a copper amount."""
+        gold, remaining_copper = divmod(amount, COPPER_PER_GOLD)
+        silver, copper = divmod(remaining_copper, COPPER_PER_SILVER)
+        return gold, silver, copper
+
+    @staticmethod
+    def format(amount):
+        """Format a copper amount as "x gold, y silver, z copper"."""
+        gold, silver, copper = Wallet.split(amount)
+        return f"{gold} gold, {silver} silver, {copper} copper"
+
+    @property
+    def gold(self):
+        return self.balance // COPPER_PER_GOLD
+
+    @property
+    def silver(self):
+        return self.balance % COPPER_PER_GOLD // COPPER_PER_SILVER
+
+    @property
+    def copper(self):
+        return self.balance % COPPER_PER_SILVER
+
+    def subscribe(self, callback):
+        """Call callback(old_balance, new_balance) after every change of the balance."""
+        self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def set_balance(self, balance):
+        """Replace the balance, notifying the listeners if it changed."""
+        old_balance = self.balance
+        if balance == old_balance:
+            return
+        self.balance = balance
+        for callback in list(self.listeners):
+            callback(old_balance, balance)
+
+    def can_afford(self, amount):
+        return 0 <= amount <= self.balance
+
+    def credit(self, amount):
+        """Add amount copper to the balance."""
+        if amount < 0:
+            raise ValueError(f"Cannot credit a negative amount: {amount}")
+        self.set_balance(self.balance + amount)
+
+    def debit(self, amount):
+        """Take amount copper from the balance. Return False, changing nothing, if the balance is too low."""
+        if amount < 0:
+            raise ValueError(f"Cannot debit a negative amount: {amount}")
+        if amount > self.balance:
+            return False
+        self.set_balance(self.balance - amount)
+        return True
+
+    def transfer(self, other, amount):
+        """Move amount copper to another wallet. Return False, changing neither wallet, if this one is too low."""
+        if not self.debit(amount):
+            return False
+        other.credit(amount)
+        return True
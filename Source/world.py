@@ -0,0 +1,240 @@
+import multiprocessing
+import os
+import random
+import time
+
+import global_data
+from instrumentation import Instrumentation
+from simulation_engine import SimulationEngine
+
+# SimulationEngine settings a town can override, the MarketManager generation constants
+TOWN_PARAMETERS = (
+    "MAX_ITEMS",
+    "PRICE_ADJUST_MIN", "PRICE_ADJUST_MAX",
+    "AMOUNT_ADJUST_MIN", "AMOUNT_ADJUST_MAX",
+    "GENERATE_DELAY_MIN", "GENERATE_DELAY_MAX",
+    "max_demands",
+)
+
+
+def random_town_configs(count, seed=0):
+    """Return count town configs, each with its own name, seed and generation constants."""
+    rng = random.Random(seed)
+    configs = []
+    for index in range(count):
+        price_level = rng.uniform(0.7, 1.3)  # Cheap and expensive towns
+        supply_level = rng.uniform(0.5, 1.5)  # Poor and rich towns
+        configs.append({
+            "name": f"Town {index + 1}",
+            "seed": rng.getrandbits(32),
+            "PRICE_ADJUST_MIN": 0.85 * price_level,
+            "PRICE_ADJUST_MAX": 1.85 * price_level,
+            "AMOUNT_ADJUST_MIN": 0.15 * supply_level,
+            "AMOUNT_ADJUST_MAX": 2.5 * supply_level,
+            "GENERATE_DELAY_MIN": 0.5 / supply_level,
+            "GENERATE_DELAY_MAX": 2.5 / supply_level,
+        })
+    return configs
+
+
+class Town:
+    """One market of the world: its own listings, demands, generation constants and engine.
+
+    The town keeps its data in memory only; the player's market stays the one of the
+    GlobalDataManager that main.py loads and saves. Its game events go to a closed log
+    and its timings to the instrumentation of its shard, never to the player's.
+    """
+
+    def __init__(self, config, start_time, instrumentation):
+        self.name = config["name"]
+        data = global_data.GlobalDataManager(storage_backend='memory', keep_price_history=False)  # Nothing reads it
+        data.items_list = data.new_item()
+        data.data_list = data.new_data()
+        data.rebuild_catalog_indexes()
+        data.rebuild_market_indexes()
+        data.rebuild_user_item_indexes()
+        data.rebuild_demand_indexes()
+        data.rng.reseed(config["seed"])  # Every town has its own reproducible streams
+        self.global_data_manager = data
+
+        self.engine = SimulationEngine(data, start_time, instrumentation)
+        for parameter in TOWN_PARAMETERS:
+            if parameter in config:
+                setattr(self.engine, parameter, config[parameter])
+
+    def summary(self):
+        """Return the prices of the town, the only data that leaves its process.
+
+        prices maps data_id -> [listings, lowest, highest, mean price] and demand_prices
+        maps the catalog item_id -> highest buy price offered by a demand.
+        """
+        data = self.global_data_manager
+        prices = {data_id: [count, lowest, highest, total / count]
+                  for data_id, (count, lowest, highest, total) in data.in_market_items.price_aggregates().items()}
+        demand_prices = {}
+        for demand in data.demands_list:
+            if demand["buy_price"] > demand_prices.get(demand["item_id"], 0):
+                demand_prices[demand["item_id"]] = demand["buy_price"]
+        return {
+            "name": self.name,
+            "time": self.engine.current_time,
+            "listings": len(data.in_market_items),
+            "demands": len(data.demands_list),
+            "prices": prices,
+            "demand_prices": demand_prices,
+        }
+
+
+class Shard:
+    """The towns simulated by one process."""
+
+    def __init__(self, configs, start_time):
+        self.instrumentation = Instrumentation()  # Step timings of the towns
+        self.towns = [Town(config, start_time, self.instrumentation) for config in configs]
+
+    def step(self, dt, ticks):
+        """Advance every town by ticks steps of dt seconds and return their summaries."""
+        for town in self.towns:
+            town.engine.run(ticks, dt)
+        return self.summaries()
+
+    def summaries(self):
+        return [town.summary() for town in self.towns]
+
+
+def run_shard(connection, configs, start_time):
+    """Worker process loop: build the shard, then answer the commands of the World until "stop"."""
+    shard = Shard(configs, start_time)
+    connection.send(shard.summaries())
+    while True:
+        command, args = connection.recv()
+        if command == "step":
+            connection.send(shard.step(*args))
+        elif command == "summaries":
+            connection.send(shard.summaries())
+        elif command == "stop":
+            break
+    connection.close()
+
+
+class World:
+    """N independent towns, sharded across worker processes.
+
+    Each worker owns the full state of its towns and ticks them; the World, in the
+    UI process, only ever receives their summaries. With processes=0 the towns are
+    simulated in this process instead, for environments without multiprocessing.
+    """
+
+    def __init__(self, town_configs, processes=None, start_time=None):
+        self.town_configs = list(town_configs)
+        self.processes = min(os.cpu_count() or 1, len(self.town_configs)) if processes is None else processes
+        self.start_time = time.time() if start_time is None else start_time
+        self.workers = []  # (process, connection) per shard
+        self.pending = set()  # Connections of the shards whose step has not been collected yet
+        self.local_shard = None  # Used instead of the workers when processes is 0
+        self.summaries = {}  # Town name -> latest summary
+
+    def start(self):
+        """Build the towns, in the worker processes unless processes is 0."""
+        if self.processes == 0:
+            self.local_shard = Shard(self.town_configs, self.start_time)
+            self.update_summaries(self.local_shard.summaries())
+            return
+        for index in range(self.processes):
+            # Round robin, so every shard gets a similar mix of towns
+            configs = self.town_configs[index::self.processes]
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard, daemon=True,
+                                              args=(worker_connection, configs, self.start_time))
+            process.start()
+            worker_connection.close()
+            self.workers.append((process, connection))
+        for process, connection in self.workers:
+            self.update_summaries(connection.recv())
+
+    def step(self, dt, ticks=1):
+        """Advance every town by ticks steps of dt simulated seconds, the shards running in parallel."""
+        self.request_step(dt, ticks)
+        self.collect_summaries(wait=True)
+
+    def request_step(self, dt, ticks=1):
+        """Start a step on every shard that finished its last one, without waiting for it."""
+        if self.local_shard:
+            self.update_summaries(self.local_shard.step(dt, ticks))
+            return
+        for process, connection in self.workers:
+            if connection not in self.pending:
+                connection.send(("step", (dt, ticks)))
+                self.pending.add(connection)
+
+    def collect_summaries(self, wait=False):
+        """Take the summaries of the shards whose step is done, or of every shard if wait is True."""
+        for connection in list(self.pending):
+            if wait or connection.poll():
+                self.update_summaries(connection.recv())
+                self.pending.discard(connection)
+
+    def advance(self, dt, ticks=1):
+        """Collect the finished steps and start the next ones, never blocking: the periodic call of the UI process."""
+        self.collect_summaries()
+        self.request_step(dt, ticks)
+
+    def update_summaries(self, summaries):
+        for summary in summaries:
+            self.summaries[summary["name"]] = summary
+
+    def stop(self):
+        """Stop the worker processes."""
+        for process, connection in self.workers:
+            try:
+                connection.send(("stop", ()))
+            except (BrokenPipeError, OSError):
+                pass  # The worker is already gone
+            connection.close()
+        for process, connection in self.workers:
+            process.join(timeout=5)
+        self.workers = []
+        self.pending.clear()
+        self.local_shard = None
+
+    def get_town_prices(self, data_id):
+        """Return (town name, listings, lowest, highest, mean price) of every town selling data_id, cheapest first."""
+        rows = []
+        for name, summary in self.summaries.items():
+            if data_id in summary["prices"]:
+                rows.append((name, *summary["prices"][data_id]))
+        rows.sort(key=lambda row: row[2])
+        return rows
+
+    def get_best_trades(self, data_id, item_id):
+        """Return (town with the lowest listing price, town with the highest demand price) for an item, or None."""
+        cheapest = self.get_town_prices(data_id)
+        buyers = [(summary["demand_prices"][item_id], name) for name, summary in self.summaries.items()
+                  if item_id in summary["demand_prices"]]
+        if not cheapest or not buyers:
+            return None
+        return cheapest[0][0], max(buyers)[1]
+
+
+if __name__ == "__main__":
+    # Headless run: python world.py [towns] [seconds] [processes]
+    import sys
+
+    multiprocessing.freeze_support()
+    town_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    world = World(random_town_configs(town_count), processes)
+    world.start()
+    dt = 1 / 24
+    started = time.perf_counter()
+    for _ in range(seconds):
+        world.step(dt, 24)  # One simulated second per exchange of summaries
+    elapsed = time.perf_counter() - started
+    world.stop()
+
+    town_ticks = town_count * seconds * 24
+    print(f"{town_count} towns on {world.processes or 1} processes: {town_ticks} town ticks in {elapsed:.3f}s "
+          f"({town_ticks / elapsed:.0f} town ticks/s)")
+    print("Wheat:", world.get_town_prices("101")[:3])